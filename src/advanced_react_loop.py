@@ -18,10 +18,83 @@ The agent iteratively:
 This demonstrates how the same ReAct pattern naturally extends to more complex scenarios.
 """
 
-from utils import function_to_tool, add_tools_to_prompt, parse_response
+from typing import Callable, Optional
+
+from utils import default_acompletion_fn, default_completion_fn, parse_response
+from agent_run import AgentRun
+from history import HistoryManager
+from prefetch import Prefetcher
 from prompts import ADVANCED_SYSTEM_PROMPT
 from tools import get_weather, check_availability_activity
-import litellm
+
+
+def _handle_turn(
+    run: AgentRun,
+    assistant_message: str,
+    tool_results: Optional[list] = None,
+) -> Optional[str]:
+    """Process one assistant message.
+
+    Returns the validated final answer if the agent produced one, otherwise
+    appends the follow-up message (tool result or correction) to run.messages
+    and returns None. Successful tool calls are recorded in run.tools_called.
+    tool_results holds the results of tool calls already run while streaming.
+    Logs and spans go to run.trace.
+    """
+    messages, trace, tools_called = run.messages, run.trace, run.tools_called
+    # Add assistant response to messages
+    messages.append({"role": "assistant", "content": assistant_message})
+
+    # Parse response using utility function
+    with trace.span("parse"):
+        parsed = parse_response(assistant_message)
+
+    # Display reasoning if present
+    if parsed.reasoning:
+        trace.log(f"\nReasoning: {parsed.reasoning}")
+
+    # Check if we have a final answer - if so we validate and return
+    if parsed.answer:
+        trace.log(f"\nFinal Answer: {parsed.answer}")
+
+        # Assert that both required tools have been called
+        assert "get_weather" in tools_called, (
+            f"Error: Cannot provide final answer without checking weather first! Tools called so far: {', '.join(tools_called)}"
+        )
+        assert "check_availability_activity" in tools_called, (
+            f"Error: Cannot provide final answer without checking availability first! Tools called so far: {', '.join(tools_called)}"
+        )
+
+        trace.log("[Validation passed: Both weather and availability were checked]")
+        return parsed.answer
+
+    # Check if we have tool calls - several can be emitted in one message
+    if parsed.tool_calls:
+        # Execute tools concurrently (unless they already ran while streaming or
+        # were prefetched) and send all results back in one message
+        results = run.run_tools(parsed.tool_calls, tool_results)
+        messages.append(
+            {"role": "user", "content": "\n".join(r.content for r in results)}
+        )
+    else:
+        # No tool call found, but also no answer
+        # Check if reasoning was provided
+        if not parsed.reasoning:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": "Please provide your reasoning in <reasoning> tags, and either an <answer> or a <tool> call.",
+                }
+            )
+        else:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": "Please provide either an <answer> or a <tool> call based on your reasoning.",
+                }
+            )
+
+    return None
 
 
 def run_agent(
@@ -30,119 +103,51 @@ def run_agent(
     tools: dict,
     model: str,
     max_iterations: int = 10,
+    completion_fn: Optional[Callable] = None,
+    **options,
 ):
-    # Convert tools to ToolInfo namedtuples
-    tool_infos = [function_to_tool(tool_func) for tool_func in tools.values()]
-
-    # Build full system prompt with tools
-    full_system_prompt = add_tools_to_prompt(system_prompt, tool_infos)
+    """Run the agent until it answers or max_iterations is reached.
 
-    # Initialize conversation context
-    messages = [
-        {"role": "system", "content": full_system_prompt},
-        {"role": "user", "content": user_request},
-    ]
+    options are the optional features of agent_run.AgentRun (stream,
+    on_answer, tool_cache, history, tracer, budget, router, session,
+    generation, prefetch, stall, ...).
+    """
+    # Use litellm unless a different backend (e.g. mock_llm.MockLLM) is given
+    completion_fn = completion_fn or default_completion_fn()
+    run = AgentRun(system_prompt, user_request, tools, model, max_iterations, **options)
+    return run.run(completion_fn, _handle_turn)
 
-    # Track which tools have been called
-    tools_called = []
 
-    # Main agent loop
-    for iteration in range(max_iterations):
-        # Call LLM
-        response = litellm.completion(model=model, messages=messages)
-        assistant_message = response.choices[0].message.content
-
-        print(f"\n--- Iteration {iteration + 1} ---")
-        print(f"Agent: {assistant_message}")
-
-        # Add assistant response to messages
-        messages.append({"role": "assistant", "content": assistant_message})
-
-        # Parse response using utility function
-        parsed = parse_response(assistant_message)
-
-        # Display reasoning if present
-        if parsed.reasoning:
-            print(f"\nReasoning: {parsed.reasoning}")
-
-        # Check if we have a final answer - if so we validate and return
-        if parsed.answer:
-            print(f"\nFinal Answer: {parsed.answer}")
-
-            # Assert that both required tools have been called
-            assert "get_weather" in tools_called, (
-                f"Error: Cannot provide final answer without checking weather first! Tools called so far: {', '.join(tools_called)}"
-            )
-            assert "check_availability_activity" in tools_called, (
-                f"Error: Cannot provide final answer without checking availability first! Tools called so far: {', '.join(tools_called)}"
-            )
+async def run_agent_async(
+    system_prompt: str,
+    user_request: str,
+    tools: dict,
+    model: str,
+    max_iterations: int = 10,
+    acompletion_fn: Optional[Callable] = None,
+    **options,
+):
+    """Asyncio version of run_agent, built on litellm.acompletion.
 
-            print("[Validation passed: Both weather and availability were checked]")
-            return parsed.answer
-
-        # Check if we have a tool call
-        if parsed.tool:
-            tool_name = parsed.tool
-            params_str = parsed.params or ""
-
-            # Check if tool exists
-            if tool_name in tools:
-                # Parse parameters (simple comma-separated for now)
-                params = (
-                    [p.strip() for p in params_str.split(",")] if params_str else []
-                )
-                # Execute tool
-                try:
-                    tool_result = tools[tool_name](*params)
-                    print(f"Tool Result: {tool_result}")
-
-                    # Track that this tool was called
-                    tools_called.append(tool_name)
-
-                    # Add tool result to messages
-                    messages.append(
-                        {
-                            "role": "user",
-                            "content": f"Tool '{tool_name}' returned: {tool_result}",
-                        }
-                    )
-                except Exception as e:
-                    error_msg = f"Error executing tool '{tool_name}': {str(e)}"
-                    print(error_msg)
-                    messages.append({"role": "user", "content": error_msg})
-            else:
-                error_msg = f"Tool '{tool_name}' not found. Available tools: {', '.join(tools.keys())}"
-                print(error_msg)
-                messages.append({"role": "user", "content": error_msg})
-        else:
-            # No tool call found, but also no answer
-            # Check if reasoning was provided
-            if not parsed.reasoning:
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": "Please provide your reasoning in <reasoning> tags, and either an <answer> or a <tool> call.",
-                    }
-                )
-            else:
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": "Please provide either an <answer> or a <tool> call based on your reasoning.",
-                    }
-                )
-
-    print("\n\n!!! Maximum iterations reached without final answer !!!\n\n")
-
-    return "No answer could be found"
+    The LLM call is awaited and tools run in a worker thread, so many
+    conversations can share one event loop (see concurrent_runner.py).
+    """
+    acompletion_fn = acompletion_fn or default_acompletion_fn()
+    run = AgentRun(system_prompt, user_request, tools, model, max_iterations, **options)
+    return await run.arun(acompletion_fn, _handle_turn)
 
 
 if __name__ == "__main__":
     import argparse
-    from dotenv import load_dotenv
+    from completion_cache import CompletionCache, add_cache_arguments
+    from tracing import add_tracing_arguments, tracer_from_args
+    from budget import add_budget_arguments, budget_from_args
+    from routing import add_routing_arguments, router_from_args
+    from generation import add_generation_arguments, generation_from_args
+    from stall import add_stall_arguments, stall_monitor_from_args
+    from session_log import add_session_arguments, new_run_id, session_from_args
+    from tool_executor import add_tool_executor_arguments, tool_executor_from_args
 
-    # Load environment variables
-    load_dotenv()
     # Parse command line arguments
     parser = argparse.ArgumentParser(
         description="Advanced ReAct agent with reasoning and multiple tools"
@@ -160,13 +165,60 @@ if __name__ == "__main__":
         default=10,
         help="Maximum number of agent iterations (default: 10)",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the LLM output, starting tools before generation ends",
+    )
+    parser.add_argument(
+        "--history-budget",
+        type=int,
+        default=None,
+        help="Token budget above which older turns are compacted (default: off)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Speculatively run the predicted tool calls during the LLM call",
+    )
+    add_cache_arguments(parser)
+    add_tracing_arguments(parser)
+    add_budget_arguments(parser)
+    add_routing_arguments(parser)
+    add_generation_arguments(parser)
+    add_stall_arguments(parser)
+    add_session_arguments(parser)
+    add_tool_executor_arguments(parser)
     args = parser.parse_args()
 
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    # Optionally record or replay completions from the on-disk cache
+    completion_fn = None
+    if args.llm_cache:
+        completion_fn = CompletionCache(args.llm_cache_dir, args.llm_cache).completion
+
     # Define available tools
     tools = {
         "get_weather": get_weather,
         "check_availability_activity": check_availability_activity,
     }
+    # Optionally run the tools on worker pools with a timeout
+    tool_executor = tool_executor_from_args(args, tools)
+    if tool_executor is not None:
+        tools = tool_executor.wrap(tools)
+
+    # Optionally log the run, so that it can be resumed after a crash
+    session = session_from_args(args)
+    run_id = None
+    if session is not None:
+        run_id = args.resume or new_run_id()
+        if args.resume:
+            args.question = session.user_request(args.resume)
+        print(f"=== Session run {run_id} (resume with --resume {run_id}) ===")
 
     # Run the agent
     print(f"\n=== Question: {args.question}")
@@ -175,7 +227,25 @@ if __name__ == "__main__":
         user_request=args.question,
         tools=tools,
         model="claude-sonnet-4-5-20250929",
+        completion_fn=completion_fn,
+        tracer=tracer_from_args(args),
+        budget=budget_from_args(args),
+        router=router_from_args(
+            args, answer_tools={"get_weather", "check_availability_activity"}
+        ),
+        generation=generation_from_args(
+            args, answer_tools={"get_weather", "check_availability_activity"}
+        ),
+        stall=stall_monitor_from_args(args),
+        session=session,
+        run_id=run_id,
+        history=HistoryManager(max_tokens=args.history_budget)
+        if args.history_budget
+        else None,
         max_iterations=args.max_iterations,
+        stream=args.stream,
+        prefetch=Prefetcher() if args.prefetch else None,
+        on_answer=lambda text: print(text, end="", flush=True),
     )
     # Print out what we got:
     print("\n=== Final Answer ===")
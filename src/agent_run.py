@@ -0,0 +1,441 @@
+"""
+Shared machinery of the XML-tag agent loops.
+
+simple_react_loop.py and advanced_react_loop.py (and their asyncio versions)
+run the same loop: pick the model (routing, budget), call the LLM (streamed
+or not), have a rejected fast turn redone by the strong model, handle the
+turn, check for stalls and, at the end, report what each optional feature
+did. Only the handling of a turn differs from one agent to the other.
+
+An AgentRun holds the per-run state of the optional features (history
+compaction, session log, generation limits, stall detection, tracing,
+budget, routing, prefetch) and runs the loop once. The loop is written a
+single time, as a generator of the I/O it needs (LLM calls and turns to
+handle), which run() drives with a completion function and arun() with an
+async one:
+
+    run = AgentRun(system_prompt, user_request, tools, model, budget=budget)
+    answer = run.run(completion_fn, handle_turn)
+
+A new per-run feature is added here once, instead of to four loop bodies.
+"""
+
+from typing import Callable, NamedTuple, Optional
+import asyncio
+
+from utils import ToolCall, ToolResult, build_messages, execute_tool_calls
+from tool_cache import ToolCache
+from history import HistoryManager
+from budget import Budget
+from routing import ModelRouter
+from generation import GenerationPolicy
+from stall import StallMonitor
+from session_log import SessionLog
+from prefetch import Prefetcher
+from tracing import Tracer, usage_attributes
+from streaming import astream_and_dispatch, stream_and_dispatch
+
+NO_ANSWER = "No answer could be found"
+
+
+class _LLMCall(NamedTuple):
+    """An LLM call needed by the loop (answered with a response or a StreamedTurn)."""
+
+    model: str
+    messages: list
+    stream: bool
+
+
+class _Turn(NamedTuple):
+    """An assistant message to handle (answered with the final answer or None)."""
+
+    assistant_message: str
+    tool_results: Optional[list[ToolResult]]
+
+
+class AgentRun:
+    """One run of an XML-tag agent loop, with its optional features.
+
+    Args:
+        system_prompt: The system prompt (the tools are added to it)
+        user_request: The user's question
+        tools: Dictionary of available tool functions
+        model: The model identifier
+        max_iterations: Maximum number of loop turns
+        stream: Stream the LLM output, starting tools before generation ends
+        on_answer: Called with each new piece of the streamed <answer> text
+        tool_cache: ToolCache serving repeated tool calls
+        cache_prompt: Mark the system prompt for provider prompt caching
+        history: Compacts the old turns over its token budget
+        tracer: Receives the spans and logs of the run (default: silent)
+        budget: Token and cost limits of the run (and of its batch)
+        router: Sends the tool-selection turns to a fast model
+        session: Logs the run so that it can be resumed
+        run_id: The session run to resume (default: a new one)
+        generation: Stop sequences and output caps per phase
+        prefetch: Starts the predicted tool calls during the LLM call
+        stall: Detects runs going in circles and stops them early
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        user_request: str,
+        tools: dict,
+        model: str,
+        max_iterations: int = 10,
+        stream: bool = False,
+        on_answer: Optional[Callable[[str], None]] = None,
+        tool_cache: Optional[ToolCache] = None,
+        cache_prompt: bool = True,
+        history: Optional[HistoryManager] = None,
+        tracer: Optional[Tracer] = None,
+        budget: Optional[Budget] = None,
+        router: Optional[ModelRouter] = None,
+        session: Optional[SessionLog] = None,
+        run_id: Optional[str] = None,
+        generation: Optional[GenerationPolicy] = None,
+        prefetch: Optional[Prefetcher] = None,
+        stall: Optional[StallMonitor] = None,
+    ):
+        self.user_request = user_request
+        self.tools = tools
+        self.model = model
+        self.max_iterations = max_iterations
+        self.stream = stream
+        self.on_answer = on_answer
+
+        # Initialize conversation context
+        self.messages = build_messages(system_prompt, user_request, tools, cache_prompt)
+        # Tools called successfully so far, in order (routing, generation limits
+        # and stall detection follow the run's progress through it)
+        self.tools_called: list[str] = []
+        # Old turns get compacted once over the token budget (messages stays complete)
+        self.history_run = history.new_run() if history is not None else None
+        # Every LLM response and tool result is appended to the session log; resuming
+        # run_id replays the logged ones instead of calling the model and tools again
+        self.session_run = (
+            session.open_run(run_id, user_request) if session is not None else None
+        )
+        # Stop sequences and output caps per phase (tool selection or answer);
+        # stopped and truncated turns are repaired before they are parsed
+        self.generation_run = (
+            generation.new_run(self.tools_called) if generation is not None else None
+        )
+        # Repeated tool calls are served from the run's own results, and a run
+        # going in circles gets a forcing prompt, then is stopped
+        self.stall_run = (
+            stall.new_run(max_iterations, tools, self.tools_called)
+            if stall is not None
+            else None
+        )
+        # Tool calls go through the session log, then the run's own results
+        self.tool_cache = self._wrap_tool_cache(tool_cache)
+        # Prefetched calls only use the shared cache; the session log and the
+        # stall detection see them once the model asks for them
+        self._prefetch_cache = tool_cache
+        self._prefetch_record = self._wrap_tool_cache(None)
+        # Spans and logs of this run (nothing is printed unless the tracer has a console)
+        self.trace = (tracer or Tracer()).start_run(
+            self.session_run.run_id if self.session_run is not None else None
+        )
+        # Tokens and cost of this run, checked against the run and batch limits
+        self.budget_run = budget.new_run() if budget is not None else None
+        # Tool-selection turns go to the router's fast model (rejected fast turns
+        # are redone by the strong one, except when streaming)
+        self.route_run = (
+            router.new_run(model, redo=not stream, tools_called=self.tools_called)
+            if router is not None
+            else None
+        )
+        # Predicted tool calls run while the LLM is called (streaming already
+        # starts tools early, so the two are not combined)
+        self.prefetch_run = (
+            prefetch.new_run(user_request)
+            if prefetch is not None and not stream
+            else None
+        )
+
+    def _wrap_tool_cache(self, tool_cache: Optional[ToolCache]):
+        if self.session_run is not None:
+            tool_cache = self.session_run.wrap_tool_cache(tool_cache)
+        if self.stall_run is not None:
+            tool_cache = self.stall_run.wrap_tool_cache(tool_cache)
+        return tool_cache
+
+    def run_tools(
+        self,
+        tool_calls: list[ToolCall],
+        tool_results: Optional[list[ToolResult]] = None,
+    ) -> list[ToolResult]:
+        """Execute the tool calls of a turn concurrently, and trace them.
+
+        tool_results holds the results of the calls already run while
+        streaming; prefetched calls are served by the prefetch run.
+        """
+        results = tool_results
+        if results is None and self.prefetch_run is not None:
+            results = self.prefetch_run.execute(
+                tool_calls, self.tools, self.tool_cache, self._prefetch_record
+            )
+        elif results is None:
+            results = execute_tool_calls(tool_calls, self.tools, self.tool_cache)
+        for result in results:
+            self.trace.log(result.content)
+            self.trace.record(
+                "tool",
+                result.latency,
+                tool=result.name,
+                ok=result.ok,
+                result_size=len(result.content),
+            )
+            # Track which tools were called successfully
+            if result.ok:
+                self.tools_called.append(result.name)
+        return results
+
+    def _steps(self):
+        """The agent loop, yielding the LLM calls and turns it needs (see run)."""
+        trace, messages = self.trace, self.messages
+        history_run, budget_run = self.history_run, self.budget_run
+        route_run, prefetch_run = self.route_run, self.prefetch_run
+
+        for iteration in range(self.max_iterations):
+            trace.iteration = iteration + 1
+            llm_messages = history_run.prepare(messages) if history_run else messages
+            if budget_run is not None and budget_run.exceeded():
+                trace.log(
+                    f"\n\n!!! Budget exceeded ({budget_run.exceeded_reason}) !!!\n\n"
+                )
+                return NO_ANSWER
+            routed_model = route_run.model_for() if route_run else self.model
+            # Close to a limit, the budget switches to the cheaper fallback model
+            call_model = (
+                budget_run.model_for(routed_model) if budget_run else routed_model
+            )
+            if prefetch_run is not None:
+                prefetch_run.start(
+                    messages, self.tools_called, self.tools, self._prefetch_cache
+                )
+            tool_results = response = None
+            cached = False
+            with trace.span("llm", model=call_model, stream=self.stream) as span:
+                if self.stream:
+                    # Tools start as soon as their call is complete, while the model
+                    # is still generating; the answer goes to on_answer as it comes
+                    turn = yield _LLMCall(call_model, llm_messages, stream=True)
+                    assistant_message, tool_results = turn.content, turn.tool_results
+                    cached = turn.cached
+                else:
+                    response = yield _LLMCall(call_model, llm_messages, stream=False)
+                    assistant_message = response.choices[0].message.content
+                    span.update(usage_attributes(response))
+
+            if budget_run is not None:
+                budget_run.record(
+                    call_model,
+                    llm_messages,
+                    assistant_message,
+                    response,
+                    cached,
+                    iteration=iteration + 1,
+                )
+
+            # A fast turn that answers or cannot be parsed is redone by the strong model
+            if route_run is not None and route_run.check(call_model, assistant_message):
+                trace.log(f"[Routing: {call_model} turn rejected, asking {self.model}]")
+                call_model = (
+                    budget_run.model_for(self.model) if budget_run else self.model
+                )
+                with trace.span(
+                    "llm", model=call_model, stream=False, rerouted=True
+                ) as span:
+                    response = yield _LLMCall(call_model, llm_messages, stream=False)
+                    assistant_message = response.choices[0].message.content
+                    span.update(usage_attributes(response))
+                if budget_run is not None:
+                    budget_run.record(
+                        call_model,
+                        llm_messages,
+                        assistant_message,
+                        response,
+                        iteration=iteration + 1,
+                    )
+                route_run.check(call_model, assistant_message)
+
+            trace.log(f"\n--- Iteration {iteration + 1} ---")
+            trace.log(f"Agent: {assistant_message}")
+
+            answer = yield _Turn(assistant_message, tool_results)
+            if answer:
+                return answer
+            if self.stall_run is not None and self.stall_run.observe(
+                assistant_message, messages
+            ):
+                trace.log(
+                    f"\n\n!!! Stalled ({self.stall_run.reason}), stopping early !!!\n\n"
+                )
+                return NO_ANSWER
+
+        trace.log("\n\n!!! Maximum iterations reached without final answer !!!\n\n")
+        return NO_ANSWER
+
+    def run(
+        self,
+        completion_fn: Callable,
+        handle_turn: Callable[["AgentRun", str, Optional[list]], Optional[str]],
+    ) -> str:
+        """Run the loop with a completion function (litellm.completion's signature).
+
+        Args:
+            completion_fn: The LLM backend
+            handle_turn: Called with (run, assistant_message, tool_results) for
+                every turn; returns the final answer, or appends the follow-up
+                message to run.messages and returns None
+
+        Returns:
+            The final answer, or NO_ANSWER
+        """
+        if self.session_run is not None:
+            completion_fn = self.session_run.wrap_completion(completion_fn)
+        if self.generation_run is not None:
+            completion_fn = self.generation_run.wrap_completion(completion_fn)
+
+        def execute(request):
+            if isinstance(request, _Turn):
+                return handle_turn(self, *request)
+            if request.stream:
+                return stream_and_dispatch(
+                    completion_fn(
+                        model=request.model, messages=request.messages, stream=True
+                    ),
+                    self.tools,
+                    self.on_answer,
+                    self.tool_cache,
+                )
+            return completion_fn(model=request.model, messages=request.messages)
+
+        steps = self._steps()
+        try:
+            request = next(steps)
+            while True:
+                # Errors are raised where the loop made the request (e.g. in its span)
+                try:
+                    result = execute(request)
+                except BaseException as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(result)
+        except StopIteration as stop:
+            return self.finish(stop.value)
+        except BaseException as e:
+            # A failed run is closed too (session file, trace, prefetched calls)
+            self.finish(NO_ANSWER, error=e)
+            raise
+
+    async def arun(
+        self,
+        acompletion_fn: Callable,
+        handle_turn: Callable[["AgentRun", str, Optional[list]], Optional[str]],
+    ) -> str:
+        """Asyncio version of run, with an async completion function.
+
+        The LLM calls are awaited and the turns handled in a worker thread,
+        so many conversations can share one event loop.
+        """
+        if self.session_run is not None:
+            acompletion_fn = self.session_run.wrap_acompletion(acompletion_fn)
+        if self.generation_run is not None:
+            acompletion_fn = self.generation_run.wrap_acompletion(acompletion_fn)
+
+        async def execute(request):
+            if isinstance(request, _Turn):
+                return await asyncio.to_thread(handle_turn, self, *request)
+            if request.stream:
+                return await astream_and_dispatch(
+                    await acompletion_fn(
+                        model=request.model, messages=request.messages, stream=True
+                    ),
+                    self.tools,
+                    self.on_answer,
+                    self.tool_cache,
+                )
+            return await acompletion_fn(model=request.model, messages=request.messages)
+
+        steps = self._steps()
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    result = await execute(request)
+                except BaseException as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(result)
+        except StopIteration as stop:
+            return self.finish(stop.value)
+        except BaseException as e:
+            self.finish(NO_ANSWER, error=e)
+            raise
+
+    def finish(self, answer: str, error: Optional[BaseException] = None) -> str:
+        """Report what the optional features did, close the trace and return answer.
+
+        A run that failed with error is closed the same way, except that its
+        session log gets no finish event, so that it can be resumed.
+        """
+        trace = self.trace
+        session_attributes = {}
+        if self.session_run is not None:
+            if error is None:
+                self.session_run.finish(answer)
+            else:
+                self.session_run.close()
+            trace.log(self.session_run.report())
+            session_attributes = self.session_run.attributes()
+        budget_attributes = {}
+        if self.budget_run is not None:
+            trace.log(self.budget_run.report())
+            budget_attributes = self.budget_run.attributes()
+        routing_attributes = {}
+        if self.route_run is not None:
+            self.route_run.finish()
+            trace.log(self.route_run.report())
+            routing_attributes = self.route_run.attributes()
+        generation_attributes = {}
+        if self.generation_run is not None:
+            self.generation_run.finish()
+            trace.log(self.generation_run.report())
+            generation_attributes = self.generation_run.attributes()
+        stall_attributes = {}
+        if self.stall_run is not None:
+            self.stall_run.finish(answer != NO_ANSWER, self.messages)
+            trace.log(self.stall_run.report())
+            stall_attributes = self.stall_run.attributes()
+        tokens_saved = self.history_run.tokens_saved if self.history_run else 0
+        if self.history_run is not None:
+            trace.log(f"[History compaction saved {tokens_saved} tokens]")
+        prefetch_attributes = {}
+        if self.prefetch_run is not None:
+            prefetch_stats = self.prefetch_run.finish()
+            trace.log(
+                f"[Prefetch: {prefetch_stats.hits} hits, {prefetch_stats.misses} misses, "
+                f"{prefetch_stats.wasted} wasted, hit rate {prefetch_stats.hit_rate:.0%}]"
+            )
+            prefetch_attributes = {
+                "prefetch_hits": prefetch_stats.hits,
+                "prefetch_misses": prefetch_stats.misses,
+                "prefetch_wasted": prefetch_stats.wasted,
+            }
+        error_attributes = {} if error is None else {"error": repr(error)}
+        trace.finish(
+            **error_attributes,
+            history_tokens_saved=tokens_saved,
+            **prefetch_attributes,
+            **budget_attributes,
+            **routing_attributes,
+            **generation_attributes,
+            **stall_attributes,
+            **session_attributes,
+        )
+        return answer
@@ -17,38 +17,61 @@ The agent automatically:
 
 This demonstrates how the manual ReAct patterns from simple_react_loop.py and
 advanced_react_loop.py are abstracted away by production frameworks like smolagents.
+
+Starting the MCP server and discovering its tools takes seconds, so when
+answering several questions pass an MCPSessionPool (see mcp_pool.py): its
+sessions stay warm and are shared by all the runs.
 """
 
-from smolagents import MCPClient, CodeAgent, LiteLLMModel
-from mcp import StdioServerParameters
-from pathlib import Path
+from typing import Optional
+
+from mcp_pool import (
+    MCPSessionPool,
+    ServerParameters,
+    default_server_parameters,
+    http_server_parameters,
+    resolve_output_schemas,
+)
 
 
-def run_agent(question: str, model_id: str = "claude-sonnet-4-5-20250929"):
+def run_agent(
+    question: str,
+    model_id: str = "claude-sonnet-4-5-20250929",
+    pool: Optional[MCPSessionPool] = None,
+    server_parameters: Optional[ServerParameters] = None,
+):
     """Run the agent with MCP tools.
 
     Args:
         question: The question to ask the agent
         model_id: The LiteLLM model ID to use
+        pool: Optional pool of warm MCP sessions. Without it, a new MCP server
+            is started (and stopped) for this question only.
+        server_parameters: MCP server to use without a pool (default: start
+            fast_mcp/server.py over stdio)
 
     Returns:
         The agent's final answer
     """
+    # smolagents (and litellm behind it) take seconds to import, so this is
+    # only paid when a question is actually asked (not for --help)
+    from smolagents import MCPClient, CodeAgent, LiteLLMModel
+
     # Initialize the LiteLLM model
     model = LiteLLMModel(model_id=model_id)
 
-    # Get the directory where this script is located
-    script_dir = Path(__file__).parent
-    mcp_server_path = script_dir / "fast_mcp" / "server.py"
+    # Reuse a warm session (and its already discovered tools) from the pool
+    if pool is not None:
+        with pool.session() as tools:
+            agent = CodeAgent(tools=tools, model=model)
+            return agent.run(question)
 
-    # Configure MCP server parameters
-    server_parameters = StdioServerParameters(
-        command="uv", args=["run", "python", str(mcp_server_path)]
-    )
+    # Configure MCP server parameters (fast_mcp/server.py next to this script)
+    server_parameters = server_parameters or default_server_parameters()
 
     # Run agent with MCP tools
     with MCPClient(server_parameters, structured_output=True) as tools:
-        agent = CodeAgent(tools=tools, model=model)
+        agent = CodeAgent(tools=resolve_output_schemas(tools), model=model)
         result = agent.run(question)
 
         return result
@@ -56,10 +79,6 @@ def run_agent(question: str, model_id: str = "claude-sonnet-4-5-20250929"):
 
 if __name__ == "__main__":
     import argparse
-    from dotenv import load_dotenv
-
-    # Load environment variables
-    load_dotenv()
 
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -69,8 +88,8 @@ if __name__ == "__main__":
         "-q",
         "--question",
         type=str,
-        default="what activity do you suggest to book if I travel to honolulu next week?",
-        help="User question for the agent",
+        action="append",
+        help="User question for the agent (repeat to ask several questions)",
     )
     parser.add_argument(
         "-m",
@@ -79,16 +98,69 @@ if __name__ == "__main__":
         default="claude-sonnet-4-5-20250929",
         help="LiteLLM model ID to use (default: claude-sonnet-4-5-20250929)",
     )
+    parser.add_argument(
+        "--mcp-url",
+        type=str,
+        default=None,
+        help="Connect to a running HTTP MCP server (e.g. http://127.0.0.1:8000/mcp, "
+        "see fast_mcp/server.py --transport http) instead of starting one",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=1,
+        help="Warm MCP sessions shared by the questions, 0 to start a server "
+        "per question (default: 1)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Questions answered at the same time (default: 1)",
+    )
     args = parser.parse_args()
 
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    questions = args.question or [
+        "what activity do you suggest to book if I travel to honolulu next week?"
+    ]
+    server_parameters = http_server_parameters(args.mcp_url) if args.mcp_url else None
+
+    def answer(question: str, pool: Optional[MCPSessionPool]):
+        print("\n=== Starting Agent with MCP Tools ===")
+        print(f"Question: {question}\n")
+        result = run_agent(
+            question=question,
+            model_id=args.model,
+            pool=pool,
+            server_parameters=server_parameters,
+        )
+
+        # Print final answer
+        print(f"\n{'=' * 60}")
+        print("=== Final Answer ===")
+        print(f"{'=' * 60}")
+        print(result)
+        print(f"{'=' * 60}\n")
+
+    def answer_all(pool: Optional[MCPSessionPool]):
+        if args.concurrency <= 1:
+            for question in questions:
+                answer(question, pool)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(lambda q: answer(q, pool), questions))
+
     # Run the agent
-    print("\n=== Starting Agent with MCP Tools ===")
-    print(f"Question: {args.question}\n")
-    result = run_agent(question=args.question, model_id=args.model)
-
-    # Print final answer
-    print(f"\n{'=' * 60}")
-    print("=== Final Answer ===")
-    print(f"{'=' * 60}")
-    print(result)
-    print(f"{'=' * 60}\n")
+    if args.pool_size > 0:
+        with MCPSessionPool(server_parameters, size=args.pool_size) as pool:
+            pool.warm_up()
+            answer_all(pool)
+    else:
+        answer_all(None)
@@ -0,0 +1,375 @@
+"""
+Batch Runner - durable bulk agent runs on worker processes
+
+The scripts answer one --question per process, paying the interpreter and
+import startup for every question, and concurrent_runner.py keeps its batch
+in memory: a crash loses it. This script runs large batches through the
+SQLite job queue of job_queue.py instead:
+1. The questions of a JSONL file are enqueued, idempotently (a question
+   already in the queue, by id or by agent and text, is not added again)
+2. A pool of worker processes pull jobs until the queue is drained; each
+   worker imports its agents once and runs them for job after job
+3. Failed runs (exceptions, or no answer) are retried with exponential
+   backoff, up to --max-attempts; a job whose worker died is picked up again
+   once its lease expires
+4. Each result is stored once, and the done and failed jobs are exported
+   to a JSONL file
+
+Progress and throughput (jobs/s, latency percentiles) are printed while the
+workers run. Ctrl-C (or SIGTERM) stops gracefully: the workers finish their
+in-flight jobs and exit, and running the command again resumes the batch.
+A second Ctrl-C aborts, giving the in-flight jobs back to the queue.
+
+    uv run batch_runner.py --input questions.jsonl --output results.jsonl --workers 8
+"""
+
+from typing import Callable, Optional
+import functools
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import time
+
+from job_queue import JobQueue, read_jsonl
+
+MODEL = "claude-sonnet-4-5-20250929"
+AGENTS = ("simple", "advanced", "two-step")
+
+
+class _Aborted(Exception):
+    """Raised in a worker when it is told to stop in the middle of a job."""
+
+
+def load_agent(
+    name: str, model: str = MODEL, completion_fn: Optional[Callable] = None
+) -> Callable[..., str]:
+    """The entry point of an agent, with its prompt and tools bound.
+
+    Call it with user_request=... to answer a question.
+    """
+    from tools import check_availability_activity, get_weather
+
+    if name == "simple":
+        from prompts import SYSTEM_PROMPT
+        from simple_react_loop import run_agent
+
+        return functools.partial(
+            run_agent,
+            system_prompt=SYSTEM_PROMPT,
+            tools={"get_weather": get_weather},
+            model=model,
+            completion_fn=completion_fn,
+        )
+    if name == "advanced":
+        from advanced_react_loop import run_agent
+        from prompts import ADVANCED_SYSTEM_PROMPT
+
+        return functools.partial(
+            run_agent,
+            system_prompt=ADVANCED_SYSTEM_PROMPT,
+            tools={
+                "get_weather": get_weather,
+                "check_availability_activity": check_availability_activity,
+            },
+            model=model,
+            completion_fn=completion_fn,
+        )
+    if name == "two-step":
+        from prompts import SYSTEM_PROMPT
+        from text_to_tool_to_text import run_two_step_agent
+
+        return functools.partial(
+            run_two_step_agent,
+            system_prompt=SYSTEM_PROMPT,
+            tools={"get_weather": get_weather},
+            model=model,
+            completion_fn=completion_fn,
+        )
+    raise ValueError(f"Unknown agent '{name}', expected one of {AGENTS}")
+
+
+def worker_main(
+    db_path: str,
+    queue_options: dict,
+    stop,
+    mock_latency: Optional[float] = None,
+    poll_interval: float = 0.5,
+):
+    """Run jobs from the queue until it is drained or stop is set.
+
+    Args:
+        db_path: The job queue's database file
+        queue_options: Keyword arguments of JobQueue (max_attempts, ...)
+        stop: multiprocessing.Event set by the parent for a graceful shutdown
+        mock_latency: Use the mock LLM, with this latency, instead of litellm
+        poll_interval: Seconds between claims while the available jobs are
+            waiting for a retry or held by other workers
+    """
+    # Ctrl-C reaches the whole process group: the parent decides what it means
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def abort(signum, frame):
+        raise _Aborted()
+
+    signal.signal(signal.SIGTERM, abort)
+
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(db_path, **queue_options)
+    completion_fn = None
+    if mock_latency is not None:
+        from mock_llm import MockLLM
+
+        completion_fn = MockLLM(latency=mock_latency, seed=os.getpid()).completion
+    # Agents are loaded on their first job, then reused for the whole batch
+    agents: dict[str, Callable] = {}
+
+    job = None
+    try:
+        while not stop.is_set():
+            job = queue.claim(worker)
+            if job is None:
+                # Jobs waiting for a retry or running elsewhere may still come back
+                if queue.counts().remaining == 0:
+                    break
+                stop.wait(poll_interval)
+                continue
+
+            start = time.perf_counter()
+            try:
+                if job.agent not in agents:
+                    agents[job.agent] = load_agent(
+                        job.agent, completion_fn=completion_fn
+                    )
+                answer = agents[job.agent](user_request=job.question)
+                if not answer or answer == "No answer could be found":
+                    raise RuntimeError("no answer")
+            except _Aborted:
+                raise
+            except Exception as e:
+                # Any failure of a run is retried (AssertionError included)
+                queue.fail(job.id, worker, repr(e), time.perf_counter() - start)
+            else:
+                queue.complete(job.id, worker, answer, time.perf_counter() - start)
+            job = None
+    except _Aborted:
+        if job is not None:
+            queue.release(job.id, worker)
+    finally:
+        queue.close()
+
+
+def format_progress(queue: JobQueue, start: float) -> str:
+    """One line of progress: jobs by status and throughput since start."""
+    counts = queue.counts()
+    latencies = sorted(queue.finished_since(start))
+    elapsed = time.time() - start
+    line = (
+        f"[{elapsed:6.1f}s] {counts.done}/{counts.total} done, "
+        f"{counts.failed} failed, {counts.running} running, {counts.pending} pending"
+    )
+    if latencies:
+        p95 = latencies[max(0, round(0.95 * len(latencies)) - 1)]
+        line += (
+            f" | {len(latencies) / elapsed:.2f} jobs/s, "
+            f"latency p50 {statistics.median(latencies):.2f}s p95 {p95:.2f}s"
+        )
+    return line
+
+
+def run_workers(
+    db_path: str,
+    workers: int,
+    queue_options: dict,
+    mock_latency: Optional[float] = None,
+    progress_interval: float = 5.0,
+) -> float:
+    """Run worker processes until the queue is drained or the user stops them.
+
+    Returns:
+        The start time (time.time()) of the workers, for the final report
+    """
+    # spawn: workers start from a clean interpreter, without the parent's
+    # threads and SQLite connection
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    processes = [
+        context.Process(
+            target=worker_main,
+            args=(db_path, queue_options, stop, mock_latency),
+            name=f"worker-{i}",
+        )
+        for i in range(workers)
+    ]
+    interrupts = 0
+
+    def shutdown(signum, frame):
+        nonlocal interrupts
+        interrupts += 1
+        if interrupts == 1:
+            print("\nStopping: finishing the in-flight jobs (Ctrl-C again to abort)")
+            stop.set()
+        else:
+            print("\nAborting: in-flight jobs go back to the queue")
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    previous = {
+        signum: signal.signal(signum, shutdown)
+        for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    start = time.time()
+    queue = JobQueue(db_path, **queue_options)
+    try:
+        for process in processes:
+            process.start()
+        while any(process.is_alive() for process in processes):
+            # Wait for the workers until the next progress line is due
+            deadline = time.monotonic() + progress_interval
+            for process in processes:
+                process.join(timeout=max(0.0, deadline - time.monotonic()))
+            print(format_progress(queue, start), flush=True)
+    finally:
+        queue.close()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return start
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Run a batch of questions through a durable job queue "
+        "on worker processes"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=None,
+        help='JSONL file of questions to enqueue ({"question": ..., "id": ..., '
+        '"agent": ...} per line; already queued ones are skipped)',
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the done and failed jobs to this JSONL file at the end",
+    )
+    parser.add_argument(
+        "--db",
+        type=str,
+        default="jobs.db",
+        help="SQLite file of the job queue (default: jobs.db)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Worker processes; 0 only enqueues and exports (default: 4)",
+    )
+    parser.add_argument(
+        "--agent",
+        choices=AGENTS,
+        default="simple",
+        help="Agent for the questions that do not name one (default: simple)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="Runs of a job before it is marked failed (default: 3)",
+    )
+    parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=5.0,
+        help="Seconds before the first retry, doubled at every attempt (default: 5)",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=600.0,
+        help="Seconds after which the job of a silent worker is run again "
+        "(default: 600)",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Give the failed jobs of a previous batch new attempts",
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        default=5.0,
+        help="Seconds between progress lines (default: 5)",
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="Use the mock LLM backend instead of a real model",
+    )
+    parser.add_argument(
+        "--mock-latency",
+        type=float,
+        default=0.2,
+        help="Seconds per call of the mock LLM (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    # Load environment variables (once the arguments are valid, so --help stays
+    # fast); the workers inherit them
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    queue_options = {
+        "max_attempts": args.max_attempts,
+        "lease_seconds": args.lease,
+        "retry_delay": args.retry_delay,
+    }
+    queue = JobQueue(args.db, **queue_options)
+    if args.input:
+        records = read_jsonl(args.input)
+        unknown = {
+            r["agent"] for r in records if r.get("agent", args.agent) not in AGENTS
+        }
+        if unknown:
+            parser.error(
+                f"unknown agents in {args.input}: {', '.join(sorted(unknown))}"
+            )
+        added = queue.enqueue_many(records, agent=args.agent)
+        print(f"Enqueued {added} of {len(records)} questions ({args.db})")
+    if args.retry_failed:
+        print(f"Retrying {queue.retry_failed()} failed jobs")
+    counts = queue.counts()
+    print(
+        f"Queue: {counts.pending} pending, {counts.running} running, "
+        f"{counts.done} done, {counts.failed} failed"
+    )
+
+    if args.workers > 0 and counts.remaining:
+        done_before = counts.done
+        start = run_workers(
+            args.db,
+            args.workers,
+            queue_options,
+            mock_latency=args.mock_latency if args.mock else None,
+            progress_interval=args.progress,
+        )
+        elapsed = time.time() - start
+        counts = queue.counts()
+        completed = counts.done - done_before
+        print(
+            f"\n{completed} jobs done in {elapsed:.1f}s with {args.workers} workers "
+            f"({completed / elapsed:.2f} jobs/s); {counts.failed} failed, "
+            f"{counts.remaining} left in the queue"
+        )
+
+    if args.output:
+        written = queue.export_jsonl(args.output)
+        print(f"Wrote {written} results to {args.output}")
+    queue.close()
@@ -0,0 +1,230 @@
+"""
+Agent Loop Benchmark
+
+Measures the overhead the agent code itself adds on top of the LLM, using
+the mock backend in mock_llm.py with zero latency so that every measured
+microsecond is spent in our code (prompt building, parsing, tool dispatch).
+
+Reports, for each agent (simple loop, advanced loop, two-step):
+- runs/sec and iterations/sec
+- per-iteration overhead (time per LLM call, excluding the LLM itself)
+
+plus microbenchmarks of parse_response and add_tools_to_prompt.
+
+Each run is appended to a JSONL file (with the git revision), and compared
+to the previous entry so regressions show up over time:
+
+    uv run bench_agent_loop.py --runs 200
+"""
+
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import io
+import json
+import platform
+import subprocess
+import time
+import timeit
+
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT, SYSTEM_PROMPT
+from tools import check_availability_activity, get_weather
+from utils import add_tools_to_prompt, function_to_tool, parse_response
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+
+SAMPLE_RESPONSE = (
+    "<reasoning>The weather is good, let me check outdoor activities.</reasoning>\n"
+    "<tool>check_availability_activity</tool>\n<parameters>tennis</parameters>\n"
+    "<tool>check_availability_activity</tool>\n<parameters>padel</parameters>"
+)
+
+
+def bench_agent(
+    agent_fn, runs: int, malformed_rate: float = 0.0, **agent_kwargs
+) -> dict:
+    """Time `runs` agent runs against a zero-latency mock LLM.
+
+    With malformed_rate > 0 some responses are broken, which measures the
+    cost of the retry iterations they cause.
+    """
+    llm = MockLLM(malformed_rate=malformed_rate)
+    failed = 0
+    # The loops print every step; keep that out of the terminal (not the timing)
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(runs):
+            try:
+                agent_fn(
+                    user_request=QUESTION,
+                    model="mock",
+                    completion_fn=llm.completion,
+                    **agent_kwargs,
+                )
+            except Exception:
+                # Malformed outputs can make a run fail (e.g. two-step asserts)
+                failed += 1
+        elapsed = time.perf_counter() - start
+    return {
+        "runs": runs,
+        "failed_runs": failed,
+        "iterations": llm.calls,
+        "runs_per_sec": runs / elapsed,
+        "iterations_per_sec": llm.calls / elapsed,
+        "overhead_per_iteration_us": elapsed / llm.calls * 1e6,
+    }
+
+
+def bench_micro(number: int) -> dict:
+    """Microbenchmarks of the parsing and prompt-building helpers (µs per call)."""
+    tool_infos = [
+        function_to_tool(get_weather),
+        function_to_tool(check_availability_activity),
+    ]
+    timings = {
+        "parse_response": timeit.timeit(
+            lambda: parse_response(SAMPLE_RESPONSE), number=number
+        ),
+        "add_tools_to_prompt": timeit.timeit(
+            lambda: add_tools_to_prompt(ADVANCED_SYSTEM_PROMPT, tool_infos),
+            number=number,
+        ),
+        "function_to_tool": timeit.timeit(
+            lambda: function_to_tool(check_availability_activity), number=number
+        ),
+    }
+    return {name: seconds / number * 1e6 for name, seconds in timings.items()}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_previous(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            lines = [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def print_comparison(name: str, value: float, previous: Optional[float], unit: str):
+    line = f"  {name:<28} {value:>12.1f} {unit}"
+    if previous:
+        line += f"  ({(value - previous) / previous:+.1%} vs previous)"
+    print(line)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from advanced_react_loop import run_agent as run_advanced
+    from simple_react_loop import run_agent as run_simple
+    from text_to_tool_to_text import run_two_step_agent
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the overhead of the agent loops with a mock LLM"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=200,
+        help="Agent runs per loop (default: 200)",
+    )
+    parser.add_argument(
+        "--micro-number",
+        type=int,
+        default=20000,
+        help="Calls per microbenchmark (default: 20000)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="bench_history.jsonl",
+        help="JSONL file the results are appended to (default: bench_history.jsonl)",
+    )
+    parser.add_argument(
+        "--malformed-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of mock responses to break (default: 0)",
+    )
+    args = parser.parse_args()
+
+    weather_tools = {"get_weather": get_weather}
+    all_tools = {
+        "get_weather": get_weather,
+        "check_availability_activity": check_availability_activity,
+    }
+    loops = {
+        "simple_react_loop": bench_agent(
+            run_simple,
+            args.runs,
+            args.malformed_rate,
+            system_prompt=SYSTEM_PROMPT,
+            tools=weather_tools,
+        ),
+        "advanced_react_loop": bench_agent(
+            run_advanced,
+            args.runs,
+            args.malformed_rate,
+            system_prompt=ADVANCED_SYSTEM_PROMPT,
+            tools=all_tools,
+        ),
+        "two_step_agent": bench_agent(
+            run_two_step_agent,
+            args.runs,
+            args.malformed_rate,
+            system_prompt=SYSTEM_PROMPT,
+            tools=weather_tools,
+        ),
+    }
+    micro = bench_micro(args.micro_number)
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "malformed_rate": args.malformed_rate,
+        "loops": loops,
+        "micro_us": micro,
+    }
+    previous = load_previous(args.output)
+
+    print(f"\n=== Agent loops ({args.runs} runs each, mock LLM, no latency) ===")
+    for name, stats in loops.items():
+        prev = (previous or {}).get("loops", {}).get(name, {})
+        print(f"{name}:")
+        print_comparison(
+            "iterations/sec",
+            stats["iterations_per_sec"],
+            prev.get("iterations_per_sec"),
+            "it/s",
+        )
+        print_comparison(
+            "overhead per iteration",
+            stats["overhead_per_iteration_us"],
+            prev.get("overhead_per_iteration_us"),
+            "µs",
+        )
+    print("\n=== Microbenchmarks ===")
+    for name, value in micro.items():
+        prev = (previous or {}).get("micro_us", {}).get(name)
+        print_comparison(name, value, prev, "µs/call")
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"\nResults appended to {args.output}")
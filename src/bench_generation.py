@@ -0,0 +1,159 @@
+"""
+Generation Limits Benchmark
+
+Compares, on the mock backend, the advanced agent without generation limits
+and with a generation.GenerationPolicy (stop sequences and output caps per
+phase). The mock model keeps generating past the end of some turns, as real
+models do: an invented tool result after a call, small talk after an answer
+(see mock_llm.speculate). Its latency grows with the output tokens.
+
+Reports per configuration: output tokens and mean latency per question,
+iterations per question and failed questions, then the tokens and latency
+saved by the limits.
+
+    uv run bench_generation.py --questions 40 --speculation-rate 0.8
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Optional
+import io
+import statistics
+import time
+
+from advanced_react_loop import run_agent
+from generation import GenerationPolicy
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT
+from tools import check_availability_activity, get_weather
+from tracing import Tracer
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def bench(args, generation: Optional[GenerationPolicy]) -> dict:
+    """Answer --questions questions and summarize output tokens and latency."""
+    llm = MockLLM(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        speculation_rate=args.speculation_rate,
+        seed=1,
+    )
+    tracer = Tracer(max_summaries=args.questions)
+
+    def answer(_) -> tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            result = run_agent(
+                system_prompt=ADVANCED_SYSTEM_PROMPT,
+                user_request=QUESTION,
+                tools=TOOLS,
+                model="mock",
+                completion_fn=llm.completion,
+                tracer=tracer,
+                generation=generation,
+                stream=args.stream,
+            )
+            ok = result != "No answer could be found"
+        except AssertionError:
+            # The advanced loop rejects answers given before both tools ran
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(answer, range(args.questions)))
+
+    summaries = tracer.summaries
+    return {
+        "output_tokens": llm.output_tokens / args.questions,
+        "mean_latency": statistics.mean(latency for latency, _ in outcomes),
+        "iterations": statistics.mean(s.iterations for s in summaries),
+        "failed": sum(not ok for _, ok in outcomes),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare unlimited and phase-aware generation (mock LLM)"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=40,
+        help="Questions per configuration (default: 40)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Questions answered at once (default: 8)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.2,
+        help="Seconds per call before the first token (default: 0.2)",
+    )
+    parser.add_argument(
+        "--token-latency",
+        type=float,
+        default=0.01,
+        help="Seconds per output token (default: 0.01)",
+    )
+    parser.add_argument(
+        "--speculation-rate",
+        type=float,
+        default=0.8,
+        help="Fraction of turns the model continues past their end (default: 0.8)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the LLM output",
+    )
+    args = parser.parse_args()
+
+    configurations = {
+        "no limits": None,
+        "phase-aware limits": GenerationPolicy(
+            tool_max_tokens=256, answer_max_tokens=1024, answer_tools=set(TOOLS)
+        ),
+    }
+    print(
+        f"=== {args.questions} questions per configuration, "
+        f"speculation rate {args.speculation_rate:.0%} ==="
+    )
+    print(
+        f"{'configuration':<20} {'output tok':>11} {'mean':>8} "
+        f"{'iterations':>11} {'failed':>7}"
+    )
+    results = {}
+    for name, generation in configurations.items():
+        stats = results[name] = bench(args, generation)
+        print(
+            f"{name:<20} {stats['output_tokens']:>11.0f} "
+            f"{stats['mean_latency']:>7.2f}s {stats['iterations']:>11.2f} "
+            f"{stats['failed']:>7}"
+        )
+        if generation is not None:
+            totals = generation.stats()
+            print(
+                f"{'':<20} {totals.repaired} turns repaired, "
+                f"{totals.truncated} truncated by max_tokens"
+            )
+
+    baseline, limited = results["no limits"], results["phase-aware limits"]
+    print(
+        f"\nSaved per question: "
+        f"{baseline['output_tokens'] - limited['output_tokens']:.0f} output tokens, "
+        f"{baseline['mean_latency'] - limited['mean_latency']:.2f}s"
+    )
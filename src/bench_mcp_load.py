@@ -0,0 +1,545 @@
+"""
+MCP Load Test
+
+Runs N concurrent CodeAgent sessions against the FastMCP server of
+fast_mcp/server.py, at growing concurrency levels, with a mock model so no
+network (nor API key) is needed. Each session answers one question in
+--tool-steps code steps that call get_weather, then a final_answer step.
+
+Every session's latency is split into:
+- model: time spent in the (mock) model's generate()
+- tool execution: time the server spent running the tools, from its
+  --timing-log
+- MCP transport: the client-side round trip of the tool calls minus their
+  execution (serialization, stdio or HTTP, the MCP session)
+- agent overhead: the rest (prompt rendering, code parsing and execution)
+
+Each tool call gets a unique location, so the server's log lines can be
+matched to the calls (this also means the server's weather cache never hits).
+
+Reports p50/p95/p99 latencies per session and per call, and the throughput,
+for every concurrency level, and writes them to a JSON report that can be
+compared with the report of another version (--compare):
+
+    uv run bench_mcp_load.py --concurrency 1 4 16 --sessions 48 --report mcp_load.json
+    uv run bench_mcp_load.py --compare mcp_load.json
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Optional
+import datetime
+import functools
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from mcp_pool import MCPSessionPool, http_server_parameters
+
+SERVER_PATH = Path(__file__).parent / "fast_mcp" / "server.py"
+QUESTION = "what should I do in honolulu next week?"
+COMPONENTS = ("total", "model", "mcp_transport", "tool_execution", "agent_overhead")
+# Keeps the servers quiet, so their logs do not flood the results table
+SERVER_ENV = {"FASTMCP_LOG_LEVEL": "WARNING"}
+
+# The session running on this thread (set by run_session)
+_current = threading.local()
+# Client-side round trip per call key. Tools run on a thread of smolagents'
+# code executor (for its timeout), so they cannot record into _current.
+_round_trips: dict[str, float] = {}
+
+
+class SessionTiming:
+    """What one agent session spent its time on."""
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.total = 0.0
+        self.model_calls: list[float] = []
+        # Keys of the tool calls written by the model (see call_key)
+        self.tool_calls: list[str] = []
+        self.error: Optional[str] = None
+
+
+def call_key(tool: str, arguments: dict) -> str:
+    """Key matching a client-side tool call to its line in the server's log."""
+    return json.dumps([tool, arguments], sort_keys=True)
+
+
+def make_mock_model(latency: float, tool_steps: int, seed: Optional[int] = None):
+    """A smolagents Model that writes the code of a fixed plan, without network.
+
+    The first tool_steps steps call get_weather, then the last one calls
+    final_answer. Each call sleeps for a lognormal latency of the given mean.
+    """
+    from smolagents import ChatMessage, MessageRole, Model
+    from smolagents.monitoring import TokenUsage
+
+    class MockCodeModel(Model):
+        def __init__(self):
+            super().__init__(model_id="mock")
+            self.rng = random.Random(seed)
+            self.lock = threading.Lock()
+
+        def _latency(self) -> float:
+            if latency <= 0:
+                return 0.0
+            with self.lock:
+                # Same mean as `latency`, with a long tail like real APIs
+                return self.rng.lognormvariate(math.log(latency) - 0.125, 0.5)
+
+        def generate(
+            self,
+            messages,
+            stop_sequences=None,
+            response_format=None,
+            tools_to_call_from=None,
+            **kwargs,
+        ):
+            start = time.perf_counter()
+            timing: SessionTiming = _current.timing
+            step = sum(
+                1
+                for message in messages
+                if getattr(message, "role", None) == MessageRole.ASSISTANT
+            )
+            if step < tool_steps:
+                location = f"honolulu (session {timing.session_id}, step {step})"
+                timing.tool_calls.append(
+                    call_key("get_weather", {"location": location})
+                )
+                content = (
+                    "Thought: I need the weather first.\n<code>\n"
+                    f"weather = get_weather(location={location!r})\n"
+                    "print(weather)\n</code>"
+                )
+            else:
+                content = (
+                    "Thought: I can answer now.\n<code>\n"
+                    'final_answer("Go surfing, the weather is fine.")\n</code>'
+                )
+            time.sleep(self._latency())
+            timing.model_calls.append(time.perf_counter() - start)
+            return ChatMessage(
+                role=MessageRole.ASSISTANT,
+                content=content,
+                token_usage=TokenUsage(input_tokens=0, output_tokens=0),
+            )
+
+    return MockCodeModel()
+
+
+def time_tool_calls(tools: list) -> list:
+    """Record the client-side round trip of every call of the tools in _round_trips.
+
+    The tools of a pooled session are reused by many runs, so they are only
+    wrapped once.
+    """
+    for tool in tools:
+        if getattr(tool, "_load_test_timed", False):
+            continue
+        forward = tool.forward
+
+        @functools.wraps(forward)
+        def timed_forward(*args, _forward=forward, _name=tool.name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _forward(*args, **kwargs)
+            finally:
+                _round_trips[call_key(_name, kwargs)] = time.perf_counter() - start
+
+        tool.forward = timed_forward
+        tool._load_test_timed = True
+    return tools
+
+
+def run_session(session_id: int, pool: MCPSessionPool, model) -> SessionTiming:
+    """Answer QUESTION with a CodeAgent on a pooled MCP session."""
+    from smolagents import CodeAgent
+    from smolagents.monitoring import LogLevel
+
+    timing = _current.timing = SessionTiming(session_id)
+    start = time.perf_counter()
+    try:
+        with pool.session() as tools:
+            agent = CodeAgent(
+                tools=time_tool_calls(tools),
+                model=model,
+                verbosity_level=LogLevel.OFF,
+            )
+            agent.run(QUESTION)
+    except Exception as e:
+        timing.error = repr(e)
+    finally:
+        timing.total = time.perf_counter() - start
+        _current.timing = None
+    return timing
+
+
+def read_timing_log(path: str, offset: int = 0) -> dict[str, float]:
+    """Server-side execution time per call key, from the line at offset on."""
+    executions = {}
+    with open(path, encoding="utf-8") as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            executions[call_key(record["tool"], record["arguments"] or {})] = record[
+                "seconds"
+            ]
+    return executions
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p95/p99/mean of values, in milliseconds (nearest-rank percentiles)."""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(q: float) -> float:
+        return values[max(0, math.ceil(q * len(values)) - 1)]
+
+    return {
+        name: round(value * 1000, 3)
+        for name, value in (
+            ("p50", rank(0.50)),
+            ("p95", rank(0.95)),
+            ("p99", rank(0.99)),
+            ("mean", statistics.mean(values)),
+        )
+    }
+
+
+def summarize(
+    timings: list[SessionTiming], executions: dict[str, float], seconds: float
+) -> dict:
+    """Latency breakdown and throughput of one concurrency level."""
+    sessions = {component: [] for component in COMPONENTS}
+    calls = {"model": [], "mcp_transport": [], "tool_execution": []}
+    unmatched = 0
+    for timing in timings:
+        if timing.error:
+            continue
+        execution = transport = 0.0
+        round_trips = 0.0
+        for key in timing.tool_calls:
+            if key not in executions or key not in _round_trips:
+                unmatched += 1
+                continue
+            round_trips += _round_trips[key]
+            execution += executions[key]
+            transport += _round_trips[key] - executions[key]
+            calls["tool_execution"].append(executions[key])
+            calls["mcp_transport"].append(_round_trips[key] - executions[key])
+        model = sum(timing.model_calls)
+        calls["model"].extend(timing.model_calls)
+        sessions["total"].append(timing.total)
+        sessions["model"].append(model)
+        sessions["mcp_transport"].append(transport)
+        sessions["tool_execution"].append(execution)
+        sessions["agent_overhead"].append(timing.total - model - round_trips)
+
+    completed = len(sessions["total"])
+    tool_calls = sum(len(timing.tool_calls) for timing in timings)
+    return {
+        "sessions": len(timings),
+        "errors": len(timings) - completed,
+        "error_samples": sorted({t.error for t in timings if t.error})[:3],
+        "seconds": round(seconds, 3),
+        "throughput": {
+            "sessions_per_second": round(completed / seconds, 3),
+            "tool_calls_per_second": round(tool_calls / seconds, 3),
+        },
+        "unmatched_tool_calls": unmatched,
+        "session_latency_ms": {
+            component: percentiles(values) for component, values in sessions.items()
+        },
+        "call_latency_ms": {
+            component: percentiles(values) for component, values in calls.items()
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def http_server(timing_log: str, timeout: float = 30.0):
+    """Start server.py over HTTP on a free port and yield its URL."""
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(SERVER_PATH),
+            "--transport",
+            "http",
+            "--port",
+            str(port),
+            "--timing-log",
+            timing_log,
+            "--no-banner",
+        ],
+        env={**os.environ, **SERVER_ENV},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"MCP server exited with code {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"MCP server not listening after {timeout}s")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/mcp"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_level(
+    concurrency: int,
+    sessions: int,
+    server_parameters,
+    timing_log: str,
+    model,
+) -> dict:
+    """Run sessions agent sessions, concurrency at a time, on a warm pool."""
+    with MCPSessionPool(server_parameters, size=concurrency) as pool:
+        # Connecting (and, over stdio, starting the servers) is not measured
+        start = time.perf_counter()
+        pool.warm_up()
+        warm_up = time.perf_counter() - start
+
+        offset = os.path.getsize(timing_log) if os.path.exists(timing_log) else 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = list(
+                executor.map(
+                    lambda i: run_session(i, pool, model),
+                    range(sessions),
+                )
+            )
+        seconds = time.perf_counter() - start
+        restarts = pool.restarts
+
+    executions = (
+        read_timing_log(timing_log, offset) if os.path.exists(timing_log) else {}
+    )
+    return {
+        "concurrency": concurrency,
+        "warm_up_seconds": round(warm_up, 3),
+        "pool_restarts": restarts,
+        **summarize(timings, executions, seconds),
+    }
+
+
+def environment() -> dict:
+    """Versions of what is being measured, to tell reports apart."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    packages = {}
+    for package in ("smolagents", "mcp", "fastmcp", "mcpadapt"):
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": packages,
+    }
+
+
+def format_level(level: dict) -> str:
+    """One row of the results table (p50/p95/p99 in ms)."""
+    latency = level["session_latency_ms"]
+
+    def cell(component: str) -> str:
+        values = latency.get(component)
+        if not values:
+            return f"{'-':>20}"
+        return f"{values['p50']:>6.0f}/{values['p95']:>6.0f}/{values['p99']:>6.0f}"
+
+    return (
+        f"{level['concurrency']:>5} {level['throughput']['sessions_per_second']:>10.2f} "
+        f"{cell('total')} {cell('model')} {cell('mcp_transport')} "
+        f"{cell('tool_execution')} {level['errors']:>7}"
+    )
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """Differences of throughput and p95 latencies between two reports."""
+    lines = [
+        f"Compared with {old.get('created', '?')} "
+        f"(commit {old.get('environment', {}).get('git_commit')}):"
+    ]
+    old_levels = {level["concurrency"]: level for level in old["levels"]}
+
+    def change(before: float, after: float) -> str:
+        if not before:
+            return f"{before:.1f} -> {after:.1f}"
+        return f"{before:.1f} -> {after:.1f} ({(after - before) / before:+.0%})"
+
+    for level in new["levels"]:
+        before = old_levels.get(level["concurrency"])
+        if before is None:
+            continue
+        parts = [
+            "sessions/s "
+            + change(
+                before["throughput"]["sessions_per_second"],
+                level["throughput"]["sessions_per_second"],
+            )
+        ]
+        for component in ("total", "model", "mcp_transport", "tool_execution"):
+            old_p95 = before["session_latency_ms"].get(component, {}).get("p95")
+            new_p95 = level["session_latency_ms"].get(component, {}).get("p95")
+            if old_p95 is not None and new_p95 is not None:
+                parts.append(f"{component} p95 {change(old_p95, new_p95)}ms")
+        lines.append(f"  concurrency {level['concurrency']}: " + "; ".join(parts))
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Load-test CodeAgent sessions against the FastMCP server "
+        "(mock model)"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16],
+        help="Concurrency levels to run (default: 1 2 4 8 16)",
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        default=32,
+        help="Agent sessions per concurrency level (default: 32)",
+    )
+    parser.add_argument(
+        "--tool-steps",
+        type=int,
+        default=2,
+        help="Steps calling get_weather before the final answer (default: 2)",
+    )
+    parser.add_argument(
+        "--model-latency",
+        type=float,
+        default=0.05,
+        help="Mean seconds per call of the mock model (default: 0.05)",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["http", "stdio"],
+        default="http",
+        help="http: one server shared by all sessions; stdio: one server "
+        "subprocess per pooled session (default: http)",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default="mcp_load_report.json",
+        help="JSON report to write (default: mcp_load_report.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Previous JSON report to compare the results with",
+    )
+    args = parser.parse_args()
+
+    from mcp import StdioServerParameters
+
+    # Read first, the new report may overwrite it
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    print(
+        f"=== {args.sessions} sessions per level, {args.tool_steps} tool steps, "
+        f"mock model {args.model_latency * 1000:.0f}ms, {args.transport} ==="
+    )
+    print(
+        f"{'conc':>5} {'sessions/s':>10} {'total p50/p95/p99':>20} "
+        f"{'model':>20} {'mcp transport':>20} {'tool execution':>20} {'errors':>7}"
+    )
+    model = make_mock_model(args.model_latency, args.tool_steps, seed=1)
+    levels = []
+    with tempfile.TemporaryDirectory() as tmp:
+        timing_log = os.path.join(tmp, "tool_timings.jsonl")
+        server = nullcontext() if args.transport == "stdio" else http_server(timing_log)
+        with server as url:
+            if url is None:
+                server_parameters = StdioServerParameters(
+                    command=sys.executable,
+                    args=[str(SERVER_PATH), "--timing-log", timing_log, "--no-banner"],
+                    env=SERVER_ENV,
+                )
+            else:
+                server_parameters = http_server_parameters(url)
+            for concurrency in args.concurrency:
+                level = run_level(
+                    concurrency, args.sessions, server_parameters, timing_log, model
+                )
+                levels.append(level)
+                print(format_level(level), flush=True)
+
+    report = {
+        "benchmark": "mcp_load",
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"
+        ),
+        "environment": environment(),
+        "config": {
+            "transport": args.transport,
+            "sessions": args.sessions,
+            "tool_steps": args.tool_steps,
+            "model_latency": args.model_latency,
+            "question": QUESTION,
+        },
+        "levels": levels,
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+    if previous is not None:
+        print("\n" + "\n".join(compare(previous, report)))
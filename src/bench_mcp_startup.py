@@ -0,0 +1,89 @@
+"""
+MCP Startup Latency Benchmark
+
+Measures how long an agent run waits before its first MCP tool result:
+- cold: a new MCPClient per run (start the server, handshake, discover the
+  tools, call get_weather, shut down), which is what agent_with_mcp.run_agent
+  does without a pool
+- pooled: a session checked out of a warm MCPSessionPool, then get_weather
+
+No LLM is involved, so the numbers are pure MCP overhead:
+
+    uv run bench_mcp_startup.py --runs 5
+"""
+
+import statistics
+import time
+
+from smolagents import MCPClient
+
+from mcp_pool import MCPSessionPool, default_server_parameters
+
+
+def first_tool_result(tools) -> float:
+    """Call get_weather once and return how long it took."""
+    start = time.perf_counter()
+    get_weather = next(tool for tool in tools if tool.name == "get_weather")
+    get_weather(location="honolulu")
+    return time.perf_counter() - start
+
+
+def bench_cold(runs: int) -> list[float]:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with MCPClient(default_server_parameters(), structured_output=True) as tools:
+            first_tool_result(tools)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_pooled(runs: int, pool: MCPSessionPool) -> list[float]:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with pool.session() as tools:
+            first_tool_result(tools)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def print_stats(name: str, latencies: list[float]):
+    print(
+        f"{name:<10} mean {statistics.mean(latencies) * 1000:>9.1f} ms  "
+        f"p50 {statistics.median(latencies) * 1000:>9.1f} ms  "
+        f"max {max(latencies) * 1000:>9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare cold and pooled MCP session startup latency"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Runs per mode (default: 5)",
+    )
+    args = parser.parse_args()
+
+    print(f"=== Time to first get_weather result ({args.runs} runs each) ===")
+    cold = bench_cold(args.runs)
+    print_stats("cold", cold)
+
+    with MCPSessionPool(size=1) as pool:
+        start = time.perf_counter()
+        pool.warm_up()
+        print(
+            f"(pool warm-up, paid once: {(time.perf_counter() - start) * 1000:.1f} ms)"
+        )
+        pooled = bench_pooled(args.runs, pool)
+    print_stats("pooled", pooled)
+
+    print(
+        f"\nPooled sessions start {statistics.median(cold) / statistics.median(pooled):.1f}x "
+        "faster (median)"
+    )
@@ -0,0 +1,146 @@
+"""
+parse_response Benchmark
+
+Compares the single-pass tag scanner behind utils.parse_response with the
+previous implementation, which ran a separate uncompiled re.search per tag
+(plus one more sweep to collect all the tool calls).
+
+The responses are large (100KB+ by default): long multi-line reasoning
+followed by several tool calls, which is where repeated scans hurt most.
+
+    uv run bench_parse_response.py --size-kb 200
+"""
+
+import re
+import timeit
+
+from utils import ParsedResponse, ToolCall, parse_response
+
+
+def legacy_parse_response(response_text: str) -> ParsedResponse:
+    """The regex-chain parser that parse_response replaced."""
+    answer = None
+    tool = None
+    params = None
+    reasoning = None
+
+    reasoning_match = re.search(
+        r"<reasoning>(.*?)</reasoning>", response_text, re.DOTALL
+    )
+    if reasoning_match:
+        reasoning = reasoning_match.group(1).strip()
+
+    answer_match = re.search(r"<answer>(.*?)</answer>", response_text, re.DOTALL)
+    if answer_match:
+        answer = answer_match.group(1).strip()
+
+    tool_match = re.search(r"<tool>(.*?)</tool>", response_text)
+    if tool_match:
+        tool = tool_match.group(1).strip()
+        params_match = re.search(r"<parameters>(.*?)</parameters>", response_text)
+        if params_match:
+            params = params_match.group(1).strip()
+
+    tool_calls = []
+    tool_matches = list(re.finditer(r"<tool>(.*?)</tool>", response_text))
+    for i, match in enumerate(tool_matches):
+        end = (
+            tool_matches[i + 1].start()
+            if i + 1 < len(tool_matches)
+            else len(response_text)
+        )
+        call_params_match = re.search(
+            r"<parameters>(.*?)</parameters>", response_text[match.end() : end]
+        )
+        tool_calls.append(
+            ToolCall(
+                name=match.group(1).strip(),
+                params=call_params_match.group(1).strip()
+                if call_params_match
+                else None,
+            )
+        )
+
+    return ParsedResponse(
+        answer=answer,
+        tool=tool,
+        params=params,
+        reasoning=reasoning,
+        tool_calls=tuple(tool_calls),
+    )
+
+
+def make_response(size_kb: int, tool_calls: int = 6, answer: bool = False) -> str:
+    """Build a response of roughly size_kb KB of reasoning plus tool calls."""
+    line = "The weather in honolulu is sunny, outdoor activities are a good fit.\n"
+    reasoning = line * (size_kb * 1024 // len(line) + 1)
+    activities = [
+        "tennis",
+        "padel",
+        "soccer",
+        "scuba lesson",
+        "yoga lesson",
+        "cooking class",
+    ]
+    calls = "".join(
+        "<tool>check_availability_activity</tool>"
+        f"<parameters>{activities[i % len(activities)]}</parameters>\n"
+        for i in range(tool_calls)
+    )
+    text = f"<reasoning>{reasoning}</reasoning>\n{calls}"
+    if answer:
+        text += "<answer>Book tennis at 3PM next Thursday.</answer>"
+    return text
+
+
+def bench(response_text: str, number: int) -> tuple[float, float]:
+    """Return (legacy, new) microseconds per call."""
+    legacy = timeit.timeit(lambda: legacy_parse_response(response_text), number=number)
+    new = timeit.timeit(lambda: parse_response(response_text), number=number)
+    return legacy / number * 1e6, new / number * 1e6
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark parse_response against the legacy regex chain"
+    )
+    parser.add_argument(
+        "--size-kb",
+        type=int,
+        default=128,
+        help="Approximate size of the large responses in KB (default: 128)",
+    )
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=200,
+        help="Calls per measurement (default: 200)",
+    )
+    args = parser.parse_args()
+
+    cases = {
+        "small tool call": make_response(0, tool_calls=1),
+        f"{args.size_kb}KB, 6 tool calls": make_response(args.size_kb),
+        f"{args.size_kb}KB, answer": make_response(
+            args.size_kb, tool_calls=0, answer=True
+        ),
+        f"{args.size_kb}KB, 6 tool calls + answer": make_response(
+            args.size_kb, answer=True
+        ),
+    }
+
+    print(f"{'case':<34} {'legacy µs':>12} {'scanner µs':>12} {'speedup':>9}")
+    for name, text in cases.items():
+        # Both parsers must agree on these single-line tags
+        legacy_result = legacy_parse_response(text)
+        new_result = parse_response(text)
+        assert legacy_result.answer == new_result.answer
+        assert legacy_result.reasoning == new_result.reasoning
+        assert legacy_result.tool_calls == new_result.tool_calls
+
+        legacy_us, new_us = bench(text, args.number)
+        print(
+            f"{name:<34} {legacy_us:>12.1f} {new_us:>12.1f} {legacy_us / new_us:>8.2f}x"
+        )
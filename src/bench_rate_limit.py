@@ -0,0 +1,177 @@
+"""
+Rate Limit Benchmark
+
+Runs many agents at once against mock_llm.ThrottlingLLM, a local fake
+provider that rejects requests over its rate limit (429) or its concurrency
+limit (529), first calling it directly and then through
+rate_limit.RateLimitedClient. Reports failed runs, throttled calls, retries
+and wall time for both, with the async loop (concurrent_runner) and with
+the sync loop on threads.
+
+The provider window is scaled down (a "minute" of --window seconds) so the
+benchmark runs in seconds:
+
+    uv run bench_rate_limit.py --questions 40 --concurrency 16
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Optional
+import asyncio
+import io
+import time
+
+from concurrent_runner import QuestionResult, run_questions
+from mock_llm import MockLLM, ThrottlingLLM
+from prompts import SYSTEM_PROMPT
+from rate_limit import RateLimitedClient
+from simple_react_loop import run_agent, run_agent_async
+from tools import get_weather
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+
+
+def make_provider(args) -> ThrottlingLLM:
+    return ThrottlingLLM(
+        MockLLM(latency=args.latency),
+        requests_per_window=args.provider_rpm,
+        window=args.window,
+        max_concurrency=args.provider_concurrency,
+    )
+
+
+def make_client(args, provider: ThrottlingLLM) -> RateLimitedClient:
+    # The client only knows the published limits, expressed per (scaled) minute
+    return RateLimitedClient(
+        provider.completion,
+        provider.acompletion,
+        requests_per_minute=args.provider_rpm * 60 / args.window,
+        burst_seconds=args.window / 10,
+        initial_concurrency=2,
+        base_delay=args.window / 20,
+        max_delay=args.window,
+        max_retries=8,
+        seed=0,
+    )
+
+
+def bench_async(args, use_client: bool) -> dict:
+    provider = make_provider(args)
+    client = make_client(args, provider) if use_client else None
+    acompletion_fn = client.acompletion if client else provider.acompletion
+    start = time.perf_counter()
+    results = asyncio.run(
+        run_questions(
+            [QUESTION] * args.questions,
+            run_agent_async,
+            concurrency=args.concurrency,
+            system_prompt=SYSTEM_PROMPT,
+            tools={"get_weather": get_weather},
+            model="mock",
+            acompletion_fn=acompletion_fn,
+        )
+    )
+    return summarize(results, provider, client, time.perf_counter() - start)
+
+
+def bench_sync(args, use_client: bool) -> dict:
+    provider = make_provider(args)
+    client = make_client(args, provider) if use_client else None
+    completion_fn = client.completion if client else provider.completion
+
+    def run_one(question: str) -> QuestionResult:
+        start = time.perf_counter()
+        try:
+            answer = run_agent(
+                SYSTEM_PROMPT,
+                question,
+                {"get_weather": get_weather},
+                "mock",
+                completion_fn=completion_fn,
+            )
+            return QuestionResult(question, answer, time.perf_counter() - start)
+        except Exception as e:
+            return QuestionResult(question, None, time.perf_counter() - start, str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(run_one, [QUESTION] * args.questions))
+    return summarize(results, provider, client, time.perf_counter() - start)
+
+
+def summarize(
+    results: list[QuestionResult],
+    provider: ThrottlingLLM,
+    client: Optional[RateLimitedClient],
+    elapsed: float,
+) -> dict:
+    stats = client.stats() if client else None
+    return {
+        "failed_runs": sum(1 for r in results if r.error is not None),
+        "provider_rejections": provider.rejected,
+        "retries": stats.retries if stats else 0,
+        "final_concurrency": stats.concurrency_limit if stats else None,
+        "elapsed": elapsed,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the rate limiting layer against a throttling mock"
+    )
+    parser.add_argument(
+        "--questions", type=int, default=40, help="Agent runs (default: 40)"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Concurrent agent runs (default: 16)",
+    )
+    parser.add_argument(
+        "--provider-rpm",
+        type=int,
+        default=30,
+        help="Requests the fake provider accepts per window (default: 30)",
+    )
+    parser.add_argument(
+        "--provider-concurrency",
+        type=int,
+        default=4,
+        help="Calls the fake provider accepts in flight (default: 4)",
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=2.0,
+        help="Length of the provider rate window in seconds (default: 2)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Mock LLM latency in seconds (default: 0.05)",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<30} {'failed runs':>12} {'429/529s':>9} {'retries':>8} "
+        f"{'concurrency':>12} {'time':>8}"
+    )
+    for name, bench in (("async", bench_async), ("sync (threads)", bench_sync)):
+        for use_client in (False, True):
+            # Let the provider window of the previous case expire
+            time.sleep(args.window)
+            with redirect_stdout(io.StringIO()):
+                result = bench(args, use_client)
+            mode = f"{name}, {'rate limited' if use_client else 'direct'}"
+            concurrency = result["final_concurrency"]
+            print(
+                f"{mode:<30} {result['failed_runs']:>12} "
+                f"{result['provider_rejections']:>9} {result['retries']:>8} "
+                f"{concurrency if concurrency is None else round(concurrency, 1)!s:>12} "
+                f"{result['elapsed']:>7.2f}s"
+            )
@@ -0,0 +1,205 @@
+"""
+Model Routing Benchmark
+
+Compares the advanced agent with a single strong model against the
+routing.ModelRouter cascade (tool-selection turns on a fast model, answers
+on the strong one), on the mock backend. Each model is a MockLLM with its
+own latency and error rate: the fast model is several times quicker and
+cheaper, but breaks some of its outputs.
+
+Reports, per configuration: mean and p95 latency per question, cost per
+question (at the --*-price rates, per million input / output tokens), calls
+per model and failed questions.
+
+    uv run bench_routing.py --questions 40 --fast-malformed-rate 0.1
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Optional
+import io
+import statistics
+import time
+
+from advanced_react_loop import run_agent
+from budget import Budget
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT
+from routing import ModelRouter
+from tools import check_availability_activity, get_weather
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+STRONG_MODEL = "mock-strong"
+FAST_MODEL = "mock-fast"
+
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+class MockModels:
+    """Dispatches completion calls to one MockLLM per model name."""
+
+    def __init__(self, llms: dict[str, MockLLM]):
+        self.llms = llms
+
+    def completion(self, model: str, messages: list, **kwargs):
+        return self.llms[model].completion(model, messages, **kwargs)
+
+
+def price_table(args) -> dict[str, tuple[float, float]]:
+    """Dollars per million (input, output) tokens of each mock model."""
+    return {
+        STRONG_MODEL: (args.strong_price[0], args.strong_price[1]),
+        FAST_MODEL: (args.fast_price[0], args.fast_price[1]),
+    }
+
+
+def bench(args, router: Optional[ModelRouter]) -> dict:
+    """Answer --questions questions and summarize latency, cost and calls."""
+    models = MockModels(
+        {
+            STRONG_MODEL: MockLLM(
+                latency=args.strong_latency,
+                latency_distribution="lognormal",
+                malformed_rate=args.strong_malformed_rate,
+                seed=1,
+            ),
+            FAST_MODEL: MockLLM(
+                latency=args.fast_latency,
+                latency_distribution="lognormal",
+                malformed_rate=args.fast_malformed_rate,
+                seed=2,
+            ),
+        }
+    )
+    prices = price_table(args)
+    # A budget without limits, only to account for the cost of every call
+    budget = Budget(
+        cost_fn=lambda model, prompt_tokens, completion_tokens: (
+            (prompt_tokens * prices[model][0] + completion_tokens * prices[model][1])
+            / 1_000_000
+        )
+    )
+
+    def answer(_) -> tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            result = run_agent(
+                system_prompt=ADVANCED_SYSTEM_PROMPT,
+                user_request=QUESTION,
+                tools=TOOLS,
+                model=STRONG_MODEL,
+                completion_fn=models.completion,
+                budget=budget,
+                router=router,
+            )
+            ok = result != "No answer could be found"
+        except AssertionError:
+            # The advanced loop rejects answers given before both tools ran
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(answer, range(args.questions)))
+
+    latencies = sorted(latency for latency, _ in outcomes)
+    return {
+        "mean_latency": statistics.mean(latencies),
+        "p95_latency": latencies[max(0, round(0.95 * len(latencies)) - 1)],
+        "cost_per_question": budget.total_cost / args.questions,
+        "tokens_per_question": budget.total_tokens / args.questions,
+        "strong_calls": models.llms[STRONG_MODEL].calls,
+        "fast_calls": models.llms[FAST_MODEL].calls,
+        "failed": sum(not ok for _, ok in outcomes),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare a single model with fast/strong model routing (mock LLM)"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=40,
+        help="Questions per configuration (default: 40)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Questions answered at once (default: 8)",
+    )
+    parser.add_argument(
+        "--strong-latency",
+        type=float,
+        default=0.4,
+        help="Mean seconds per call of the strong model (default: 0.4)",
+    )
+    parser.add_argument(
+        "--fast-latency",
+        type=float,
+        default=0.1,
+        help="Mean seconds per call of the fast model (default: 0.1)",
+    )
+    parser.add_argument(
+        "--strong-malformed-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of broken outputs of the strong model (default: 0)",
+    )
+    parser.add_argument(
+        "--fast-malformed-rate",
+        type=float,
+        default=0.1,
+        help="Fraction of broken outputs of the fast model (default: 0.1)",
+    )
+    parser.add_argument(
+        "--strong-price",
+        type=float,
+        nargs=2,
+        default=(3.0, 15.0),
+        metavar=("INPUT", "OUTPUT"),
+        help="Dollars per million input and output tokens (default: 3 15)",
+    )
+    parser.add_argument(
+        "--fast-price",
+        type=float,
+        nargs=2,
+        default=(1.0, 5.0),
+        metavar=("INPUT", "OUTPUT"),
+        help="Dollars per million input and output tokens (default: 1 5)",
+    )
+    args = parser.parse_args()
+
+    configurations = {
+        "strong model only": None,
+        "fast/strong routing": ModelRouter(FAST_MODEL, answer_tools=set(TOOLS)),
+    }
+    print(
+        f"=== {args.questions} questions per configuration, "
+        f"concurrency {args.concurrency} ==="
+    )
+    print(
+        f"{'configuration':<22} {'mean':>8} {'p95':>8} {'$/question':>11} "
+        f"{'tokens':>7} {'strong':>7} {'fast':>6} {'failed':>7}"
+    )
+    for name, router in configurations.items():
+        stats = bench(args, router)
+        print(
+            f"{name:<22} {stats['mean_latency']:>7.2f}s {stats['p95_latency']:>7.2f}s "
+            f"{stats['cost_per_question']:>11.5f} {stats['tokens_per_question']:>7.0f} "
+            f"{stats['strong_calls']:>7} {stats['fast_calls']:>6} {stats['failed']:>7}"
+        )
+        if router is not None:
+            routing = router.stats()
+            print(
+                f"{'':<22} {routing.fast_share:.0%} of the calls on the fast model, "
+                f"{routing.rejected} fast turns redone by the strong model"
+            )
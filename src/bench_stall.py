@@ -0,0 +1,198 @@
+"""
+Stall Detection Benchmark
+
+Runs the advanced agent on the mock backend, with some agents that get
+stuck once they know the weather: they call get_weather again and again,
+or keep thinking out loud without a tool call nor an answer. A stuck agent
+follows the forcing prompt of the monitor with probability --obey-rate,
+and otherwise keeps going in circles.
+
+Compares the runs without and with a stall.StallMonitor. Reports per
+configuration: LLM calls and prompt tokens per question, mean latency and
+answered questions, then what the monitor did (calls served from the run,
+forcing prompts, aborted and recovered runs) and the iterations and tokens
+it estimates it saved.
+
+    uv run bench_stall.py --questions 40 --stuck-rate 0.5 --obey-rate 0.5
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Callable, Optional
+import io
+import random
+import statistics
+import time
+
+from advanced_react_loop import run_agent
+from mock_llm import MockLLM, scripted_travel_agent
+from prompts import ADVANCED_SYSTEM_PROMPT
+from stall import StallMonitor
+from tools import check_availability_activity, get_weather
+from utils import message_text
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def stuck_agent(
+    stuck_rate: float, obey_rate: float, seed: int = 0
+) -> Callable[[list], str]:
+    """Mock responses of a travel agent that sometimes goes in circles.
+
+    Whether a run gets stuck, how, and whether it follows a forcing prompt
+    is drawn once per question, so both configurations see the same agents.
+    """
+
+    def respond(messages: list) -> str:
+        rng = random.Random(f"{seed}:{message_text(messages[1])}")
+        stuck = rng.random() < stuck_rate
+        kind = rng.choice(["repeat", "format"])
+        obeys = rng.random() < obey_rate
+        forced = any(
+            "Do not repeat yourself" in message_text(m)
+            for m in messages
+            if m["role"] == "user"
+        )
+        knows_weather = any(
+            "Tool 'get_weather' returned" in message_text(m)
+            for m in messages
+            if m["role"] == "user"
+        )
+        if not stuck or not knows_weather:
+            return scripted_travel_agent(messages)
+        if forced and obeys:
+            return scripted_travel_agent(messages)
+        if kind == "repeat":
+            return (
+                "<reasoning>Let me double check the weather first.</reasoning>\n"
+                "<tool>get_weather</tool>\n<parameters>honolulu</parameters>"
+            )
+        return "Let me think about which activity would fit this weather best."
+
+    return respond
+
+
+def bench(args, stall: Optional[StallMonitor]) -> dict:
+    """Answer --questions questions and count the LLM calls and prompt tokens."""
+    llm = MockLLM(
+        latency=args.latency,
+        responses=stuck_agent(args.stuck_rate, args.obey_rate),
+        seed=1,
+    )
+    prompt_tokens = []
+
+    def completion(model: str, messages: list, **kwargs):
+        response = llm.completion(model=model, messages=messages, **kwargs)
+        prompt_tokens.append(response.usage.prompt_tokens)
+        return response
+
+    def answer(i: int) -> tuple[float, bool]:
+        start = time.perf_counter()
+        result = run_agent(
+            system_prompt=ADVANCED_SYSTEM_PROMPT,
+            user_request=f"{QUESTION} (trip {i})",
+            tools=TOOLS,
+            model="mock",
+            completion_fn=completion,
+            max_iterations=args.max_iterations,
+            stall=stall,
+        )
+        return time.perf_counter() - start, result != "No answer could be found"
+
+    with redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(answer, range(args.questions)))
+
+    return {
+        "llm_calls": llm.calls / args.questions,
+        "prompt_tokens": sum(prompt_tokens) / args.questions,
+        "mean_latency": statistics.mean(latency for latency, _ in outcomes),
+        "answered": sum(ok for _, ok in outcomes),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare runs without and with stall detection (mock LLM)"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=40,
+        help="Questions per configuration (default: 40)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Questions answered at once (default: 8)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds per LLM call (default: 0.05)",
+    )
+    parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=10,
+        help="Maximum iterations per run (default: 10)",
+    )
+    parser.add_argument(
+        "--stuck-rate",
+        type=float,
+        default=0.5,
+        help="Fraction of the agents that go in circles (default: 0.5)",
+    )
+    parser.add_argument(
+        "--obey-rate",
+        type=float,
+        default=0.5,
+        help="Fraction of the stuck agents that follow a forcing prompt (default: 0.5)",
+    )
+    args = parser.parse_args()
+
+    configurations = {
+        "no monitor": None,
+        "stall monitor": StallMonitor(force_after=2, abort_after=4),
+    }
+    print(
+        f"=== {args.questions} questions per configuration, {args.stuck_rate:.0%} "
+        f"stuck agents, {args.obey_rate:.0%} of them follow a forcing prompt ==="
+    )
+    print(
+        f"{'configuration':<16} {'LLM calls':>10} {'prompt tok':>11} "
+        f"{'mean':>8} {'answered':>9}"
+    )
+    results = {}
+    for name, stall in configurations.items():
+        stats = results[name] = bench(args, stall)
+        print(
+            f"{name:<16} {stats['llm_calls']:>10.2f} {stats['prompt_tokens']:>11.0f} "
+            f"{stats['mean_latency']:>7.2f}s {stats['answered']:>5}/{args.questions}"
+        )
+        if stall is not None:
+            totals = stall.stats()
+            print(
+                f"{'':<16} {totals.cached_calls} repeated calls served, "
+                f"{totals.forced} forcing prompts, {totals.aborted} runs aborted, "
+                f"{totals.recovered} recovered; estimated savings "
+                f"{totals.iterations_saved} iterations / ~{totals.tokens_saved} tokens"
+            )
+
+    baseline, monitored = results["no monitor"], results["stall monitor"]
+    print(
+        f"\nSaved per question: "
+        f"{baseline['llm_calls'] - monitored['llm_calls']:.2f} LLM calls, "
+        f"{baseline['prompt_tokens'] - monitored['prompt_tokens']:.0f} prompt tokens, "
+        f"{baseline['mean_latency'] - monitored['mean_latency']:.2f}s"
+    )
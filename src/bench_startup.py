@@ -0,0 +1,143 @@
+"""
+Startup Benchmark
+
+Short-lived scripts (batch jobs, --help, cache replays) pay for every import
+before doing any work. This benchmark measures, each in a fresh interpreter:
+- the import time of our modules and of the heavy backends (litellm,
+  smolagents, mcp), with the heaviest imports each of them pulls in
+  (from `python -X importtime`)
+- the wall time of `python <script> --help` for every CLI
+
+Our modules should import in milliseconds: the backends are only loaded
+when a real model or MCP server is used.
+
+    uv run bench_startup.py --runs 5
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Optional
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = Path(__file__).parent
+
+MODULES = [
+    "utils",
+    "simple_react_loop",
+    "advanced_react_loop",
+    "text_to_tool_to_text",
+    "concurrent_runner",
+    "completion_cache",
+    "mcp_pool",
+    "agent_with_mcp",
+    "dotenv",
+    "litellm",
+    "smolagents",
+    "mcp",
+]
+
+SCRIPTS = [
+    "simple_react_loop.py",
+    "advanced_react_loop.py",
+    "text_to_tool_to_text.py",
+    "concurrent_runner.py",
+    "agent_with_mcp.py",
+]
+
+
+class ImportTiming(NamedTuple):
+    """Import cost of one module, in microseconds."""
+
+    module: str
+    cumulative_us: int
+    heaviest: list[tuple[str, int]]
+
+
+def parse_importtime(stderr: str, module: str, top: int = 3) -> Optional[ImportTiming]:
+    """Extract the cost of `module` and its heaviest imports from -X importtime."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+
+    # importtime lists a module after everything it imported
+    for index, (depth, name, cumulative) in enumerate(entries):
+        if name == module and depth == 0:
+            children = []
+            for child_depth, child_name, child_cumulative in reversed(entries[:index]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    children.append((child_name, child_cumulative))
+            children.sort(key=lambda child: -child[1])
+            return ImportTiming(module, cumulative, children[:top])
+    return None
+
+
+def time_import(module: str) -> Optional[ImportTiming]:
+    """Import time of a module in a fresh interpreter (None if not installed)."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=SRC_DIR,
+    )
+    if process.returncode != 0:
+        return None
+    return parse_importtime(process.stderr, module)
+
+
+def time_command(command: list[str], runs: int) -> Optional[float]:
+    """Median wall time of running a command (None if it fails)."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, cwd=SRC_DIR)
+        if process.returncode != 0:
+            return None
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Measure import times and CLI startup of the scripts"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Runs of each --help measurement (default: 5)",
+    )
+    args = parser.parse_args()
+
+    print("=== Import time (fresh interpreter) ===")
+    for module in MODULES:
+        timing = time_import(module)
+        if timing is None:
+            print(f"  {module:<24} {'import failed (not installed?)':>12}")
+            continue
+        heaviest = ", ".join(
+            f"{name} {us / 1000:.1f}ms" for name, us in timing.heaviest
+        )
+        print(f"  {module:<24} {timing.cumulative_us / 1000:>9.1f} ms   {heaviest}")
+
+    print(f"\n=== `python <script> --help` (median of {args.runs}) ===")
+    # The bare interpreter, for reference
+    commands = {"python -c pass": [sys.executable, "-c", "pass"]}
+    commands.update({script: [sys.executable, script, "--help"] for script in SCRIPTS})
+    for name, command in commands.items():
+        seconds = time_command(command, args.runs)
+        if seconds is None:
+            print(f"  {name:<24} {'failed':>12}")
+        else:
+            print(f"  {name:<24} {seconds * 1000:>9.1f} ms")
@@ -0,0 +1,122 @@
+"""
+Tool Calling Modes Benchmark
+
+Compares, on the mock backend, the advanced agent with XML tags
+(advanced_react_loop.py: tools described in the system prompt, calls parsed
+from <tool>/<parameters> tags) and with native tool calling
+(native_tool_loop.py: JSON-schema tools= definitions, structured
+tool_calls, tool messages).
+
+Reports per mode: prompt and completion tokens per question, iterations per
+question (format errors cost extra ones) and failed questions. The mock
+counts the tool definitions as prompt tokens, as providers do. Malformed
+outputs are injected at a separate rate per mode: tags break in more ways
+than structured calls (see mock_llm.MALFORMED_OUTPUTS and
+NATIVE_MALFORMED_OUTPUTS).
+
+    uv run bench_tool_modes.py --questions 200 --xml-malformed-rate 0.1
+"""
+
+from contextlib import redirect_stdout
+from functools import partial
+import io
+import statistics
+
+from advanced_react_loop import run_agent as run_xml
+from mock_llm import MockLLM
+from native_tool_loop import run_agent as run_native
+from prompts import ADVANCED_SYSTEM_PROMPT, NATIVE_SYSTEM_PROMPT
+from tools import check_availability_activity, get_weather
+from tracing import Tracer
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def bench_mode(agent_fn, system_prompt: str, questions: int, malformed_rate: float):
+    """Run the agent `questions` times and summarize its tokens and iterations."""
+    llm = MockLLM(malformed_rate=malformed_rate)
+    tracer = Tracer(max_summaries=questions)
+    failed = 0
+    with redirect_stdout(io.StringIO()):
+        for _ in range(questions):
+            try:
+                answer = agent_fn(
+                    system_prompt=system_prompt,
+                    user_request=QUESTION,
+                    tools=TOOLS,
+                    model="mock",
+                    completion_fn=llm.completion,
+                    tracer=tracer,
+                )
+            except AssertionError:
+                # The XML loop rejects answers given before both tools ran
+                answer = None
+            if answer in (None, "No answer could be found"):
+                failed += 1
+
+    summaries = tracer.summaries
+    return {
+        "prompt_tokens": statistics.mean(s.prompt_tokens for s in summaries),
+        "completion_tokens": statistics.mean(s.completion_tokens for s in summaries),
+        "iterations": statistics.mean(s.iterations for s in summaries),
+        "max_iterations": max(s.iterations for s in summaries),
+        "malformed": llm.malformed,
+        "failed": failed,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare XML-tag and native tool calling on the mock LLM"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=200,
+        help="Questions per mode (default: 200)",
+    )
+    parser.add_argument(
+        "--xml-malformed-rate",
+        type=float,
+        default=0.05,
+        help="Fraction of broken responses in XML mode (default: 0.05)",
+    )
+    parser.add_argument(
+        "--native-malformed-rate",
+        type=float,
+        default=0.05,
+        help="Fraction of broken responses in native mode (default: 0.05)",
+    )
+    args = parser.parse_args()
+
+    modes = {
+        "xml tags": bench_mode(
+            run_xml, ADVANCED_SYSTEM_PROMPT, args.questions, args.xml_malformed_rate
+        ),
+        "native tools": bench_mode(
+            # The XML loop asserts that both tools ran before the answer
+            partial(run_native, required_tools=tuple(TOOLS)),
+            NATIVE_SYSTEM_PROMPT,
+            args.questions,
+            args.native_malformed_rate,
+        ),
+    }
+
+    print(f"=== {args.questions} questions per mode, mock LLM ===")
+    print(
+        f"{'mode':<14} {'prompt tok':>11} {'compl tok':>10} {'iterations':>11} "
+        f"{'max it':>7} {'malformed':>10} {'failed':>7}"
+    )
+    for name, stats in modes.items():
+        print(
+            f"{name:<14} {stats['prompt_tokens']:>11.0f} "
+            f"{stats['completion_tokens']:>10.0f} {stats['iterations']:>11.2f} "
+            f"{stats['max_iterations']:>7} {stats['malformed']:>10} {stats['failed']:>7}"
+        )
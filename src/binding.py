@@ -0,0 +1,368 @@
+"""
+Typed argument binding for tool calls.
+
+The model writes tool parameters as text inside <parameters> tags. Splitting
+that text on commas and passing the pieces positionally breaks on any value
+containing a comma ("Paris, France") and on every parameter that is not a
+string, and each failure costs an extra LLM round-trip.
+
+compile_binder(func) inspects a tool's signature once and returns an
+ArgumentBinder that accepts, in order of precedence:
+- a JSON object:      {"location": "Paris, France", "days": 3}
+- a JSON array:       ["Paris, France", 3]
+- keyword style:      location=Paris, France; days=3  (or one per line)
+- plain text:         the whole text when the tool takes a single parameter,
+                      otherwise comma-separated values (the original format);
+                      text starting with "{" must be a valid JSON object
+
+Values are coerced to the annotated types (str, int, float, bool, list,
+dict, Optional[...]) and missing, unknown or invalid parameters raise a
+ToolArgumentError whose message names the parameter and shows the expected
+signature, so the model can fix its call in one retry. Binders are cached
+per function, so binding a call is a few dict lookups.
+
+Example:
+    binder = compile_binder(get_weather)
+    args = binder.bind('{"location": "Paris, France"}')
+    get_weather(*args)
+"""
+
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple, Union, get_args, get_origin
+import enum
+import inspect
+import json
+import re
+import types
+import typing
+
+
+class ToolArgumentError(ValueError):
+    """The parameters of a tool call do not match the tool's signature."""
+
+
+class _Parameter(NamedTuple):
+    name: str
+    annotation: Any
+    type_name: str
+    required: bool
+    default: Any
+
+
+_KEYWORD_PATTERN = re.compile(r"(?:^|[,;\n])\s*([A-Za-z_]\w*)\s*=(?!=)")
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+_TRUE = {"true", "yes", "y", "1", "on"}
+_FALSE = {"false", "no", "n", "0", "off"}
+
+
+def _type_name(annotation: Any) -> str:
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return "any"
+    if isinstance(annotation, type) and get_origin(annotation) is None:
+        return annotation.__name__
+    return str(annotation).replace("typing.", "")
+
+
+def _unquote(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    return text
+
+
+def coerce(value: Any, annotation: Any) -> Any:
+    """Convert a parsed value to the annotated type.
+
+    Raises:
+        ValueError: If the value cannot be converted
+    """
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return value
+    origin = get_origin(annotation)
+
+    # Optional[X] / X | None: None stays None, anything else must be an X
+    if origin is Union or origin is types.UnionType:
+        members = [a for a in get_args(annotation) if a is not type(None)]
+        if value is None or (isinstance(value, str) and value.lower() == "null"):
+            if len(members) < len(get_args(annotation)):
+                return None
+        errors = []
+        for member in members:
+            try:
+                return coerce(value, member)
+            except (TypeError, ValueError) as e:
+                errors.append(str(e))
+        raise ValueError("; ".join(errors))
+
+    if annotation is str:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return str(value)
+    if annotation is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in _TRUE:
+            return True
+        if str(value).strip().lower() in _FALSE:
+            return False
+        raise ValueError(f"expected true or false, got {value!r}")
+    if annotation is int:
+        if isinstance(value, bool) or (
+            isinstance(value, float) and not value.is_integer()
+        ):
+            raise ValueError(f"expected an integer, got {value!r}")
+        try:
+            return int(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError):
+            raise ValueError(f"expected an integer, got {value!r}") from None
+    if annotation is float:
+        if isinstance(value, bool):
+            raise ValueError(f"expected a number, got {value!r}")
+        try:
+            return float(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError):
+            raise ValueError(f"expected a number, got {value!r}") from None
+
+    if annotation in (list, tuple, set) or origin in (list, tuple, set):
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith("["):
+                value = json.loads(text)
+            else:
+                value = [_unquote(part) for part in text.split(",") if part.strip()]
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"expected a list, got {value!r}")
+        item_type = get_args(annotation)[0] if get_args(annotation) else Any
+        items = [coerce(item, item_type) for item in value]
+        container = origin or annotation
+        return container(items)
+    if annotation is dict or origin is dict:
+        if isinstance(value, str):
+            value = json.loads(value)
+        if not isinstance(value, dict):
+            raise ValueError(f"expected a JSON object, got {value!r}")
+        return value
+
+    # Other classes (e.g. pydantic models or enums): let them validate
+    if isinstance(annotation, type) and not isinstance(value, annotation):
+        if isinstance(value, dict):
+            return annotation(**value)
+        return annotation(value)
+    return value
+
+
+def _takes_object(annotation: Any) -> bool:
+    """Whether a JSON object can be the value of a parameter (dicts and classes)."""
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        return any(_takes_object(member) for member in get_args(annotation))
+    if annotation is dict or origin is dict:
+        return True
+    return (
+        isinstance(annotation, type)
+        and origin is None
+        and annotation not in _JSON_TYPES
+        and annotation not in (list, tuple, set)
+        and not issubclass(annotation, enum.Enum)
+    )
+
+
+def json_schema(annotation: Any) -> dict:
+    """JSON schema of an annotation, for native tool definitions."""
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return {}
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        members = [a for a in get_args(annotation) if a is not type(None)]
+        if len(members) == 1:
+            return json_schema(members[0])
+        return {"anyOf": [json_schema(member) for member in members]}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    if annotation in (list, tuple, set) or origin in (list, tuple, set):
+        args = get_args(annotation)
+        items = json_schema(args[0]) if args else {}
+        return {"type": "array", "items": items} if items else {"type": "array"}
+    if annotation is dict or origin is dict:
+        return {"type": "object"}
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return {"enum": [member.value for member in annotation]}
+    return {}
+
+
+class ArgumentBinder:
+    """Parses and validates the parameters of calls to one tool.
+
+    Built once per tool by compile_binder; bind() is what runs per call.
+
+    Args:
+        name: Tool name, used in error messages
+        parameters: The tool's parameters, in signature order
+    """
+
+    def __init__(self, name: str, parameters: list[_Parameter]):
+        self.name = name
+        self.parameters = parameters
+        self._by_name = {p.name: p for p in parameters}
+        self.signature = (
+            f"{name}(" + ", ".join(f"{p.name}: {p.type_name}" for p in parameters) + ")"
+        )
+
+    def json_schema(self) -> dict:
+        """JSON schema of the parameters object (the `parameters` of a tool definition)."""
+        properties = {}
+        for parameter in self.parameters:
+            schema = json_schema(parameter.annotation)
+            if not parameter.required and parameter.default is not None:
+                schema = {**schema, "default": parameter.default}
+            properties[parameter.name] = schema
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [p.name for p in self.parameters if p.required],
+        }
+
+    def _error(self, message: str) -> ToolArgumentError:
+        example = json.dumps({p.name: f"<{p.type_name}>" for p in self.parameters})
+        return ToolArgumentError(
+            f"{message}. Expected {self.signature}, e.g. <parameters>{example}</parameters>"
+        )
+
+    def _split(self, params: str) -> tuple[list, dict]:
+        """Turn the parameter text into positional and keyword values."""
+        text = params.strip()
+        if not text:
+            return [], {}
+
+        if text[0] in "{[":
+            try:
+                value, error = json.loads(text), None
+            except json.JSONDecodeError as e:
+                value, error = None, e
+            if isinstance(value, dict):
+                # A single parameter taking an object (dict, model class) may
+                # also receive its value directly; otherwise the object names
+                # the parameters, and unknown keys are reported by bind()
+                if (
+                    len(self.parameters) == 1
+                    and not set(value) <= set(self._by_name)
+                    and _takes_object(self.parameters[0].annotation)
+                ):
+                    return [value], {}
+                return [], value
+            if isinstance(value, list) and len(self.parameters) != 1:
+                return value, {}
+            # A broken object is not plain text: the model meant JSON
+            if text[0] == "{":
+                raise self._error(f"Parameters are not a valid JSON object ({error})")
+
+        matches = list(_KEYWORD_PATTERN.finditer(text)) if "=" in text else None
+        if matches and matches[0].start() == 0 and matches[0].group(1) in self._by_name:
+            keywords = {}
+            for match, next_match in zip(matches, matches[1:] + [None]):
+                end = next_match.start() if next_match else len(text)
+                keywords[match.group(1)] = _unquote(text[match.end() : end])
+            return [], keywords
+
+        # A single parameter takes the whole text, commas included
+        if len(self.parameters) == 1:
+            return [_unquote(text)], {}
+        return [_unquote(part) for part in text.split(",")], {}
+
+    def bind(self, params: str) -> list:
+        """Parse params and return the argument values in signature order.
+
+        Raises:
+            ToolArgumentError: If a parameter is missing, unknown or invalid
+        """
+        positional, keywords = self._split(params)
+
+        if len(positional) > len(self.parameters):
+            raise self._error(
+                f"Tool '{self.name}' takes {len(self.parameters)} parameter(s) "
+                f"but {len(positional)} were given"
+            )
+        unknown = [k for k in keywords if k not in self._by_name]
+        if unknown:
+            raise self._error(
+                f"Unknown parameter(s) {', '.join(map(repr, unknown))} for tool '{self.name}'"
+            )
+
+        values = []
+        for index, parameter in enumerate(self.parameters):
+            if index < len(positional):
+                if parameter.name in keywords:
+                    raise self._error(f"Parameter '{parameter.name}' was given twice")
+                raw = positional[index]
+            elif parameter.name in keywords:
+                raw = keywords[parameter.name]
+            elif parameter.required:
+                raise self._error(f"Missing required parameter '{parameter.name}'")
+            else:
+                values.append(parameter.default)
+                continue
+            # Most tools take strings: skip the generic coercion for them
+            if parameter.annotation is str and isinstance(raw, str):
+                values.append(raw)
+                continue
+            try:
+                values.append(coerce(raw, parameter.annotation))
+            except (TypeError, ValueError) as e:
+                raise self._error(
+                    f"Invalid value for parameter '{parameter.name}' "
+                    f"({parameter.type_name}): {e}"
+                ) from None
+        return values
+
+
+class _LegacyBinder:
+    """Comma-splitting binder for callables whose signature cannot be compiled."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.signature = f"{name}(...)"
+
+    def json_schema(self) -> dict:
+        return {"type": "object"}
+
+    def bind(self, params: str) -> list:
+        # Native tool calls send a JSON object: pass its values in order
+        if params and params.lstrip().startswith("{"):
+            try:
+                return list(json.loads(params).values())
+            except (json.JSONDecodeError, AttributeError):
+                pass
+        return [p.strip() for p in params.split(",")] if params else []
+
+
+# Bounded: tools wrapped on the fly (e.g. by ToolExecutor.wrap) are new
+# functions every time, which must not be kept alive forever
+@lru_cache(maxsize=128)
+def compile_binder(func: Callable) -> Union[ArgumentBinder, _LegacyBinder]:
+    """Build (once per function) the binder for a tool's parameters."""
+    name = getattr(func, "__name__", type(func).__name__)
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return _LegacyBinder(name)
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        hints = {}
+
+    parameters = []
+    for param in signature.parameters.values():
+        # *args, **kwargs and keyword-only parameters cannot be bound positionally
+        if param.kind not in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+            return _LegacyBinder(name)
+        annotation = hints.get(param.name, param.annotation)
+        parameters.append(
+            _Parameter(
+                param.name,
+                annotation,
+                _type_name(annotation),
+                param.default is inspect.Parameter.empty,
+                None if param.default is inspect.Parameter.empty else param.default,
+            )
+        )
+    return ArgumentBinder(name, parameters)
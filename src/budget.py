@@ -0,0 +1,306 @@
+"""
+Token and cost budgets for agent runs.
+
+max_iterations is a poor limit: one iteration with a long history can cost
+more than ten short ones, and nothing stops a batch of runaway conversations
+from eating the rate limits of everyone else.
+
+A Budget accumulates the tokens (from response.usage, or estimated when
+streaming) and the cost of every LLM call, per run and across all the runs
+sharing it (a batch). Before each call the loop asks the run's budget:
+- once a run or the batch has used `downgrade_at` of a limit, calls switch
+  to the cheaper fallback_model (if one is given)
+- once a limit is reached, the run stops early without an answer
+
+Each run reports its consumption broken down by iteration.
+
+Example:
+    budget = Budget(max_run_tokens=20_000, max_batch_cost=1.0,
+                    fallback_model="claude-haiku-4-5")
+    run_agent(..., budget=budget)
+    print(budget.total_tokens, budget.total_cost)
+"""
+
+from typing import Callable, NamedTuple, Optional
+import sys
+import threading
+import warnings
+
+from history import approximate_tokens
+from utils import message_text
+
+
+class IterationUsage(NamedTuple):
+    """Tokens and cost of one LLM call."""
+
+    iteration: int  # loop turn (a rerouted call shares it with the rejected one)
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+    cached: bool = False  # replayed, so neither paid for nor counted
+
+
+_cost_per_token: Optional[Callable] = None
+
+
+def litellm_cost(
+    model: str, prompt_tokens: int, completion_tokens: int
+) -> Optional[float]:
+    """Price of a call from litellm's model cost map, or None if it has none.
+
+    litellm is only imported to call a real model (see
+    utils.default_completion_fn): until then, e.g. in mock runs, calls
+    cannot be priced, and trying does not import it.
+    """
+    global _cost_per_token
+    if _cost_per_token is None:
+        litellm = sys.modules.get("litellm")
+        if litellm is None:
+            return None
+        _cost_per_token = litellm.cost_per_token
+    try:
+        prompt_cost, completion_cost = _cost_per_token(
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+    except Exception:
+        # e.g. the mock model, which litellm has no price for
+        return None
+    return prompt_cost + completion_cost
+
+
+class RunBudget:
+    """Consumption of a single agent run (see Budget.new_run)."""
+
+    def __init__(self, budget: "Budget"):
+        self.budget = budget
+        self.iterations: list[IterationUsage] = []
+        self.tokens = 0
+        self.cost = 0.0
+        self.exceeded_reason: Optional[str] = None
+
+    def _usage_ratio(self) -> float:
+        """Highest fraction used of any of the run and batch limits."""
+        budget = self.budget
+        ratios = [
+            (self.tokens, budget.max_run_tokens),
+            (self.cost, budget.max_run_cost),
+            (budget.total_tokens, budget.max_batch_tokens),
+            (budget.total_cost, budget.max_batch_cost),
+        ]
+        return max((used / limit for used, limit in ratios if limit), default=0.0)
+
+    def exceeded(self) -> Optional[str]:
+        """Why the run must stop before its next LLM call, or None."""
+        budget = self.budget
+        checks = [
+            ("run tokens", self.tokens, budget.max_run_tokens),
+            ("run cost", self.cost, budget.max_run_cost),
+            ("batch tokens", budget.total_tokens, budget.max_batch_tokens),
+            ("batch cost", budget.total_cost, budget.max_batch_cost),
+        ]
+        for name, used, limit in checks:
+            if limit is not None and used >= limit:
+                self.exceeded_reason = f"{name}: {used:g} of {limit:g}"
+                return self.exceeded_reason
+        return None
+
+    def model_for(self, model: str) -> str:
+        """The model to call next: the fallback once close to a limit."""
+        budget = self.budget
+        if budget.fallback_model and self._usage_ratio() >= budget.downgrade_at:
+            return budget.fallback_model
+        return model
+
+    def record(
+        self,
+        model: str,
+        messages: list[dict],
+        content: str,
+        response=None,
+        cached: bool = False,
+        iteration: Optional[int] = None,
+    ) -> IterationUsage:
+        """Account for one LLM call.
+
+        Args:
+            model: The model that was called
+            messages: The messages sent to it
+            content: The assistant message it produced
+            response: The litellm response, if any; without usage (e.g. when
+                streaming) the token counts are estimated from the text
+            cached: Whether the message was replayed (a response from the
+                completion cache or session log is recognized by itself); a
+                replayed call is listed but costs nothing and uses no tokens
+                of the limits
+            iteration: The loop turn of the call (default: one turn per call)
+
+        Returns:
+            The usage recorded for this call
+        """
+        cached = cached or getattr(response, "cached", False)
+        if iteration is None:
+            iteration = len(self.iterations) + 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        else:
+            prompt_tokens = sum(approximate_tokens(message_text(m)) for m in messages)
+            completion_tokens = approximate_tokens(content)
+        if cached:
+            iteration_usage = IterationUsage(
+                iteration,
+                model,
+                prompt_tokens,
+                completion_tokens,
+                0.0,
+                cached=True,
+            )
+            self.iterations.append(iteration_usage)
+            return iteration_usage
+        cost = self.budget.cost_fn(model, prompt_tokens, completion_tokens)
+        if cost is None:
+            self.budget._unpriced(model)
+            cost = 0.0
+
+        iteration_usage = IterationUsage(
+            iteration, model, prompt_tokens, completion_tokens, cost
+        )
+        self.iterations.append(iteration_usage)
+        self.tokens += prompt_tokens + completion_tokens
+        self.cost += cost
+        self.budget._add(prompt_tokens + completion_tokens, cost)
+        return iteration_usage
+
+    def report(self) -> str:
+        """Human-readable consumption of the run, one line per iteration."""
+        lines = [f"[Budget: {self.tokens} tokens, ${self.cost:.4f}]"]
+        for usage in self.iterations:
+            lines.append(
+                f"  iteration {usage.iteration} ({usage.model}): "
+                f"{usage.prompt_tokens} in / {usage.completion_tokens} out, "
+                + ("replayed" if usage.cached else f"${usage.cost:.4f}")
+            )
+        if self.exceeded_reason:
+            lines.append(f"  stopped early, budget exceeded ({self.exceeded_reason})")
+        return "\n".join(lines)
+
+    def attributes(self) -> dict:
+        """Totals to attach to the run's trace."""
+        return {
+            "budget_tokens": self.tokens,
+            "budget_cost": self.cost,
+            "budget_exceeded": self.exceeded_reason,
+        }
+
+
+class Budget:
+    """Per-run and per-batch token and cost limits shared by agent runs.
+
+    Args:
+        max_run_tokens: Tokens (prompt + completion) a single run may use
+        max_run_cost: Dollars a single run may spend
+        max_batch_tokens: Tokens all the runs sharing this budget may use
+        max_batch_cost: Dollars all the runs sharing this budget may spend
+        fallback_model: Cheaper model to switch to when close to a limit
+        downgrade_at: Fraction of a limit after which fallback_model is used
+        cost_fn: Function (model, prompt_tokens, completion_tokens) -> dollars,
+            or None for a model it cannot price (counted as free, with a
+            warning when a cost limit is set)
+    """
+
+    def __init__(
+        self,
+        max_run_tokens: Optional[int] = None,
+        max_run_cost: Optional[float] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_cost: Optional[float] = None,
+        fallback_model: Optional[str] = None,
+        downgrade_at: float = 0.8,
+        cost_fn: Callable[[str, int, int], Optional[float]] = litellm_cost,
+    ):
+        self.max_run_tokens = max_run_tokens
+        self.max_run_cost = max_run_cost
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_cost = max_batch_cost
+        self.fallback_model = fallback_model
+        self.downgrade_at = downgrade_at
+        self.cost_fn = cost_fn
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self._unpriced_models: set[str] = set()
+        self._lock = threading.Lock()
+
+    def new_run(self) -> RunBudget:
+        """Start accounting for a new conversation (one per agent run)."""
+        return RunBudget(self)
+
+    def _unpriced(self, model: str):
+        """Warn (once per model) that a cost limit cannot see this model's calls."""
+        if self.max_run_cost is None and self.max_batch_cost is None:
+            return
+        with self._lock:
+            if model in self._unpriced_models:
+                return
+            self._unpriced_models.add(model)
+        warnings.warn(
+            f"Cannot price the calls to '{model}': they count as free, so the "
+            "cost limits will not stop them (pass a cost_fn for this model)",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+
+    def _add(self, tokens: int, cost: float):
+        with self._lock:
+            self.total_tokens += tokens
+            self.total_cost += cost
+
+
+def add_budget_arguments(parser):
+    """Add the --max-run-tokens / --max-run-cost / ... options to a parser."""
+    parser.add_argument(
+        "--max-run-tokens",
+        type=int,
+        default=None,
+        help="Stop a run once it has used this many tokens (default: no limit)",
+    )
+    parser.add_argument(
+        "--max-run-cost",
+        type=float,
+        default=None,
+        help="Stop a run once it has spent this many dollars (default: no limit)",
+    )
+    parser.add_argument(
+        "--max-batch-tokens",
+        type=int,
+        default=None,
+        help="Stop all runs once they have used this many tokens together",
+    )
+    parser.add_argument(
+        "--max-batch-cost",
+        type=float,
+        default=None,
+        help="Stop all runs once they have spent this many dollars together",
+    )
+    parser.add_argument(
+        "--fallback-model",
+        type=str,
+        default=None,
+        help="Cheaper model to switch to when a run gets close to a limit",
+    )
+
+
+def budget_from_args(args) -> Optional[Budget]:
+    """Build the Budget selected by add_budget_arguments' options, if any."""
+    limits = (
+        args.max_run_tokens,
+        args.max_run_cost,
+        args.max_batch_tokens,
+        args.max_batch_cost,
+    )
+    if all(limit is None for limit in limits):
+        return None
+    return Budget(*limits, fallback_model=args.fallback_model)
@@ -0,0 +1,360 @@
+"""
+Content-addressed LLM completion cache with record/replay.
+
+Re-running the same questions (e.g. for regression checks) pays the full LLM
+latency and cost every time, even though the model sees exactly the same
+conversation. CompletionCache wraps a completion function and stores every
+response on disk under the hash of (model, messages, parameters):
+
+- "record": serve hits from disk, call the model on a miss and store the result
+- "replay": serve hits from disk, raise CacheMissError on a miss (offline runs)
+- "passthrough": always call the model, never read or write the cache
+
+Since an agent trajectory is a chain of completions, each depending only on
+the previous ones, a recorded run replays end-to-end without any network.
+
+Example:
+    cache = CompletionCache(".completion_cache", mode="replay")
+    run_agent(..., completion_fn=cache.completion)
+
+Entries are plain JSON files; compact() evicts the least recently used ones
+or those older than a given age.
+"""
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Optional
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from utils import default_acompletion_fn, default_completion_fn
+
+MODES = ("record", "replay", "passthrough")
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a completion is not in the cache."""
+
+
+def cache_key(model: str, messages: list, **params) -> str:
+    """Hash the model, messages and generation parameters of a request."""
+    # Streaming changes how the response is delivered, not what it contains
+    params.pop("stream", None)
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def to_response(entry: dict) -> SimpleNamespace:
+    """Rebuild a litellm-like response object from a cache entry."""
+    usage = entry.get("usage") or {}
+    # Native tool calls (see native_tool_loop.py)
+    tool_calls = [
+        SimpleNamespace(
+            id=call["id"],
+            type="function",
+            function=SimpleNamespace(**call["function"]),
+        )
+        for call in entry.get("tool_calls") or []
+    ]
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                message=SimpleNamespace(
+                    role="assistant",
+                    content=entry["content"],
+                    tool_calls=tool_calls or None,
+                ),
+                # A response cut by max_tokens is repaired differently (see generation.py)
+                finish_reason=entry.get("finish_reason"),
+            )
+        ],
+        usage=SimpleNamespace(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0),
+        ),
+        cached=True,
+    )
+
+
+def to_chunk(
+    content: str, finish_reason: Optional[str] = None, cached: bool = False
+) -> SimpleNamespace:
+    """Build a litellm-like streaming chunk (the last one carries the finish_reason).
+
+    cached marks the chunks of a replayed response, like to_response.
+    """
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                delta=SimpleNamespace(content=content), finish_reason=finish_reason
+            )
+        ],
+        cached=cached,
+    )
+
+
+class CompletionCache:
+    """On-disk cache around a litellm-style completion function.
+
+    Args:
+        path: Directory holding the cache entries
+        mode: One of "record", "replay" or "passthrough"
+        completion_fn: Backend to call on a miss (default: litellm.completion)
+        acompletion_fn: Async backend to call on a miss (default: litellm.acompletion)
+    """
+
+    def __init__(
+        self,
+        path: str = ".completion_cache",
+        mode: str = "record",
+        completion_fn: Optional[Callable] = None,
+        acompletion_fn: Optional[Callable] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {MODES}")
+        self.path = Path(path)
+        self.mode = mode
+        self._completion_fn = completion_fn
+        self._acompletion_fn = acompletion_fn
+        self.hits = 0
+        self.misses = 0
+
+    # --- storage ---------------------------------------------------------
+
+    def _entry_path(self, key: str) -> Path:
+        # Two-level layout keeps directories small on big caches
+        return self.path / key[:2] / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[dict]:
+        entry_path = self._entry_path(key)
+        try:
+            entry = json.loads(entry_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Touch the file so compact() can evict least recently used entries
+        os.utime(entry_path)
+        return entry
+
+    def _store(
+        self,
+        key: str,
+        model: str,
+        content: str,
+        usage=None,
+        tool_calls=None,
+        finish_reason: Optional[str] = None,
+    ):
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "model": model,
+            "content": content,
+            "tool_calls": [
+                {
+                    "id": call.id,
+                    "function": {
+                        "name": call.function.name,
+                        "arguments": call.function.arguments,
+                    },
+                }
+                for call in tool_calls or []
+            ],
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+                "total_tokens": getattr(usage, "total_tokens", 0),
+            },
+            "finish_reason": finish_reason,
+            "created": time.time(),
+        }
+        # Write then rename, so concurrent readers never see a partial entry.
+        # Each write has its own temporary file: threads missing on the same
+        # key store the same entry, and whichever rename lands last wins
+        with tempfile.NamedTemporaryFile(
+            "w", dir=entry_path.parent, suffix=".tmp", delete=False
+        ) as f:
+            f.write(json.dumps(entry))
+        try:
+            os.replace(f.name, entry_path)
+        except FileNotFoundError:
+            # Lost a race with the removal of the cache directory: the entry
+            # is only not cached, which must not fail the run
+            Path(f.name).unlink(missing_ok=True)
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        if self.mode == "passthrough":
+            return None
+        entry = self._load(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMissError(f"Completion {key} is not in the cache at {self.path}")
+        return None
+
+    # --- completion API --------------------------------------------------
+
+    def completion(self, model: str, messages: list, **kwargs):
+        """Drop-in replacement for litellm.completion."""
+        key = cache_key(model, messages, **kwargs)
+        entry = self._lookup(key)
+        if entry is not None:
+            if kwargs.get("stream"):
+                chunk = to_chunk(
+                    entry["content"], entry.get("finish_reason"), cached=True
+                )
+                return iter([chunk])
+            return to_response(entry)
+
+        if self._completion_fn is None:
+            self._completion_fn = default_completion_fn()
+        response = self._completion_fn(model=model, messages=messages, **kwargs)
+        if self.mode != "record":
+            return response
+        if kwargs.get("stream"):
+            return self._record_stream(key, model, response)
+        choice = response.choices[0]
+        self._store(
+            key,
+            model,
+            choice.message.content,
+            response.usage,
+            getattr(choice.message, "tool_calls", None),
+            getattr(choice, "finish_reason", None),
+        )
+        return response
+
+    async def acompletion(self, model: str, messages: list, **kwargs):
+        """Drop-in replacement for litellm.acompletion."""
+        key = cache_key(model, messages, **kwargs)
+        entry = self._lookup(key)
+        if entry is not None:
+            if kwargs.get("stream"):
+                return self._replay_astream(entry)
+            return to_response(entry)
+
+        if self._acompletion_fn is None:
+            self._acompletion_fn = default_acompletion_fn()
+        response = await self._acompletion_fn(model=model, messages=messages, **kwargs)
+        if self.mode != "record":
+            return response
+        if kwargs.get("stream"):
+            return self._record_astream(key, model, response)
+        choice = response.choices[0]
+        self._store(
+            key,
+            model,
+            choice.message.content,
+            response.usage,
+            getattr(choice.message, "tool_calls", None),
+            getattr(choice, "finish_reason", None),
+        )
+        return response
+
+    # Streams are stored once they have been fully consumed
+    def _record_stream(self, key: str, model: str, stream):
+        parts, finish_reason = [], None
+        for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        self._store(key, model, "".join(parts), finish_reason=finish_reason)
+
+    async def _record_astream(self, key: str, model: str, stream):
+        parts, finish_reason = [], None
+        async for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        self._store(key, model, "".join(parts), finish_reason=finish_reason)
+
+    async def _replay_astream(self, entry: dict):
+        yield to_chunk(entry["content"], entry.get("finish_reason"), cached=True)
+
+    # --- maintenance -----------------------------------------------------
+
+    def compact(
+        self, max_entries: Optional[int] = None, max_age: Optional[float] = None
+    ) -> int:
+        """Evict stale entries.
+
+        Args:
+            max_entries: Keep at most this many entries, dropping the least
+                recently used first
+            max_age: Drop entries not used for more than this many seconds
+
+        Returns:
+            The number of entries removed
+        """
+        entries = sorted(
+            self.path.glob("*/*.json"), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        now = time.time()
+        removed = 0
+        for position, entry_path in enumerate(entries):
+            too_many = max_entries is not None and position >= max_entries
+            too_old = max_age is not None and now - entry_path.stat().st_mtime > max_age
+            if too_many or too_old:
+                entry_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*/*.json"))
+
+
+def add_cache_arguments(parser):
+    """Add the --llm-cache / --llm-cache-dir options to an argparse parser."""
+    parser.add_argument(
+        "--llm-cache",
+        choices=MODES,
+        default=None,
+        help="Completion cache mode: record, replay (offline) or passthrough",
+    )
+    parser.add_argument(
+        "--llm-cache-dir",
+        type=str,
+        default=".completion_cache",
+        help="Directory of the completion cache (default: .completion_cache)",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the LLM completion cache")
+    parser.add_argument(
+        "--llm-cache-dir",
+        type=str,
+        default=".completion_cache",
+        help="Directory of the completion cache (default: .completion_cache)",
+    )
+    parser.add_argument(
+        "--max-entries",
+        type=int,
+        default=None,
+        help="Keep at most this many entries (least recently used are dropped)",
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=None,
+        help="Drop entries not used for this many days",
+    )
+    args = parser.parse_args()
+
+    cache = CompletionCache(args.llm_cache_dir)
+    max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+    removed = cache.compact(max_entries=args.max_entries, max_age=max_age)
+    print(f"Removed {removed} entries, {len(cache)} left in {cache.path}")
@@ -0,0 +1,252 @@
+"""
+Concurrent Runner - many questions, one process
+
+The run_agent loops handle one conversation at a time because
+litellm.completion blocks. This script uses the asyncio variants
+(run_agent_async, built on litellm.acompletion) to run the ReAct loops for
+many questions concurrently, with a cap on how many are in flight at once.
+
+Results come back in the same order as the input questions, each with the
+latency of its own run.
+"""
+
+import asyncio
+import time
+from typing import Callable, NamedTuple, Optional
+
+
+class QuestionResult(NamedTuple):
+    """Outcome of one agent run."""
+
+    question: str
+    answer: Optional[str]
+    latency: float
+    error: Optional[str] = None
+
+
+async def run_questions(
+    questions: list[str],
+    agent_fn: Callable,
+    concurrency: int = 4,
+    **agent_kwargs,
+) -> list[QuestionResult]:
+    """Run an async agent over many questions concurrently.
+
+    Args:
+        questions: The user questions to answer
+        agent_fn: An async agent entry point such as run_agent_async
+        concurrency: Maximum number of agent runs in flight at once
+        **agent_kwargs: Extra arguments passed to agent_fn (system_prompt, tools, ...)
+
+    Returns:
+        One QuestionResult per question, in input order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run_one(question: str) -> QuestionResult:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                answer = await agent_fn(user_request=question, **agent_kwargs)
+                return QuestionResult(question, answer, time.perf_counter() - start)
+            except Exception as e:
+                # One failing run should not take down the whole batch
+                return QuestionResult(
+                    question, None, time.perf_counter() - start, error=repr(e)
+                )
+
+    # gather keeps results in the order of the input questions
+    return await asyncio.gather(*(_run_one(q) for q in questions))
+
+
+if __name__ == "__main__":
+    import argparse
+    from completion_cache import CompletionCache, add_cache_arguments
+    from tracing import add_tracing_arguments, tracer_from_args
+    from budget import add_budget_arguments, budget_from_args
+    from routing import add_routing_arguments, router_from_args
+    from generation import add_generation_arguments, generation_from_args
+    from stall import add_stall_arguments, stall_monitor_from_args
+    from rate_limit import add_rate_limit_arguments, rate_limited_from_args
+    from tool_executor import add_tool_executor_arguments, tool_executor_from_args
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Run the ReAct agent on many questions concurrently"
+    )
+    parser.add_argument(
+        "-q",
+        "--question",
+        action="append",
+        help="User question (repeat the flag for several questions)",
+    )
+    parser.add_argument(
+        "-f",
+        "--questions-file",
+        type=str,
+        help="Text file with one question per line",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent agent runs (default: 4)",
+    )
+    parser.add_argument(
+        "--advanced",
+        action="store_true",
+        help="Use the advanced ReAct loop (weather + availability)",
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="Use the local mock LLM instead of calling the real model",
+    )
+    parser.add_argument(
+        "--tool-cache",
+        action="store_true",
+        help="Share a tool result cache across all the questions",
+    )
+    add_cache_arguments(parser)
+    add_tracing_arguments(parser)
+    add_budget_arguments(parser)
+    add_routing_arguments(parser)
+    add_generation_arguments(parser)
+    add_stall_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_tool_executor_arguments(parser)
+    args = parser.parse_args()
+
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    questions = list(args.question or [])
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    if not questions:
+        questions = [
+            "what activity do you suggest to book if I travel to honolulu next week?"
+        ]
+
+    if args.advanced:
+        from advanced_react_loop import run_agent_async
+        from prompts import ADVANCED_SYSTEM_PROMPT as system_prompt
+        from tools import get_weather, check_availability_activity
+
+        tools = {
+            "get_weather": get_weather,
+            "check_availability_activity": check_availability_activity,
+        }
+    else:
+        from simple_react_loop import run_agent_async
+        from prompts import SYSTEM_PROMPT as system_prompt
+        from tools import get_weather
+
+        tools = {"get_weather": get_weather}
+
+    # Optionally run the tools on worker pools with a timeout
+    tool_executor = tool_executor_from_args(args, tools)
+    if tool_executor is not None:
+        tools = tool_executor.wrap(tools)
+
+    # A single budget, so the batch limits apply to all the questions together
+    budget = budget_from_args(args)
+    # Tool-selection turns go to --fast-model; the final answer needs all the tools
+    router = router_from_args(args, answer_tools=set(tools))
+    generation = generation_from_args(args, answer_tools=set(tools))
+    stall = stall_monitor_from_args(args)
+    agent_kwargs = {
+        "tracer": tracer_from_args(args),
+        "budget": budget,
+        "router": router,
+        "generation": generation,
+        "stall": stall,
+    }
+    if args.mock:
+        from mock_llm import MockLLM
+
+        agent_kwargs["acompletion_fn"] = MockLLM(latency=0.5).acompletion
+    # Rate limits and retries apply to the provider calls only, not to cache hits
+    rate_limited = rate_limited_from_args(
+        args, acompletion_fn=agent_kwargs.get("acompletion_fn")
+    )
+    if rate_limited is not None:
+        agent_kwargs["acompletion_fn"] = rate_limited.acompletion
+    if args.llm_cache:
+        agent_kwargs["acompletion_fn"] = CompletionCache(
+            args.llm_cache_dir,
+            args.llm_cache,
+            acompletion_fn=agent_kwargs.get("acompletion_fn"),
+        ).acompletion
+
+    tool_cache = None
+    if args.tool_cache:
+        from tool_cache import ToolCache
+
+        tool_cache = ToolCache()
+        agent_kwargs["tool_cache"] = tool_cache
+
+    start = time.perf_counter()
+    results = asyncio.run(
+        run_questions(
+            questions,
+            run_agent_async,
+            concurrency=args.concurrency,
+            system_prompt=system_prompt,
+            tools=tools,
+            model="claude-sonnet-4-5-20250929",
+            **agent_kwargs,
+        )
+    )
+    total = time.perf_counter() - start
+
+    # Print out what we got:
+    print("\n=== Results ===")
+    for result in results:
+        print(f"\n[{result.latency:.2f}s] {result.question}")
+        print(result.answer if result.error is None else f"FAILED: {result.error}")
+    print(
+        f"\n{len(results)} questions in {total:.2f}s (concurrency={args.concurrency})"
+    )
+    if tool_cache is not None:
+        stats = tool_cache.stats()
+        print(
+            f"Tool cache: {stats.hits} hits, {stats.misses} misses "
+            f"({stats.hit_rate:.0%} hit rate)"
+        )
+    if rate_limited is not None:
+        stats = rate_limited.stats()
+        print(
+            f"Rate limiting: {stats.requests} requests, {stats.throttled} throttled, "
+            f"{stats.retries} retries, {stats.waited:.1f}s waited"
+        )
+    if budget is not None:
+        print(f"Budget: {budget.total_tokens} tokens, ${budget.total_cost:.4f}")
+    if router is not None:
+        stats = router.stats()
+        print(
+            f"Routing: {stats.fast_calls} fast, {stats.strong_calls} strong calls "
+            f"({stats.fast_share:.0%} fast), {stats.rejected} fast turns rejected"
+        )
+    if generation is not None:
+        stats = generation.stats()
+        print(
+            f"Generation: {stats.tool_calls} tool, {stats.answer_calls} answer calls, "
+            f"{stats.output_tokens} output tokens in {stats.seconds:.1f}s, "
+            f"{stats.repaired} turns repaired, {stats.truncated} truncated"
+        )
+    if stall is not None:
+        stats = stall.stats()
+        print(
+            f"Stalls: {stats.stalled_turns} stalled turns, {stats.cached_calls} "
+            f"repeated calls served, {stats.forced} forcing prompts, "
+            f"{stats.aborted} runs aborted, {stats.recovered} recovered; saved "
+            f"{stats.iterations_saved} iterations / ~{stats.tokens_saved} tokens"
+        )
+    if tool_executor is not None:
+        print("Tool latency:")
+        print(tool_executor.format_histograms())
@@ -1,9 +1,34 @@
+"""
+FastMCP server exposing the weather tools.
+
+Runs over stdio by default (one client per process, as started by
+agent_with_mcp.py), or over streamable HTTP so that a single server process
+can serve many agent clients at once:
+
+    uv run python server.py --transport http --port 8000
+
+Weather lookups are cached for a short time, and get_weather_many answers
+several locations in one tool call. With --timing-log, the execution time of
+every tool call is appended to a JSONL file (see bench_mcp_load.py).
+"""
+
+from collections import OrderedDict
+import json
+import threading
+import time
+
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware
 from pydantic import BaseModel, Field
 
 
 mcp = FastMCP("MCP Demo 🚀")
 
+# Weather changes slowly compared to how often agents ask for it
+WEATHER_CACHE_TTL = 300.0
+# Locations kept before the least recently used ones are evicted
+WEATHER_CACHE_MAX_SIZE = 1024
+
 
 class WeatherInfo(BaseModel):
     location: str = Field(description="The location name")
@@ -12,15 +37,119 @@ class WeatherInfo(BaseModel):
     humidity: int = Field(description="Humidity percentage", ge=0, le=100)
 
 
+_weather_cache: OrderedDict[str, tuple[float, WeatherInfo]] = OrderedDict()
+_weather_cache_lock = threading.Lock()
+
+
+def _fetch_weather(location: str) -> WeatherInfo:
+    return WeatherInfo(
+        location=location, temperature=26.7, conditions="clear skies", humidity=65
+    )
+
+
+def _cached_weather(location: str) -> WeatherInfo:
+    """Weather for a location, shared by every client of this server."""
+    key = " ".join(location.casefold().split())
+    now = time.monotonic()
+    with _weather_cache_lock:
+        entry = _weather_cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _weather_cache.move_to_end(key)
+                return entry[1].model_copy(update={"location": location})
+            del _weather_cache[key]
+    weather = _fetch_weather(location)
+    with _weather_cache_lock:
+        _weather_cache[key] = (now + WEATHER_CACHE_TTL, weather)
+        _weather_cache.move_to_end(key)
+        while len(_weather_cache) > WEATHER_CACHE_MAX_SIZE:
+            _weather_cache.popitem(last=False)
+    return weather
+
+
 @mcp.tool(name="get_weather")
 def get_weather(location: str) -> WeatherInfo:
     """Tool to get the current weather for a location.
     Parameters: location (string) - the city or location to get weather for.
     Returns the current temperature and conditions."""
-    return WeatherInfo(
-        location=location, temperature=26.7, conditions="clear skies", humidity=65
-    )
+    return _cached_weather(location)
+
+
+@mcp.tool(name="get_weather_many")
+def get_weather_many(locations: list[str]) -> list[WeatherInfo]:
+    """Tool to get the current weather for several locations in one call.
+    Parameters: locations (list of strings) - the cities or locations to get weather for.
+    Returns the current temperature and conditions for each location, in the same order."""
+    return [_cached_weather(location) for location in locations]
+
+
+class ToolTimingMiddleware(Middleware):
+    """Log the server-side execution time of every tool call to a JSONL file.
+
+    Clients only see the round trip; this separates the tool execution from
+    the MCP transport (serialization, stdio or HTTP).
+    """
+
+    def __init__(self, path: str):
+        # Line-buffered, so each call is one complete line even across processes
+        self.file = open(path, "a", buffering=1, encoding="utf-8")
+
+    async def on_call_tool(self, context, call_next):
+        start = time.perf_counter()
+        try:
+            return await call_next(context)
+        finally:
+            record = {
+                "tool": context.message.name,
+                "arguments": context.message.arguments,
+                "seconds": time.perf_counter() - start,
+            }
+            self.file.write(json.dumps(record) + "\n")
 
 
 if __name__ == "__main__":
-    mcp.run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MCP server with weather tools")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        default="stdio",
+        help="stdio for a single client, http (streamable HTTP) for many (default: stdio)",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Host to bind with --transport http (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port to bind with --transport http (default: 8000)",
+    )
+    parser.add_argument(
+        "--timing-log",
+        type=str,
+        default=None,
+        help="Append the execution time of every tool call to this JSONL file",
+    )
+    parser.add_argument(
+        "--no-banner",
+        action="store_true",
+        help="Do not print the startup banner (e.g. for load tests)",
+    )
+    args = parser.parse_args()
+
+    if args.timing_log:
+        mcp.add_middleware(ToolTimingMiddleware(args.timing_log))
+    if args.transport == "http":
+        mcp.run(
+            transport="http",
+            host=args.host,
+            port=args.port,
+            show_banner=not args.no_banner,
+        )
+    else:
+        mcp.run(show_banner=not args.no_banner)
@@ -0,0 +1,331 @@
+"""
+Phase-aware generation limits for the XML-tag agent loops.
+
+The loops call the model without stop sequences or max_tokens, so nothing
+ends a generation but the model itself. After a tool call it often keeps
+going: it invents the tool result ("Tool 'get_weather' returned: ...") and
+reasons on it, and after </answer> it adds small talk. All of that is
+billed, adds latency, and is thrown away by the parser.
+
+A GenerationPolicy wraps a run's completion function and sets stop= and
+max_tokens= for each call, according to the phase of the conversation:
+- tool phase (until the `answer_tools` have succeeded): stop at an invented
+  tool result or at </answer>, with a small output cap (tool calls are short)
+- answer phase: stop at </answer>, with a larger cap
+
+Providers strip the stop sequence from the output, so a turn stopped at
+</answer> comes back with an unclosed <answer>. Every response is repaired
+before the loop parses it: unclosed tags are closed, and a turn cut by
+max_tokens loses its unfinished tool call or answer (the model is asked
+again, and the rest of the run uses the answer cap). When streaming, the
+closing tags are sent as a last chunk, and </answer> is not used as a stop
+sequence (the streaming parser needs it to end the answer).
+
+Each run reports its output tokens and generation time per phase, and how
+many turns were repaired or truncated; bench_generation.py measures the
+tokens and latency saved against unlimited generation.
+
+Example:
+    generation = GenerationPolicy(answer_tools={"get_weather"})
+    run_agent(..., generation=generation)
+"""
+
+from typing import Callable, NamedTuple, Optional
+import threading
+import time
+
+from completion_cache import to_chunk
+from history import approximate_tokens
+from utils import TAG_PATTERN
+
+# An invented tool result starts like the real ones (see utils.execute_tool_call)
+TOOL_STOP = ("</answer>", "\nTool '")
+ANSWER_STOP = ("</answer>",)
+
+
+class GenerationStats(NamedTuple):
+    """Output of one or more runs, by phase."""
+
+    tool_calls: int
+    answer_calls: int
+    output_tokens: int
+    seconds: float  # time spent generating (until the last chunk when streaming)
+    repaired: int  # turns whose unclosed tags were closed
+    truncated: int  # turns cut by max_tokens
+
+
+def _open_tags(content: str) -> list[tuple[str, int]]:
+    """Tags left open at the end of content, as (tag, start), outermost first.
+
+    Closing tags are matched like utils.scan_tags does.
+    """
+    open_tags: list[tuple[str, int]] = []
+    for match in TAG_PATTERN.finditer(content):
+        closing, tag = match.groups()
+        if not closing:
+            open_tags.append((tag, match.start()))
+            continue
+        i = len(open_tags) - 1
+        while i >= 0 and open_tags[i][0] != tag:
+            i -= 1
+        if i >= 0:
+            del open_tags[i:]
+    return open_tags
+
+
+class GenerationRun:
+    """Generation limits of a single agent run (see GenerationPolicy.new_run)."""
+
+    def __init__(
+        self, policy: "GenerationPolicy", tools_called: Optional[list[str]] = None
+    ):
+        self.policy = policy
+        # The run's successful tool calls, kept up to date by the loop
+        self.tools_called = tools_called if tools_called is not None else []
+        self.calls = {"tool": 0, "answer": 0}
+        self.output_tokens = {"tool": 0, "answer": 0}
+        self.seconds = {"tool": 0.0, "answer": 0.0}
+        self.repaired = 0
+        self.truncated = 0
+        # Set once a turn hits the tool cap, so the run is not stuck under it
+        self.answer_phase = False
+
+    def phase(self) -> str:
+        """The phase ("tool" or "answer") of the next turn of the run."""
+        if self.answer_phase:
+            return "answer"
+        called = set(self.tools_called)
+        answer_tools = self.policy.answer_tools
+        if answer_tools and answer_tools <= called:
+            return "answer"
+        # Without answer_tools, any tool result is enough
+        return "answer" if not answer_tools and called else "tool"
+
+    def params(self, phase: str, stream: bool = False) -> dict:
+        """The stop= and max_tokens= arguments for a call in this phase."""
+        policy = self.policy
+        if phase == "tool":
+            stop, max_tokens = policy.tool_stop, policy.tool_max_tokens
+        else:
+            stop, max_tokens = policy.answer_stop, policy.answer_max_tokens
+        if stream:
+            stop = tuple(s for s in stop if s != "</answer>")
+        params = {"max_tokens": max_tokens}
+        if stop:
+            params["stop"] = list(stop)
+        return params
+
+    def repair(self, content: str, finish_reason: Optional[str] = None) -> str:
+        """Make a stopped or truncated response parsable.
+
+        Args:
+            content: The text of the response
+            finish_reason: "length" if the response was cut by max_tokens
+
+        Returns:
+            content with its open tags closed; a tool call or answer cut by
+            max_tokens is dropped instead
+        """
+        content = content or ""
+        open_tags = _open_tags(content)
+        if finish_reason == "length":
+            self.truncated += 1
+            self.answer_phase = True
+            cut = next((t for t in open_tags if t[0] != "reasoning"), None)
+            if cut is not None:
+                tag, start = cut
+                if tag == "parameters":
+                    # Drop the whole call, not only its parameters
+                    tool_start = content.rfind("<tool>", 0, start)
+                    start = tool_start if tool_start != -1 else start
+                content = content[:start].rstrip()
+                open_tags = [t for t in open_tags if t[1] < start]
+        if open_tags:
+            self.repaired += 1
+        return content + "".join(f"</{tag}>" for tag, _ in reversed(open_tags))
+
+    def _count(self, phase: str, seconds: float, output_tokens: int):
+        self.calls[phase] += 1
+        self.seconds[phase] += seconds
+        self.output_tokens[phase] += output_tokens
+
+    def _limit(self, messages: list, kwargs: dict) -> tuple[str, dict]:
+        phase = self.phase()
+        # Limits given by the caller win over the policy's
+        return phase, {**self.params(phase, kwargs.get("stream", False)), **kwargs}
+
+    def _repair_response(self, response, phase: str, seconds: float):
+        choice = response.choices[0]
+        choice.message.content = self.repair(
+            choice.message.content, getattr(choice, "finish_reason", None)
+        )
+        usage = getattr(response, "usage", None)
+        output_tokens = getattr(usage, "completion_tokens", None)
+        if output_tokens is None:
+            output_tokens = approximate_tokens(choice.message.content)
+        self._count(phase, seconds, output_tokens)
+        return response
+
+    def wrap_completion(self, completion_fn: Callable) -> Callable:
+        """Wrap a completion function so its calls are limited and repaired."""
+
+        def completion(model: str, messages: list, **kwargs):
+            phase, kwargs = self._limit(messages, kwargs)
+            start = time.perf_counter()
+            response = completion_fn(model=model, messages=messages, **kwargs)
+            if kwargs.get("stream"):
+                return self._repair_stream(response, phase, start)
+            return self._repair_response(response, phase, time.perf_counter() - start)
+
+        return completion
+
+    def wrap_acompletion(self, acompletion_fn: Callable) -> Callable:
+        """Async version of wrap_completion."""
+
+        async def acompletion(model: str, messages: list, **kwargs):
+            phase, kwargs = self._limit(messages, kwargs)
+            start = time.perf_counter()
+            response = await acompletion_fn(model=model, messages=messages, **kwargs)
+            if kwargs.get("stream"):
+                return self._repair_astream(response, phase, start)
+            return self._repair_response(response, phase, time.perf_counter() - start)
+
+        return acompletion
+
+    # A streamed turn can only be extended: the closing tags come as a last
+    # chunk, and a cut-off answer or call is left to the parser to ignore
+    def _closing_chunk(self, parts: list, finish_reason, phase: str, start: float):
+        text = "".join(parts)
+        repaired = self.repair(text, finish_reason)
+        self._count(phase, time.perf_counter() - start, approximate_tokens(text))
+        if len(repaired) > len(text) and repaired.startswith(text):
+            return to_chunk(repaired[len(text) :])
+        return None
+
+    def _repair_stream(self, stream, phase: str, start: float):
+        parts, finish_reason = [], None
+        for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        closing = self._closing_chunk(parts, finish_reason, phase, start)
+        if closing is not None:
+            yield closing
+
+    async def _repair_astream(self, stream, phase: str, start: float):
+        parts, finish_reason = [], None
+        async for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        closing = self._closing_chunk(parts, finish_reason, phase, start)
+        if closing is not None:
+            yield closing
+
+    def finish(self) -> GenerationStats:
+        """Close the run and add its counters to the policy's totals."""
+        stats = GenerationStats(
+            self.calls["tool"],
+            self.calls["answer"],
+            sum(self.output_tokens.values()),
+            sum(self.seconds.values()),
+            self.repaired,
+            self.truncated,
+        )
+        self.policy._add(stats)
+        return stats
+
+    def report(self) -> str:
+        phases = ", ".join(
+            f"{phase} {self.calls[phase]} calls / {self.output_tokens[phase]} tokens"
+            f" / {self.seconds[phase]:.2f}s"
+            for phase in ("tool", "answer")
+        )
+        return (
+            f"[Generation: {phases}; {self.repaired} turns repaired, "
+            f"{self.truncated} truncated]"
+        )
+
+    def attributes(self) -> dict:
+        """Counters to attach to the run's trace."""
+        return {
+            "generation_output_tokens": sum(self.output_tokens.values()),
+            "generation_seconds": round(sum(self.seconds.values()), 3),
+            "generation_repaired": self.repaired,
+            "generation_truncated": self.truncated,
+        }
+
+
+class GenerationPolicy:
+    """Stop sequences and output caps for the tool-selection and answer turns.
+
+    Args:
+        tool_max_tokens: Output cap of the tool-selection turns
+        answer_max_tokens: Output cap of the answer turns
+        answer_tools: Tools that must all have succeeded before the answer is
+            expected (default: any successful tool)
+        tool_stop: Stop sequences of the tool-selection turns
+        answer_stop: Stop sequences of the answer turns
+    """
+
+    def __init__(
+        self,
+        tool_max_tokens: int = 512,
+        answer_max_tokens: int = 2048,
+        answer_tools: Optional[set[str]] = None,
+        tool_stop: tuple[str, ...] = TOOL_STOP,
+        answer_stop: tuple[str, ...] = ANSWER_STOP,
+    ):
+        self.tool_max_tokens = tool_max_tokens
+        self.answer_max_tokens = answer_max_tokens
+        self.answer_tools = set(answer_tools or ())
+        self.tool_stop = tuple(tool_stop)
+        self.answer_stop = tuple(answer_stop)
+        self._lock = threading.Lock()
+        self._totals = GenerationStats(0, 0, 0, 0.0, 0, 0)
+
+    def new_run(self, tools_called: Optional[list[str]] = None) -> GenerationRun:
+        return GenerationRun(self, tools_called)
+
+    def _add(self, stats: GenerationStats):
+        with self._lock:
+            self._totals = GenerationStats(
+                *(total + value for total, value in zip(self._totals, stats))
+            )
+
+    def stats(self) -> GenerationStats:
+        """Totals of the finished runs."""
+        with self._lock:
+            return self._totals
+
+
+def add_generation_arguments(parser):
+    """Add the --max-tool-tokens / --max-answer-tokens options to an argparse parser."""
+    parser.add_argument(
+        "--max-tool-tokens",
+        type=int,
+        default=None,
+        help="Output cap of the tool-selection turns; also stops generation "
+        "after a tool call or an answer (default: no limits)",
+    )
+    parser.add_argument(
+        "--max-answer-tokens",
+        type=int,
+        default=2048,
+        help="Output cap of the answer turns, with --max-tool-tokens (default: 2048)",
+    )
+
+
+def generation_from_args(
+    args, answer_tools: Optional[set[str]] = None
+) -> Optional[GenerationPolicy]:
+    """Build the GenerationPolicy selected by add_generation_arguments' options, if any."""
+    if args.max_tool_tokens is None:
+        return None
+    return GenerationPolicy(
+        tool_max_tokens=args.max_tool_tokens,
+        answer_max_tokens=args.max_answer_tokens,
+        answer_tools=answer_tools,
+    )
@@ -0,0 +1,134 @@
+"""
+Token-budgeted conversation history for the ReAct loops.
+
+The loops resend the whole conversation on every iteration, so the tokens
+processed over a run grow quadratically with the number of iterations, and
+long runs eventually overflow the context window.
+
+HistoryManager keeps the system prompt, the user request and the last few
+turns verbatim. Once the conversation goes over a token budget, older turns
+are collapsed into compact summaries:
+- assistant messages keep only their tool calls (the reasoning is dropped)
+- tool results and corrections are cut to a short line each
+
+Only the copy sent to the LLM is compacted, the loop's own messages list
+stays complete. Token counts are tracked incrementally as messages are
+appended, and each run reports how many tokens compaction saved.
+
+Example:
+    history = HistoryManager(max_tokens=2000, keep_last_turns=2)
+    run_agent(..., history=history)
+    print(history.total_tokens_saved)
+"""
+
+from typing import Callable
+import threading
+
+from utils import message_text, parse_response
+
+COMPACTED_PREFIX = "[compacted] "
+
+
+def approximate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class HistoryRun:
+    """Compaction state for a single agent run (see HistoryManager.new_run)."""
+
+    def __init__(self, manager: "HistoryManager"):
+        self.manager = manager
+        self._token_counts: list[int] = []
+        self._summaries: dict[int, dict] = {}
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    def prepare(self, messages: list[dict]) -> list[dict]:
+        """Return the messages to send to the LLM for the next iteration."""
+        manager = self.manager
+        count_tokens = manager.count_tokens
+
+        # Only count the messages appended since the last call
+        for message in messages[len(self._token_counts) :]:
+            self._token_counts.append(count_tokens(message_text(message)))
+        full_tokens = sum(self._token_counts)
+
+        # System prompt and user request (first two) and the last turns stay verbatim
+        keep_from = max(2, len(messages) - 2 * manager.keep_last_turns)
+        if full_tokens <= manager.max_tokens or keep_from <= 2:
+            self.tokens_sent += full_tokens
+            return messages
+
+        prepared = messages[:2]
+        sent_tokens = sum(self._token_counts[:2]) + sum(self._token_counts[keep_from:])
+        for index in range(2, keep_from):
+            # Old messages never change, so each summary is only built once
+            summary = self._summaries.get(index)
+            if summary is None:
+                summary = manager.summarize(messages[index])
+                self._summaries[index] = summary
+            prepared.append(summary)
+            sent_tokens += count_tokens(summary["content"])
+        prepared.extend(messages[keep_from:])
+
+        self.tokens_sent += sent_tokens
+        saved = full_tokens - sent_tokens
+        self.tokens_saved += saved
+        manager._add_saved(saved)
+        return prepared
+
+
+class HistoryManager:
+    """Compacts old turns once the conversation exceeds a token budget.
+
+    Args:
+        max_tokens: Budget above which older turns get compacted
+        keep_last_turns: Number of recent (assistant, user) turns kept verbatim
+        summary_chars: Maximum length of each line in a compacted message
+        count_tokens: Function counting the tokens of a string
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        keep_last_turns: int = 2,
+        summary_chars: int = 120,
+        count_tokens: Callable[[str], int] = approximate_tokens,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_last_turns = keep_last_turns
+        self.summary_chars = summary_chars
+        self.count_tokens = count_tokens
+        self.total_tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def new_run(self) -> HistoryRun:
+        """Start tracking a new conversation (one per agent run)."""
+        return HistoryRun(self)
+
+    def summarize(self, message: dict) -> dict:
+        """Collapse one old message into a compact summary."""
+        text = message_text(message)
+        if message["role"] == "assistant":
+            # Keep what the agent did, drop how it reasoned about it
+            calls = parse_response(text).tool_calls
+            summary = " ".join(
+                f"<tool>{call.name}</tool><parameters>{call.params or ''}</parameters>"
+                for call in calls
+            )
+            summary = summary or "(reasoning omitted)"
+        else:
+            summary = "\n".join(
+                self._shorten(line) for line in text.splitlines() if line.strip()
+            )
+        return {"role": message["role"], "content": COMPACTED_PREFIX + summary}
+
+    def _shorten(self, line: str) -> str:
+        if len(line) <= self.summary_chars:
+            return line
+        return line[: self.summary_chars - 3] + "..."
+
+    def _add_saved(self, tokens: int):
+        with self._lock:
+            self.total_tokens_saved += tokens
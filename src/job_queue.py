@@ -0,0 +1,344 @@
+"""
+Durable job queue for bulk agent runs, backed by a local SQLite file.
+
+Every job is a row of the jobs table, keyed by an idempotency key (the id
+given in the input, or a hash of the agent and the question), so enqueueing
+the same questions twice adds nothing. Its life cycle:
+
+    pending --claim--> running --complete--> done
+                          |
+                          +--fail--> pending (after a backoff delay) or failed
+                          +--lease expires (worker crashed)--> claimable again
+
+Workers in any number of processes claim jobs in a write transaction, so a
+job is handed to one worker at a time. A claim holds a lease: if the worker
+dies, the job becomes claimable again once the lease has expired. A result
+is stored only once: the first run to complete a job wins, and a late
+duplicate (from a worker whose lease had expired while another worker ran
+the job again) is dropped, so re-running a job never changes a stored answer.
+
+The database uses WAL mode, so the progress can be read while workers write.
+
+Example:
+    queue = JobQueue("jobs.db")
+    queue.enqueue("what should I do in honolulu next week?")
+    job = queue.claim("worker-1")
+    queue.complete(job.id, "worker-1", answer="...", latency=1.2)
+"""
+
+from typing import Iterator, NamedTuple, Optional
+import hashlib
+import json
+import sqlite3
+import time
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    question TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    answer TEXT,
+    error TEXT,
+    latency REAL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at);
+"""
+
+
+class Job(NamedTuple):
+    """A job of the queue, as stored."""
+
+    id: str
+    agent: str
+    question: str
+    status: str
+    attempts: int
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    latency: Optional[float] = None
+
+    def to_json(self) -> dict:
+        return self._asdict()
+
+
+class QueueCounts(NamedTuple):
+    """Jobs by status."""
+
+    pending: int
+    running: int
+    done: int
+    failed: int
+
+    @property
+    def total(self) -> int:
+        return self.pending + self.running + self.done + self.failed
+
+    @property
+    def remaining(self) -> int:
+        return self.pending + self.running
+
+
+def job_id(agent: str, question: str) -> str:
+    """Default idempotency key of a job."""
+    return hashlib.sha256(f"{agent}\0{question}".encode()).hexdigest()[:16]
+
+
+class JobQueue:
+    """SQLite-backed job queue, shared by processes through its file.
+
+    Each process (and thread) must use its own JobQueue instance.
+
+    Args:
+        path: The SQLite database file (created if missing)
+        max_attempts: Runs of a job before it is marked failed
+        lease_seconds: How long a claimed job is reserved for its worker
+        retry_delay: Seconds before a failed job is retried, doubled at
+            every attempt
+    """
+
+    def __init__(
+        self,
+        path: str = "jobs.db",
+        max_attempts: int = 3,
+        lease_seconds: float = 600.0,
+        retry_delay: float = 5.0,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        # Transactions are explicit (BEGIN IMMEDIATE), hence isolation_level=None
+        self.db = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def enqueue(
+        self, question: str, agent: str = "simple", key: Optional[str] = None
+    ) -> bool:
+        """Add a job, unless one with the same key exists. Returns whether it was added."""
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO jobs (id, agent, question, max_attempts, "
+            "available_at, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key or job_id(agent, question),
+                agent,
+                question,
+                self.max_attempts,
+                now,
+                now,
+            ),
+        )
+        return cursor.rowcount == 1
+
+    def enqueue_many(self, records: list[dict], agent: str = "simple") -> int:
+        """Add jobs from {"question", "agent"?, "id"?} records, in one transaction.
+
+        Returns:
+            The number of jobs added (existing ids are skipped)
+        """
+        now = time.time()
+        rows = [
+            (
+                record.get("id")
+                or job_id(record.get("agent", agent), record["question"]),
+                record.get("agent", agent),
+                record["question"],
+                self.max_attempts,
+                now,
+                now,
+            )
+            for record in records
+        ]
+        before = self.db.total_changes
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO jobs (id, agent, question, max_attempts, "
+                "available_at, created) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return self.db.total_changes - before
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Reserve the next available job for worker, or None if there is none.
+
+        Pending jobs are available once their retry delay has passed, running
+        jobs once their lease has expired (their worker died).
+        """
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # A job whose worker died on its last attempt is not retried
+            self.db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker lost (lease expired)', "
+                "lease_until = NULL, finished = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = self.db.execute(
+                "SELECT id, agent, question, attempts FROM jobs "
+                "WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created, rowid LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            key, agent, question, attempts = row
+            self.db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                "worker = ?, lease_until = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, key),
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return Job(key, agent, question, RUNNING, attempts + 1)
+
+    def complete(self, key: str, worker: str, answer: str, latency: float) -> bool:
+        """Store the result of a job. Returns False if it already had one."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = 'done', answer = ?, error = NULL, latency = ?, "
+            "worker = ?, lease_until = NULL, finished = ? "
+            "WHERE id = ? AND status != 'done'",
+            (answer, latency, worker, time.time(), key),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, key: str, worker: str, error: str, latency: float) -> str:
+        """Record a failed run: retried after a backoff, or failed for good.
+
+        Only the worker holding the job can fail it, and never once it is done.
+
+        Returns:
+            The new status of the job (pending or failed), or its current
+            status if the worker no longer holds it
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT status, attempts, max_attempts, worker FROM jobs WHERE id = ?",
+                (key,),
+            ).fetchone()
+            status, attempts, max_attempts, holder = row
+            if status != RUNNING or holder != worker:
+                self.db.execute("COMMIT")
+                return status
+            status = FAILED if attempts >= max_attempts else PENDING
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            self.db.execute(
+                "UPDATE jobs SET status = ?, error = ?, latency = ?, lease_until = NULL, "
+                "available_at = ?, finished = ? WHERE id = ?",
+                (
+                    status,
+                    error,
+                    latency,
+                    now + delay,
+                    now if status == FAILED else None,
+                    key,
+                ),
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return status
+
+    def release(self, key: str, worker: str):
+        """Give a claimed job back without counting the attempt (e.g. on shutdown)."""
+        self.db.execute(
+            "UPDATE jobs SET status = 'pending', attempts = attempts - 1, "
+            "lease_until = NULL WHERE id = ? AND status = 'running' AND worker = ?",
+            (key, worker),
+        )
+
+    def retry_failed(self) -> int:
+        """Make the failed jobs pending again, with fresh attempts. Returns their number."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ? "
+            "WHERE status = 'failed'",
+            (time.time(),),
+        )
+        return cursor.rowcount
+
+    def counts(self) -> QueueCounts:
+        rows = dict(
+            self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        )
+        return QueueCounts(*(rows.get(status, 0) for status in QueueCounts._fields))
+
+    def finished_since(self, since: float) -> list[float]:
+        """Latencies of the jobs done since the given time, for throughput reports."""
+        return [
+            latency
+            for (latency,) in self.db.execute(
+                "SELECT latency FROM jobs WHERE status = 'done' AND finished >= ?",
+                (since,),
+            )
+        ]
+
+    def jobs(self, status: Optional[str] = None) -> Iterator[Job]:
+        """All the jobs (or those with the given status), oldest first."""
+        query = (
+            "SELECT id, agent, question, status, attempts, answer, error, latency "
+            "FROM jobs"
+        )
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        for row in self.db.execute(query + " ORDER BY created, rowid", params):
+            yield Job(*row)
+
+    def export_jsonl(self, path: str) -> int:
+        """Write every done or failed job to a JSONL file. Returns the number written."""
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for job in self.jobs():
+                if job.status in (DONE, FAILED):
+                    f.write(json.dumps(job.to_json()) + "\n")
+                    count += 1
+        return count
+
+
+def read_jsonl(path: str) -> list[dict]:
+    """Read question records from a JSONL file.
+
+    Each line is an object with a "question" and optionally an "id" and an
+    "agent"; a line holding a plain JSON string is a question.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            if not isinstance(record, dict) or "question" not in record:
+                raise ValueError(f"{path}:{line_number}: expected a 'question' field")
+            records.append(record)
+    return records
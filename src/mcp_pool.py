@@ -0,0 +1,267 @@
+"""
+Pool of warm MCP client sessions.
+
+Opening an MCPClient starts the server subprocess (`uv run python
+fast_mcp/server.py`), performs the MCP handshake and discovers the tools:
+seconds of work before the agent can even call the LLM. Doing it once per
+question is what made agent_with_mcp.py slow to answer.
+
+MCPSessionPool keeps a few sessions open and hands them out to agent runs,
+one run per session at a time (sequential or concurrent runs alike). The
+tools discovered when a session connects are kept with it and reused by
+every run. Sessions are health-checked with an MCP ping when they have been
+idle for a while or when a run using them failed, and restarted if the
+server stopped responding.
+
+Example:
+    with MCPSessionPool(size=2) as pool:
+        for question in questions:
+            run_agent(question, pool=pool)
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+import asyncio
+import queue
+import threading
+import time
+
+# mcp and smolagents are slow to import: they are loaded on first use
+if TYPE_CHECKING:
+    from mcp import StdioServerParameters
+
+
+def default_server_parameters() -> "StdioServerParameters":
+    """Parameters to start the FastMCP server in fast_mcp/server.py over stdio."""
+    from mcp import StdioServerParameters
+
+    mcp_server_path = Path(__file__).parent / "fast_mcp" / "server.py"
+    return StdioServerParameters(
+        command="uv", args=["run", "python", str(mcp_server_path)]
+    )
+
+
+def http_server_parameters(url: str = "http://127.0.0.1:8000/mcp") -> dict:
+    """Parameters to connect to a server started with `server.py --transport http`.
+
+    A single HTTP server can serve every session of the pool (and of other
+    processes), instead of one server subprocess per session.
+    """
+    return {"url": url, "transport": "streamable-http"}
+
+
+ServerParameters = Union["StdioServerParameters", dict]
+
+
+def _plain_json(value):
+    """Deep copy of a JSON-like value made of plain dicts and lists."""
+    if isinstance(value, dict):
+        return {key: _plain_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain_json(item) for item in value]
+    return value
+
+
+def resolve_output_schemas(tools: list) -> list:
+    """Make the tools' output schemas serializable again.
+
+    mcpadapt resolves the $refs of structured output schemas (e.g. the
+    list[WeatherInfo] of get_weather_many) into jsonref proxies, which
+    json.dumps rejects when CodeAgent renders the tools into its system
+    prompt. Returns tools, with plain-dict schemas.
+    """
+    for tool in tools:
+        schema = getattr(tool, "output_schema", None)
+        if schema is not None:
+            tool.output_schema = _plain_json(schema)
+    return tools
+
+
+# Seconds between two checks for a free slot while waiting for a session
+_SLOT_CHECK_INTERVAL = 0.5
+
+
+class _PooledSession:
+    """An open MCPClient together with the tools it discovered."""
+
+    def __init__(self, server_parameters: ServerParameters, structured_output: bool):
+        from smolagents import MCPClient
+
+        self.client = MCPClient(server_parameters, structured_output=structured_output)
+        # Tool discovery happens once, when the session connects
+        self.tools = resolve_output_schemas(self.client.get_tools())
+        self.last_checked = time.monotonic()
+
+    def ping(self, timeout: float) -> bool:
+        """Check that the server still answers an MCP ping."""
+        # smolagents runs the MCP session on a background event loop (mcpadapt);
+        # if those internals are not available we cannot tell, so assume alive
+        adapter = getattr(self.client, "_adapter", None)
+        sessions = getattr(adapter, "sessions", None)
+        loop = getattr(adapter, "loop", None)
+        if not sessions or loop is None:
+            return True
+        try:
+            asyncio.run_coroutine_threadsafe(sessions[0].send_ping(), loop).result(
+                timeout=timeout
+            )
+        except Exception:
+            return False
+        self.last_checked = time.monotonic()
+        return True
+
+    def close(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            # The server may already be gone, which is why we are closing it
+            pass
+
+
+class MCPSessionPool:
+    """Long-lived pool of MCP sessions shared by many CodeAgent runs.
+
+    Args:
+        server_parameters: How to start (stdio) or reach (HTTP) the MCP server
+            (default: start fast_mcp/server.py over stdio)
+        size: Maximum number of open sessions (and of concurrent runs)
+        structured_output: Passed to MCPClient
+        health_check_interval: Ping sessions idle for longer than this (seconds)
+        ping_timeout: Seconds to wait for a ping answer
+    """
+
+    def __init__(
+        self,
+        server_parameters: Optional[ServerParameters] = None,
+        size: int = 2,
+        structured_output: bool = True,
+        health_check_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+    ):
+        self.server_parameters = server_parameters or default_server_parameters()
+        self.size = size
+        self.structured_output = structured_output
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+        # LIFO, so the most recently used (warmest) session is handed out first
+        self._idle: queue.LifoQueue[_PooledSession] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+        self.checkouts = 0
+        self.restarts = 0
+
+    def _connect(self) -> _PooledSession:
+        return _PooledSession(self.server_parameters, self.structured_output)
+
+    def _open_session(self) -> _PooledSession:
+        """Connect a session in a slot already counted in _open."""
+        try:
+            return self._connect()
+        except BaseException:
+            # Free the slot, or waiting runs would block on a session never opened
+            with self._lock:
+                self._open -= 1
+            raise
+
+    def warm_up(self, count: Optional[int] = None):
+        """Open sessions ahead of time so the first runs do not pay for them."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("The MCP session pool is closed")
+                if self._open >= count:
+                    return
+                self._open += 1
+            self._idle.put(self._open_session())
+
+    def _acquire(self, timeout: Optional[float]) -> _PooledSession:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("The MCP session pool is closed")
+            try:
+                pooled = self._idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                return self._open_session()
+            # Pool is full: wait for a run to hand its session back, checking
+            # now and then for a slot freed by a session that failed to connect
+            wait = _SLOT_CHECK_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise queue.Empty
+            try:
+                pooled = self._idle.get(timeout=wait)
+                break
+            except queue.Empty:
+                pass
+
+        idle_for = time.monotonic() - pooled.last_checked
+        if idle_for > self.health_check_interval and not pooled.ping(self.ping_timeout):
+            pooled = self._restart(pooled)
+        return pooled
+
+    def _restart(self, pooled: _PooledSession) -> _PooledSession:
+        """Replace a dead session; if it cannot reconnect, its slot is freed."""
+        pooled.close()
+        self.restarts += 1
+        return self._open_session()
+
+    def _release(self, pooled: _PooledSession, failed: bool):
+        if self._closed:
+            pooled.close()
+            with self._lock:
+                self._open -= 1
+            return
+        # A failed run may mean a dead server: check before handing it out again
+        if failed and not pooled.ping(self.ping_timeout):
+            try:
+                pooled = self._restart(pooled)
+            except Exception:
+                # The slot is free again: the next run opens a new session.
+                # The run's own error is the one worth raising
+                return
+        self._idle.put(pooled)
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """Check out a session for one agent run and yield its tools."""
+        pooled = self._acquire(timeout)
+        with self._lock:
+            self.checkouts += 1
+        failed = False
+        try:
+            yield pooled.tools
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(pooled, failed)
+
+    def close(self):
+        """Disconnect every idle session (sessions in use are closed on release)."""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            pooled.close()
+            with self._lock:
+                self._open -= 1
+
+    def __enter__(self) -> "MCPSessionPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
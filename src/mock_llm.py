@@ -0,0 +1,457 @@
+"""
+Mock LLM backend - a local stand-in for litellm.
+
+MockLLM exposes completion() and acompletion() with the same call shape as
+litellm.completion / litellm.acompletion, and returns objects with the same
+attributes the agent loops read (response.choices[0].message.content and
+response.usage). By default it plays a scripted travel agent that follows
+the prompts in prompts.py, so the loops can be exercised without network or
+API keys. It can also replay canned responses, draw latencies from a
+distribution and inject malformed outputs, to test and benchmark the loops
+(see bench_agent_loop.py). It can keep generating past the end of a turn,
+as real models do, and honours stop= and max_tokens= like a provider (see
+bench_generation.py). When called with tools= (native tool calling),
+it answers with structured tool_calls instead of XML tags. ThrottlingLLM
+puts provider-like rate and concurrency limits in front of it, answering
+with 429/529 errors.
+
+Example:
+    llm = MockLLM(latency=0.2, latency_distribution="lognormal", malformed_rate=0.1)
+    run_agent(..., completion_fn=llm.completion)
+"""
+
+from types import SimpleNamespace
+from typing import Callable, Optional, Union
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from utils import message_text, parse_response
+
+
+def make_response(
+    content: str,
+    messages: list,
+    tool_calls: Optional[list] = None,
+    tools: Optional[list] = None,
+    finish_reason: str = "stop",
+) -> SimpleNamespace:
+    """Wrap content (and native tool calls) in a litellm-like response object.
+
+    Token counts are approximated at 4 characters per token; tool
+    definitions count as prompt tokens and tool calls as completion tokens,
+    as they do with real providers.
+    """
+    prompt_chars = sum(len(message_text(m)) for m in messages)
+    completion_chars = len(content)
+    if tools:
+        prompt_chars += len(json.dumps(tools))
+    for call in tool_calls or []:
+        completion_chars += len(call.function.name) + len(call.function.arguments)
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = completion_chars // 4
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                message=SimpleNamespace(
+                    role="assistant", content=content, tool_calls=tool_calls or None
+                ),
+                finish_reason=finish_reason,
+            )
+        ],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+
+def scripted_travel_agent(messages: list, tool_names: Optional[list] = None) -> str:
+    """Produce the next assistant message for the travel agent prompts.
+
+    Checks the weather first, then (if the availability tool is advertised
+    in the system prompt, or in tool_names with native tool calling) checks
+    two activities in one turn, then answers.
+    """
+    system_prompt = message_text(messages[0])
+    if tool_names is not None:
+        system_prompt = " ".join(tool_names)
+    question = message_text(messages[1])
+    tool_results = [
+        message_text(m)
+        for m in messages
+        if m["role"] in ("user", "tool") and "Tool '" in message_text(m)
+    ]
+    location_match = re.search(
+        r"\b(?:travel|go|going|trip) to ([A-Za-z ]+?)(?: next| this|\?|$)", question
+    )
+    location = location_match.group(1) if location_match else "honolulu"
+
+    # Only successful calls count ("Tool 'get_wether' not found" is not one)
+    if not any("Tool 'get_weather' returned" in r for r in tool_results):
+        return (
+            "<reasoning>I need the weather at the destination first.</reasoning>\n"
+            f"<tool>get_weather</tool>\n<parameters>{location}</parameters>"
+        )
+    if "check_availability_activity" in system_prompt and not any(
+        "Tool 'check_availability_activity' returned" in r for r in tool_results
+    ):
+        return (
+            "<reasoning>The weather is good, let me check outdoor activities.</reasoning>\n"
+            "<tool>check_availability_activity</tool>\n<parameters>tennis</parameters>\n"
+            "<tool>check_availability_activity</tool>\n<parameters>padel</parameters>"
+        )
+    return (
+        "<reasoning>I have everything I need.</reasoning>\n"
+        f"<answer>In {location} I suggest tennis, it is sunny and there is a free slot.</answer>"
+    )
+
+
+def make_stream_chunks(
+    content: str, chunk_size: int = 8, finish_reason: str = "stop"
+) -> list[SimpleNamespace]:
+    """Split content into litellm-like streaming chunks (choices[0].delta).
+
+    The last chunk carries the finish_reason.
+    """
+    starts = range(0, len(content), chunk_size)
+    return [
+        SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    delta=SimpleNamespace(content=content[i : i + chunk_size]),
+                    finish_reason=finish_reason if i == starts[-1] else None,
+                )
+            ]
+        )
+        for i in starts
+    ]
+
+
+# What a model writes after a complete turn when nothing stops it: an
+# invented result after a tool call, small talk after an answer
+TOOL_SPECULATION = (
+    "\nTool '{}' returned: sunny, 28 degrees and a light breeze all week\n"
+    "That looks good. Assuming the result above holds, outdoor activities will be "
+    "pleasant, so I would next compare the available options, their prices and "
+    "their time slots, and then recommend the best one for next week."
+)
+ANSWER_SPECULATION = (
+    "\n\nLet me know if you would like me to book it for you, or if you would "
+    "prefer suggestions for indoor activities in case the weather changes."
+)
+
+
+def speculate(content: str) -> str:
+    """Append what a model would write past the end of the turn in content."""
+    parsed = parse_response(content)
+    if parsed.answer:
+        return content + ANSWER_SPECULATION
+    if parsed.tool_calls:
+        return content + TOOL_SPECULATION.format(parsed.tool_calls[-1].name)
+    return content
+
+
+def apply_limits(
+    content: str, stop: Optional[list[str]] = None, max_tokens: Optional[int] = None
+) -> tuple[str, str]:
+    """Cut content like a provider would.
+
+    Generation ends at the first stop sequence (left out of the output) or
+    after max_tokens (at 4 characters per token).
+
+    Returns:
+        The cut content and its finish_reason ("stop" or "length")
+    """
+    if isinstance(stop, str):
+        stop = [stop]
+    positions = [content.find(s) for s in stop or () if s in content]
+    if positions:
+        content = content[: min(positions)]
+    if max_tokens is not None and len(content) > 4 * max_tokens:
+        return content[: 4 * max_tokens], "length"
+    return content, "stop"
+
+
+def _unclosed(content: str) -> str:
+    # Drop the last closing tag, like a truncated generation
+    position = content.rfind("</")
+    return content[:position] if position != -1 else content
+
+
+MALFORMED_OUTPUTS = {
+    "unclosed_tag": _unclosed,
+    "no_tags": lambda content: re.sub(r"</?\w+>", "", content),
+    "unknown_tool": lambda content: content.replace(
+        "<tool>get_weather", "<tool>get_wether"
+    ),
+    "empty": lambda content: "",
+}
+
+
+# Native tool calls are structured, so they break differently from tagged text
+NATIVE_MALFORMED_OUTPUTS = ("unknown_tool", "invalid_arguments", "empty")
+
+
+def to_native(
+    content: str, tools: list, call_prefix: str = "call"
+) -> tuple[str, list[SimpleNamespace]]:
+    """Turn a tagged response into native (text, tool_calls).
+
+    Each call's parameters go to the first parameter of the tool's schema.
+    """
+    parsed = parse_response(content)
+    if parsed.answer:
+        return parsed.answer, []
+    first_parameter = {
+        tool["function"]["name"]: next(
+            iter(tool["function"]["parameters"].get("properties", {})), None
+        )
+        for tool in tools
+    }
+    tool_calls = []
+    for index, call in enumerate(parsed.tool_calls):
+        name = first_parameter.get(call.name)
+        arguments = {name: call.params} if name else {}
+        tool_calls.append(
+            SimpleNamespace(
+                id=f"{call_prefix}_{index}",
+                type="function",
+                function=SimpleNamespace(
+                    name=call.name, arguments=json.dumps(arguments)
+                ),
+            )
+        )
+    return parsed.reasoning or "", tool_calls
+
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+
+class MockLLM:
+    """Scriptable fake LLM.
+
+    Deterministic for a given seed: the same calls get the same responses,
+    latencies and malformed outputs.
+
+    Args:
+        latency: Mean seconds to wait before every response, to mimic network time
+        latency_distribution: How latencies are drawn around the mean, one of
+            "constant", "uniform" (0 to 2x), "exponential" or "lognormal"
+        responses: Canned responses instead of the scripted travel agent,
+            either a list of strings (used in turn, cycling) or a function
+            taking the messages and returning the response text
+        malformed_rate: Probability of replacing a response with a malformed one
+        malformed_kinds: Which MALFORMED_OUTPUTS to inject (default: all);
+            native tool calls get one of NATIVE_MALFORMED_OUTPUTS instead
+        speculation_rate: Probability of generating past the end of a turn
+            (see speculate), unless a stop sequence cuts it
+        token_latency: Seconds per output token, added to the latency
+        seed: Seed of the random generator
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_distribution: str = "constant",
+        responses: Optional[Union[list[str], Callable[[list], str]]] = None,
+        malformed_rate: float = 0.0,
+        malformed_kinds: Optional[list[str]] = None,
+        speculation_rate: float = 0.0,
+        token_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution '{latency_distribution}', "
+                f"expected one of {LATENCY_DISTRIBUTIONS}"
+            )
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.responses = responses
+        self.malformed_rate = malformed_rate
+        self.malformed_kinds = malformed_kinds or list(MALFORMED_OUTPUTS)
+        self.speculation_rate = speculation_rate
+        self.token_latency = token_latency
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.malformed = 0
+        self.output_tokens = 0
+
+    def _next_content(self, messages: list, tools: Optional[list] = None) -> str:
+        if self.responses is None:
+            tool_names = [t["function"]["name"] for t in tools] if tools else None
+            content = scripted_travel_agent(messages, tool_names)
+        elif callable(self.responses):
+            content = self.responses(messages)
+        else:
+            content = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+
+        if not tools and self.speculation_rate:
+            if self.rng.random() < self.speculation_rate:
+                content = speculate(content)
+        # Native tool calls are broken after conversion (see _native_response)
+        if not tools and self._draw_malformed():
+            kind = self.rng.choice(self.malformed_kinds)
+            content = MALFORMED_OUTPUTS[kind](content)
+        return content
+
+    def _draw_malformed(self) -> bool:
+        if self.malformed_rate and self.rng.random() < self.malformed_rate:
+            self.malformed += 1
+            return True
+        return False
+
+    def _native_response(self, content: str, messages: list, tools: list):
+        text, tool_calls = to_native(content, tools, f"call_{self.calls}")
+        if self._draw_malformed():
+            kind = self.rng.choice(NATIVE_MALFORMED_OUTPUTS)
+            if kind == "empty" or not tool_calls:
+                text, tool_calls = "", []
+            elif kind == "unknown_tool":
+                tool_calls[0].function.name += "_x"
+            else:
+                tool_calls[0].function.arguments = tool_calls[0].function.arguments[:-2]
+        return make_response(text, messages, tool_calls, tools)
+
+    def _generate(self, messages: list, tools: Optional[list], kwargs: dict):
+        """The next content, its finish_reason and the latency to wait for it."""
+        content = self._next_content(messages, tools)
+        finish_reason = "stop"
+        if not tools:
+            content, finish_reason = apply_limits(
+                content, kwargs.get("stop"), kwargs.get("max_tokens")
+            )
+        self.output_tokens += len(content) // 4
+        latency = self._next_latency() + self.token_latency * (len(content) // 4)
+        return content, finish_reason, latency
+
+    def _next_latency(self) -> float:
+        if not self.latency:
+            return 0.0
+        if self.latency_distribution == "uniform":
+            return self.rng.uniform(0, 2 * self.latency)
+        if self.latency_distribution == "exponential":
+            return self.rng.expovariate(1 / self.latency)
+        if self.latency_distribution == "lognormal":
+            # sigma=0.5 gives a realistic long tail; mu keeps the mean at latency
+            return self.rng.lognormvariate(math.log(self.latency) - 0.125, 0.5)
+        return self.latency
+
+    def completion(self, model: str, messages: list, **kwargs):
+        tools = kwargs.get("tools")
+        content, finish_reason, latency = self._generate(messages, tools, kwargs)
+        if kwargs.get("stream"):
+            return self._stream(content, latency, finish_reason)
+        if latency:
+            time.sleep(latency)
+        if tools:
+            return self._native_response(content, messages, tools)
+        return make_response(content, messages, finish_reason=finish_reason)
+
+    async def acompletion(self, model: str, messages: list, **kwargs):
+        tools = kwargs.get("tools")
+        content, finish_reason, latency = self._generate(messages, tools, kwargs)
+        if kwargs.get("stream"):
+            return self._astream(content, latency, finish_reason)
+        if latency:
+            await asyncio.sleep(latency)
+        if tools:
+            return self._native_response(content, messages, tools)
+        return make_response(content, messages, finish_reason=finish_reason)
+
+    # When streaming, the latency is spread evenly over the chunks
+    def _stream(self, content: str, latency: float, finish_reason: str = "stop"):
+        chunks = make_stream_chunks(content, finish_reason=finish_reason)
+        for chunk in chunks:
+            if latency:
+                time.sleep(latency / len(chunks))
+            yield chunk
+
+    async def _astream(self, content: str, latency: float, finish_reason: str = "stop"):
+        chunks = make_stream_chunks(content, finish_reason=finish_reason)
+        for chunk in chunks:
+            if latency:
+                await asyncio.sleep(latency / len(chunks))
+            yield chunk
+
+
+class RateLimitError(Exception):
+    """Raised by ThrottlingLLM like a provider's HTTP 429."""
+
+    status_code = 429
+
+
+class OverloadedError(Exception):
+    """Raised by ThrottlingLLM like a provider's overloaded response (529)."""
+
+    status_code = 529
+
+
+class ThrottlingLLM:
+    """Fake provider that enforces rate and concurrency limits like a real one.
+
+    Requests over requests_per_window within the last `window` seconds are
+    rejected with RateLimitError, and requests arriving while
+    max_concurrency calls are already in flight with OverloadedError.
+    Accepted requests are answered by the wrapped MockLLM.
+
+    Args:
+        llm: The MockLLM answering accepted requests
+        requests_per_window: Requests accepted per sliding window
+        window: Window length in seconds (60 for a requests/minute limit)
+        max_concurrency: Calls allowed in flight at once
+    """
+
+    def __init__(
+        self,
+        llm: Optional[MockLLM] = None,
+        requests_per_window: int = 60,
+        window: float = 60.0,
+        max_concurrency: int = 4,
+    ):
+        self.llm = llm or MockLLM(latency=0.1)
+        self.requests_per_window = requests_per_window
+        self.window = window
+        self.max_concurrency = max_concurrency
+        self._accepted: list[float] = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _admit(self):
+        with self._lock:
+            now = time.monotonic()
+            self._accepted = [t for t in self._accepted if now - t < self.window]
+            if len(self._accepted) >= self.requests_per_window:
+                self.rejected += 1
+                raise RateLimitError("429 Too Many Requests: rate limit exceeded")
+            if self._in_flight >= self.max_concurrency:
+                self.rejected += 1
+                raise OverloadedError("529 Overloaded: too many concurrent requests")
+            self._accepted.append(now)
+            self._in_flight += 1
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def completion(self, model: str, messages: list, **kwargs):
+        self._admit()
+        try:
+            return self.llm.completion(model, messages, **kwargs)
+        finally:
+            self._done()
+
+    async def acompletion(self, model: str, messages: list, **kwargs):
+        self._admit()
+        try:
+            return await self.llm.acompletion(model, messages, **kwargs)
+        finally:
+            self._done()
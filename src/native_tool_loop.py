@@ -0,0 +1,417 @@
+"""
+Native Tool Calling Loop
+
+The ReAct loops describe the tools in the system prompt and ask the model to
+write <tool> and <parameters> tags, which parse_response recovers with a
+regex sweep. That text costs prompt tokens on every call, and every
+malformed tag costs an extra iteration to correct.
+
+This loop runs the same travel agent (with the advanced agent's tools) on
+the provider's native tool calling instead:
+1. The tools are sent as JSON-schema definitions through litellm's tools=
+   parameter, built from the function signatures by function_to_tool
+2. The calls are read from response.choices[0].message.tool_calls, with
+   their arguments as a JSON object
+3. Each result goes back as a {"role": "tool", "tool_call_id": ...} message
+4. A message without tool calls is the final answer
+
+The XML loops are unchanged; bench_tool_modes.py compares tokens and
+iterations per question between the two modes.
+"""
+
+from typing import Any, Callable, NamedTuple, Optional
+import asyncio
+import json
+
+from binding import compile_binder
+from utils import (
+    ToolCall,
+    ToolResult,
+    build_messages,
+    default_acompletion_fn,
+    default_completion_fn,
+    execute_tool_calls,
+    tool_definitions,
+)
+from tool_cache import ToolCache
+from budget import Budget, RunBudget
+from tracing import RunTrace, Tracer, usage_attributes
+from prompts import NATIVE_SYSTEM_PROMPT
+from tools import get_weather, check_availability_activity
+
+NO_ANSWER = "No answer could be found"
+
+
+def _check_arguments(call: ToolCall, tools: dict) -> Optional[str]:
+    """Why the JSON arguments of a native tool call are invalid, or None.
+
+    The XML loops accept loose parameter text, but native arguments must be
+    a JSON object whose keys are parameters of the tool's schema; the
+    values are then checked by the tool's binder.
+    """
+    if call.name not in tools:
+        # Reported by execute_tool_calls, with the available tools
+        return None
+    try:
+        arguments = json.loads(call.params or "{}")
+    except json.JSONDecodeError as e:
+        return f"Invalid arguments for tool '{call.name}': not valid JSON ({e})"
+    if not isinstance(arguments, dict):
+        return f"Invalid arguments for tool '{call.name}': expected a JSON object"
+    schema = compile_binder(tools[call.name]).json_schema()
+    properties = schema.get("properties")
+    if properties is None:
+        return None
+    unknown = [key for key in arguments if key not in properties]
+    missing = [key for key in schema.get("required", []) if key not in arguments]
+    if unknown or missing:
+        problems = []
+        if unknown:
+            problems.append(f"unknown {', '.join(map(repr, unknown))}")
+        if missing:
+            problems.append(f"missing {', '.join(map(repr, missing))}")
+        return (
+            f"Invalid arguments for tool '{call.name}': {'; '.join(problems)}. "
+            f"Expected the parameters {json.dumps(schema)}"
+        )
+    return None
+
+
+def _handle_turn(
+    message,
+    messages: list,
+    tools: dict,
+    tools_called: list,
+    required_tools: tuple[str, ...],
+    trace: RunTrace,
+    tool_cache: Optional[ToolCache] = None,
+) -> Optional[str]:
+    """Process one assistant message (with native tool calls).
+
+    Returns the final answer if the agent produced one, otherwise appends
+    the assistant message and the follow-up messages (tool results or
+    correction) to messages and returns None. Successful tool calls are
+    recorded in tools_called; logs and spans go to trace.
+    """
+    content = message.content or ""
+    tool_calls = [
+        ToolCall(call.function.name, call.function.arguments, call.id)
+        for call in getattr(message, "tool_calls", None) or []
+    ]
+    if content and tool_calls:
+        trace.log(f"\nReasoning: {content}")
+
+    # The assistant message must carry its tool calls, which the tool messages refer to
+    assistant_message = {"role": "assistant", "content": content or None}
+    if tool_calls:
+        assistant_message["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.name, "arguments": call.params or "{}"},
+            }
+            for call in tool_calls
+        ]
+    messages.append(assistant_message)
+
+    if tool_calls:
+        # Arguments are a JSON object, checked against the tool's schema, which
+        # the tools' binders parse directly; invalid ones get an error result
+        results = [None] * len(tool_calls)
+        valid = []
+        for index, call in enumerate(tool_calls):
+            error = _check_arguments(call, tools)
+            if error is None:
+                valid.append(index)
+            else:
+                results[index] = ToolResult(call.name, error, ok=False)
+        executed = execute_tool_calls([tool_calls[i] for i in valid], tools, tool_cache)
+        for index, result in zip(valid, executed):
+            results[index] = result
+        for call, result in zip(tool_calls, results):
+            trace.log(result.content)
+            trace.record(
+                "tool",
+                result.latency,
+                tool=result.name,
+                ok=result.ok,
+                result_size=len(result.content),
+            )
+            if result.ok:
+                tools_called.append(result.name)
+            messages.append(
+                {"role": "tool", "tool_call_id": call.id, "content": result.content}
+            )
+        return None
+
+    missing = [name for name in required_tools if name not in tools_called]
+    if content and not missing:
+        trace.log(f"\nFinal Answer: {content}")
+        return content.strip()
+
+    # An empty message, or an answer given before checking everything
+    if missing:
+        correction = f"Please call {', '.join(missing)} before answering."
+    else:
+        correction = "Please call a tool or give your final recommendation."
+    messages.append({"role": "user", "content": correction})
+    return None
+
+
+class _LLMCall(NamedTuple):
+    """An LLM call needed by the loop (answered with the response)."""
+
+    model: str
+    messages: list
+
+
+class _Turn(NamedTuple):
+    """An assistant message to handle (answered with the final answer or None)."""
+
+    message: Any
+
+
+def _steps(
+    messages: list,
+    max_iterations: int,
+    trace: RunTrace,
+    budget_run: Optional[RunBudget],
+    model: str,
+):
+    """The loop, as a generator of the LLM calls and turns it needs.
+
+    run_agent drives it with a completion function and run_agent_async with
+    an async one, so the loop is written once.
+    """
+    for iteration in range(max_iterations):
+        trace.iteration = iteration + 1
+        if budget_run is not None and budget_run.exceeded():
+            trace.log(f"\n\n!!! Budget exceeded ({budget_run.exceeded_reason}) !!!\n\n")
+            return NO_ANSWER
+        call_model = budget_run.model_for(model) if budget_run else model
+        with trace.span("llm", model=call_model) as span:
+            response = yield _LLMCall(call_model, messages)
+            message = response.choices[0].message
+            span.update(usage_attributes(response))
+
+        if budget_run is not None:
+            budget_run.record(
+                call_model,
+                messages,
+                message.content or "",
+                response,
+                iteration=iteration + 1,
+            )
+
+        trace.log(f"\n--- Iteration {iteration + 1} ---")
+        answer = yield _Turn(message)
+        if answer:
+            return answer
+    trace.log("\n\n!!! Maximum iterations reached without final answer !!!\n\n")
+    return NO_ANSWER
+
+
+def _finish(answer: str, trace: RunTrace, budget_run: Optional[RunBudget]) -> str:
+    budget_attributes = {}
+    if budget_run is not None:
+        trace.log(budget_run.report())
+        budget_attributes = budget_run.attributes()
+    trace.finish(**budget_attributes)
+    return answer
+
+
+def run_agent(
+    system_prompt: str,
+    user_request: str,
+    tools: dict,
+    model: str,
+    max_iterations: int = 10,
+    completion_fn: Optional[Callable] = None,
+    tool_cache: Optional[ToolCache] = None,
+    cache_prompt: bool = True,
+    tracer: Optional[Tracer] = None,
+    budget: Optional[Budget] = None,
+    required_tools: tuple[str, ...] = (),
+):
+    """Run the agent with native tool calling.
+
+    Args:
+        system_prompt: The system prompt (without tag instructions, e.g.
+            NATIVE_SYSTEM_PROMPT)
+        user_request: The user's question
+        tools: Dictionary of available tool functions
+        model: The model identifier
+        max_iterations: Maximum number of LLM calls
+        completion_fn: LLM backend to use instead of litellm.completion
+        tool_cache: Optional ToolCache to serve repeated tool calls from
+        cache_prompt: Mark the system prompt for provider prompt caching
+        tracer: Tracer receiving the spans and logs of the run (default: silent)
+        budget: Token and cost limits of the run
+        required_tools: Tools that must have succeeded before an answer is
+            accepted (those not in tools are ignored)
+
+    Returns:
+        The final answer, or "No answer could be found"
+    """
+    completion_fn = completion_fn or default_completion_fn()
+
+    # The tools go in tools=, not in the prompt. Anthropic caches tools before
+    # the system prompt, so its cache breakpoint covers both
+    messages = build_messages(system_prompt, user_request, {}, cache_prompt)
+    definitions = tool_definitions(tuple(tools.values()))
+    trace = (tracer or Tracer()).start_run()
+    budget_run = budget.new_run() if budget is not None else None
+    tools_called = []
+    required_tools = tuple(name for name in required_tools if name in tools)
+
+    def execute(request):
+        if isinstance(request, _Turn):
+            return _handle_turn(
+                request.message,
+                messages,
+                tools,
+                tools_called,
+                required_tools,
+                trace,
+                tool_cache,
+            )
+        return completion_fn(
+            model=request.model, messages=request.messages, tools=definitions
+        )
+
+    steps = _steps(messages, max_iterations, trace, budget_run, model)
+    try:
+        request = next(steps)
+        while True:
+            # Errors are raised where the loop made the request (e.g. in its span)
+            try:
+                result = execute(request)
+            except BaseException as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return _finish(stop.value, trace, budget_run)
+
+
+async def run_agent_async(
+    system_prompt: str,
+    user_request: str,
+    tools: dict,
+    model: str,
+    max_iterations: int = 10,
+    acompletion_fn: Optional[Callable] = None,
+    tool_cache: Optional[ToolCache] = None,
+    cache_prompt: bool = True,
+    tracer: Optional[Tracer] = None,
+    budget: Optional[Budget] = None,
+    required_tools: tuple[str, ...] = (),
+):
+    """Asyncio version of run_agent, built on litellm.acompletion."""
+    acompletion_fn = acompletion_fn or default_acompletion_fn()
+
+    messages = build_messages(system_prompt, user_request, {}, cache_prompt)
+    definitions = tool_definitions(tuple(tools.values()))
+    trace = (tracer or Tracer()).start_run()
+    budget_run = budget.new_run() if budget is not None else None
+    tools_called = []
+    required_tools = tuple(name for name in required_tools if name in tools)
+
+    async def execute(request):
+        if isinstance(request, _Turn):
+            return await asyncio.to_thread(
+                _handle_turn,
+                request.message,
+                messages,
+                tools,
+                tools_called,
+                required_tools,
+                trace,
+                tool_cache,
+            )
+        return await acompletion_fn(
+            model=request.model, messages=request.messages, tools=definitions
+        )
+
+    steps = _steps(messages, max_iterations, trace, budget_run, model)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                result = await execute(request)
+            except BaseException as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return _finish(stop.value, trace, budget_run)
+
+
+if __name__ == "__main__":
+    import argparse
+    from completion_cache import CompletionCache, add_cache_arguments
+    from tracing import add_tracing_arguments, tracer_from_args
+    from budget import add_budget_arguments, budget_from_args
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Travel agent using the provider's native tool calling"
+    )
+    parser.add_argument(
+        "-q",
+        "--question",
+        type=str,
+        default="what activity do you suggest to book if I travel to honolulu next week?",
+        help="User question for the travel agent",
+    )
+    parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=10,
+        help="Maximum number of agent iterations (default: 10)",
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="Use the mock LLM backend instead of a real model",
+    )
+    add_cache_arguments(parser)
+    add_tracing_arguments(parser)
+    add_budget_arguments(parser)
+    args = parser.parse_args()
+
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    completion_fn = None
+    if args.mock:
+        from mock_llm import MockLLM
+
+        completion_fn = MockLLM().completion
+    # Optionally record or replay completions from the on-disk cache
+    if args.llm_cache:
+        completion_fn = CompletionCache(
+            args.llm_cache_dir, args.llm_cache, completion_fn=completion_fn
+        ).completion
+
+    tools = {
+        "get_weather": get_weather,
+        "check_availability_activity": check_availability_activity,
+    }
+
+    print(f"\n=== Question: {args.question}")
+    result = run_agent(
+        system_prompt=NATIVE_SYSTEM_PROMPT,
+        user_request=args.question,
+        tools=tools,
+        model="claude-sonnet-4-5-20250929",
+        completion_fn=completion_fn,
+        tracer=tracer_from_args(args),
+        budget=budget_from_args(args),
+        max_iterations=args.max_iterations,
+        required_tools=("get_weather", "check_availability_activity"),
+    )
+    print("\n=== Final Answer ===")
+    print(result)
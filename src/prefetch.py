@@ -0,0 +1,268 @@
+"""
+Speculative tool prefetch for the ReAct loops.
+
+The advanced travel agent follows a very predictable trajectory: get_weather
+for the destination first, then check_availability_activity for some of the
+six activities listed in ADVANCED_SYSTEM_PROMPT. Still, every tool call only
+starts after a full LLM round-trip.
+
+A Prefetcher predicts the next tool calls from the question and the history
+and starts them on its own small thread pool before the LLM is called, so
+they run while the request is in flight (without taking the workers of the
+tool calls the model actually asked for). When the model then asks for a call
+that was prefetched, its result is used directly; predictions the model did
+not ask for are discarded. Hits, misses and wasted calls are counted to
+report the hit rate.
+
+Only use it with side-effect free tools: mispredicted calls do run.
+
+Example:
+    prefetcher = Prefetcher()
+    run_agent(..., prefetch=prefetcher)
+    print(prefetcher.stats())
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional
+import re
+import threading
+
+from binding import ToolArgumentError, compile_binder
+from tool_cache import ToolCache, normalize_params
+from utils import ToolCall, ToolResult, call_tool, execute_tool_calls
+
+# The activities ADVANCED_SYSTEM_PROMPT allows the agent to recommend
+ACTIVITIES = (
+    "tennis",
+    "padel",
+    "soccer",
+    "scuba lesson",
+    "yoga lesson",
+    "cooking class",
+)
+
+_DESTINATION_PATTERN = re.compile(
+    r"\b(?:travel|traveling|travelling|go|going|trip|visit|visiting) (?:to )?"
+    r"([A-Za-z][A-Za-z ]*?)(?: next| this| in| on|[?.,!]|$)",
+    re.IGNORECASE,
+)
+
+
+class PrefetchStats(NamedTuple):
+    """Counters for a Prefetcher."""
+
+    prefetched: int
+    hits: int
+    misses: int
+    wasted: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the tool calls requested by the model that were prefetched."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def travel_agent_predictor(
+    user_request: str, messages: list[dict], tools_called: list[str]
+) -> list[ToolCall]:
+    """Predict the next tool calls of the advanced travel agent.
+
+    Args:
+        user_request: The user's question
+        messages: The conversation so far
+        tools_called: Names of the tools already called successfully
+
+    Returns:
+        The calls to prefetch (possibly none)
+    """
+    if "get_weather" not in tools_called:
+        match = _DESTINATION_PATTERN.search(user_request)
+        if match is None:
+            return []
+        return [ToolCall("get_weather", match.group(1).strip())]
+    # After the weather, the prompt asks for availability checks; once some
+    # were made the agent usually answers, so stop guessing
+    if "check_availability_activity" not in tools_called:
+        return [
+            ToolCall("check_availability_activity", activity) for activity in ACTIVITIES
+        ]
+    return []
+
+
+def _bind(tool_call: ToolCall, tools: dict) -> Optional[list]:
+    """The bound arguments of a call, or None if it cannot be bound."""
+    try:
+        return compile_binder(tools[tool_call.name]).bind(tool_call.params or "")
+    except (KeyError, ToolArgumentError):
+        return None
+
+
+def _call_key(tool_call: ToolCall, tools: dict) -> Optional[tuple]:
+    """The tool and its bound arguments, or None if the call cannot be bound.
+
+    Binding makes "rome", '{"location": "Rome"}' and "location=rome" the
+    same call, as they are for the tool.
+    """
+    params = _bind(tool_call, tools)
+    if params is None:
+        return None
+    return tool_call.name, normalize_params(params)
+
+
+def _call(tool_name: str, params: list, func: Callable, tool_cache):
+    if tool_cache is not None:
+        return tool_cache.get_or_call(tool_name, params, func)
+    return func(*params)
+
+
+class PrefetchRun:
+    """Prefetched calls of a single agent run (see Prefetcher.new_run)."""
+
+    def __init__(self, prefetcher: "Prefetcher", user_request: str):
+        self.prefetcher = prefetcher
+        self.user_request = user_request
+        self._pending: dict[tuple, Future] = {}
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def start(
+        self,
+        messages: list[dict],
+        tools_called: list[str],
+        tools: dict,
+        tool_cache: Optional[ToolCache] = None,
+    ):
+        """Predict the next calls and start them in the background.
+
+        tool_cache is the plain ToolCache, if any: a run's session log or
+        stall detection must not see the calls the model did not ask for.
+        """
+        predictions = self.prefetcher.predictor(
+            self.user_request, messages, tools_called
+        )
+        for tool_call in predictions:
+            params = _bind(tool_call, tools)
+            if params is None:
+                continue
+            key = (tool_call.name, normalize_params(params))
+            if key in self._pending:
+                continue
+            self._pending[key] = self.prefetcher._submit(
+                tool_call.name, params, tools[tool_call.name], tool_cache
+            )
+            self.prefetched += 1
+
+    def execute(
+        self,
+        tool_calls: list[ToolCall],
+        tools: dict,
+        tool_cache: Optional[ToolCache] = None,
+        record=None,
+    ) -> list[ToolResult]:
+        """Execute the model's tool calls, using prefetched results on a hit.
+
+        Prefetched calls the model did not ask for are discarded.
+
+        Args:
+            tool_calls: The tool calls of the turn
+            tools: Dictionary of available tool functions
+            tool_cache: Serves the calls that were not prefetched
+            record: ToolCache-compatible wrapper (e.g. of the session log)
+                the prefetched results go through once the model asks for
+                them, as if the calls had been made then
+        """
+        results: list[Optional[ToolResult]] = [None] * len(tool_calls)
+        missed = []
+        for index, tool_call in enumerate(tool_calls):
+            params = _bind(tool_call, tools)
+            future = None
+            if params is not None:
+                key = (tool_call.name, normalize_params(params))
+                future = self._pending.pop(key, None)
+            if future is None:
+                missed.append(index)
+            else:
+                # Returns the prefetched value, or raises the prefetched error
+                results[index] = call_tool(
+                    tool_call.name,
+                    params,
+                    lambda *_, future=future: future.result(),
+                    record,
+                )
+        if missed:
+            missed_results = execute_tool_calls(
+                [tool_calls[i] for i in missed], tools, tool_cache
+            )
+            for index, result in zip(missed, missed_results):
+                results[index] = result
+        self.hits += len(tool_calls) - len(missed)
+        self.misses += len(missed)
+        self.discard()
+        return results
+
+    def discard(self):
+        """Drop the predictions that were not used (cancelling those not started)."""
+        for future in self._pending.values():
+            future.cancel()
+        self.wasted += len(self._pending)
+        self._pending.clear()
+
+    def finish(self) -> PrefetchStats:
+        """Discard what is left and add this run's counters to the Prefetcher."""
+        self.discard()
+        stats = PrefetchStats(self.prefetched, self.hits, self.misses, self.wasted)
+        self.prefetcher._add(stats)
+        return stats
+
+
+class Prefetcher:
+    """Starts predicted tool calls while the LLM call is in flight.
+
+    Args:
+        predictor: Function (user_request, messages, tools_called) returning
+            the ToolCalls to prefetch before the next LLM call
+        max_workers: Threads running the prefetched calls; predictions beyond
+            that wait in the queue and are cancelled if not used in time
+    """
+
+    def __init__(
+        self,
+        predictor: Callable[
+            [str, list[dict], list[str]], list[ToolCall]
+        ] = travel_agent_predictor,
+        max_workers: int = 4,
+    ):
+        self.predictor = predictor
+        self._totals = PrefetchStats(0, 0, 0, 0)
+        self._lock = threading.Lock()
+        # Not the shared tool pool: speculative calls must not delay real ones
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="prefetch"
+        )
+
+    def _submit(
+        self,
+        tool_name: str,
+        params: list,
+        func: Callable,
+        tool_cache: Optional[ToolCache],
+    ) -> Future:
+        return self._pool.submit(_call, tool_name, params, func, tool_cache)
+
+    def new_run(self, user_request: str) -> PrefetchRun:
+        """Start tracking a new conversation (one per agent run)."""
+        return PrefetchRun(self, user_request)
+
+    def stats(self) -> PrefetchStats:
+        """Counters summed over all finished runs."""
+        with self._lock:
+            return self._totals
+
+    def _add(self, stats: PrefetchStats):
+        with self._lock:
+            self._totals = PrefetchStats(
+                *(total + value for total, value in zip(self._totals, stats))
+            )
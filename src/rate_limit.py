@@ -0,0 +1,385 @@
+"""
+Rate limiting and retries around litellm.completion.
+
+Running many agents at once quickly hits the provider limits: requests and
+tokens per minute, and overload errors when too many calls are in flight.
+Without retries a single 429 fails a whole agent run.
+
+RateLimitedClient wraps a completion function (litellm by default) and can
+be passed as completion_fn / acompletion_fn to every loop. Shared by all the
+runs of a process, it:
+- waits for two token buckets, one for requests/min and one for tokens/min
+  (the tokens of a call are estimated up front and corrected from
+  response.usage afterwards)
+- limits the calls in flight with AIMD: the limit grows by one per window of
+  successful calls and is halved on every 429/overload response
+- retries throttled and transient errors with full-jitter exponential
+  backoff, honouring Retry-After when the provider sends it
+
+Example:
+    client = RateLimitedClient(requests_per_minute=50, tokens_per_minute=40_000)
+    run_agent(..., completion_fn=client.completion)
+    await run_agent_async(..., acompletion_fn=client.acompletion)
+"""
+
+from typing import Callable, NamedTuple, Optional
+import asyncio
+import random
+import threading
+import time
+
+from history import approximate_tokens
+from utils import default_acompletion_fn, default_completion_fn, message_text
+
+# Provider responses meaning "slow down" (rate limited / overloaded)
+THROTTLE_STATUS_CODES = {429, 503, 529}
+# Errors worth retrying without reducing the concurrency
+TRANSIENT_STATUS_CODES = {408, 500, 502, 504}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of a litellm (or mock_llm) error, if it has one."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait (Retry-After header), if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    Args:
+        rate_per_minute: Tokens added per minute
+        capacity: Maximum burst (default: 6 seconds worth of tokens). Providers
+            count over a sliding minute, so a bucket allowing a full minute of
+            burst on top of its refill would overshoot their limit.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute / 10
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return how long to wait before using them.
+
+        The bucket may go into debt, so callers are served in arrival order
+        and requests larger than the capacity still go through eventually.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount: float):
+        """Give back tokens that were reserved but not used (or take more)."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """Additive-increase / multiplicative-decrease limit on calls in flight.
+
+    Args:
+        initial: Starting limit
+        minimum: The limit never goes below this
+        maximum: The limit never goes above this
+        decrease: Factor applied to the limit on a throttled response
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def _try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def aacquire(self, poll_interval: float = 0.01):
+        # The limit is shared with threads, so poll instead of blocking the loop
+        while not self._try_acquire():
+            await asyncio.sleep(poll_interval)
+
+    def release(self, throttled: Optional[bool] = False):
+        """Free a slot, adapting the limit to the outcome of the call.
+
+        throttled is None for a call that did not complete (cancelled or
+        interrupted), which leaves the limit unchanged.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            elif throttled is not None:
+                # +1 per `limit` successful calls, i.e. about +1 per round-trip
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RateLimitStats(NamedTuple):
+    """Counters for a RateLimitedClient."""
+
+    requests: int
+    retries: int
+    throttled: int
+    failures: int
+    concurrency_limit: float
+    waited: float
+
+
+class RateLimitedClient:
+    """litellm.completion / acompletion with rate limits, AIMD and retries.
+
+    Args:
+        completion_fn: Wrapped sync completion function (default: litellm.completion)
+        acompletion_fn: Wrapped async completion function (default: litellm.acompletion)
+        requests_per_minute: Request rate limit, None for no limit
+        tokens_per_minute: Token rate limit (prompt + completion), None for no limit
+        burst_seconds: How many seconds of each rate can be used at once
+        initial_concurrency: Calls in flight allowed at first
+        max_concurrency: Upper bound for the adaptive concurrency
+        max_retries: Retries of a throttled or failed call before giving up
+        base_delay: Backoff of the first retry in seconds (doubled each time)
+        max_delay: Maximum backoff in seconds
+        expected_completion_tokens: Completion tokens reserved when the call
+            does not set max_tokens
+        seed: Seed of the jitter random generator
+    """
+
+    def __init__(
+        self,
+        completion_fn: Optional[Callable] = None,
+        acompletion_fn: Optional[Callable] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst_seconds: float = 6.0,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 64,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        expected_completion_tokens: int = 512,
+        seed: Optional[int] = None,
+    ):
+        self._completion_fn = completion_fn
+        self._acompletion_fn = acompletion_fn
+        self.requests = self.tokens = None
+        if requests_per_minute:
+            self.requests = TokenBucket(
+                requests_per_minute, requests_per_minute * burst_seconds / 60
+            )
+        if tokens_per_minute:
+            self.tokens = TokenBucket(
+                tokens_per_minute, tokens_per_minute * burst_seconds / 60
+            )
+        self.concurrency = AdaptiveConcurrency(
+            initial=initial_concurrency, maximum=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expected_completion_tokens = expected_completion_tokens
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = RateLimitStats(0, 0, 0, 0, float(initial_concurrency), 0.0)
+
+    @property
+    def completion_fn(self) -> Callable:
+        if self._completion_fn is None:
+            self._completion_fn = default_completion_fn()
+        return self._completion_fn
+
+    @property
+    def acompletion_fn(self) -> Callable:
+        if self._acompletion_fn is None:
+            self._acompletion_fn = default_acompletion_fn()
+        return self._acompletion_fn
+
+    def _count(self, **changes):
+        with self._lock:
+            stats = self._stats
+            self._stats = stats._replace(
+                **{
+                    name: getattr(stats, name) + value
+                    for name, value in changes.items()
+                }
+            )
+
+    def stats(self) -> RateLimitStats:
+        with self._lock:
+            return self._stats._replace(concurrency_limit=self.concurrency.limit)
+
+    def _reserve(self, kwargs: dict) -> tuple[float, int]:
+        """Take from the buckets; return (seconds to wait, tokens reserved)."""
+        estimate = sum(
+            approximate_tokens(message_text(m)) for m in kwargs.get("messages", [])
+        ) + (kwargs.get("max_tokens") or self.expected_completion_tokens)
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimate))
+        if wait:
+            self._count(waited=wait)
+        return wait, estimate
+
+    def _settle(self, response, estimate: int):
+        """Correct the token bucket with the usage the provider reported."""
+        usage = getattr(response, "usage", None)
+        if self.tokens is None or usage is None:
+            return
+        used = getattr(usage, "total_tokens", None) or (
+            (getattr(usage, "prompt_tokens", 0) or 0)
+            + (getattr(usage, "completion_tokens", 0) or 0)
+        )
+        self.tokens.refund(estimate - used)
+
+    def _failed(self, error: Exception, attempt: int, estimate: int) -> Optional[float]:
+        """Account for a failed call (its slot is released by the caller).
+
+        Returns the seconds to wait before retrying, or None to give up.
+        """
+        code = _status_code(error)
+        throttled = code in THROTTLE_STATUS_CODES
+        if self.tokens is not None:
+            # A rejected call did not use its tokens
+            self.tokens.refund(estimate)
+        if throttled:
+            self._count(throttled=1)
+
+        transient = throttled or code in TRANSIENT_STATUS_CODES
+        transient = transient or isinstance(error, (TimeoutError, ConnectionError))
+        if not transient or attempt >= self.max_retries:
+            self._count(failures=1)
+            return None
+        self._count(retries=1)
+
+        # Full jitter spreads the retries of concurrent runs apart
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def completion(self, **kwargs):
+        """Drop-in for litellm.completion (streams hold no slot once returned)."""
+        for attempt in range(self.max_retries + 1):
+            wait, estimate = self._reserve(kwargs)
+            if wait:
+                time.sleep(wait)
+            self.concurrency.acquire()
+            self._count(requests=1)
+            # None until the call completes: an interrupted call frees its slot
+            # without changing the limit
+            throttled = None
+            try:
+                response = self.completion_fn(**kwargs)
+                throttled = False
+            except Exception as e:
+                throttled = _status_code(e) in THROTTLE_STATUS_CODES
+                delay = self._failed(e, attempt, estimate)
+                if delay is None:
+                    raise
+            else:
+                self._settle(response, estimate)
+                return response
+            finally:
+                self.concurrency.release(throttled)
+            time.sleep(delay)
+
+    async def acompletion(self, **kwargs):
+        """Drop-in for litellm.acompletion."""
+        for attempt in range(self.max_retries + 1):
+            wait, estimate = self._reserve(kwargs)
+            if wait:
+                await asyncio.sleep(wait)
+            await self.concurrency.aacquire()
+            self._count(requests=1)
+            throttled = None
+            try:
+                response = await self.acompletion_fn(**kwargs)
+                throttled = False
+            except Exception as e:
+                throttled = _status_code(e) in THROTTLE_STATUS_CODES
+                delay = self._failed(e, attempt, estimate)
+                if delay is None:
+                    raise
+            else:
+                self._settle(response, estimate)
+                return response
+            finally:
+                # Also on CancelledError, or the slot would be lost for good
+                self.concurrency.release(throttled)
+            await asyncio.sleep(delay)
+
+
+def add_rate_limit_arguments(parser):
+    """Add the --rpm / --tpm / --max-retries options to an argparse parser."""
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="Requests per minute allowed to the LLM provider (default: no limit)",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=None,
+        help="Tokens per minute allowed to the LLM provider (default: no limit)",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=None,
+        help="Retry throttled LLM calls up to this many times (default: 5 when "
+        "--rpm or --tpm is set, otherwise no rate limiting layer)",
+    )
+
+
+def rate_limited_from_args(
+    args,
+    completion_fn: Optional[Callable] = None,
+    acompletion_fn: Optional[Callable] = None,
+) -> Optional[RateLimitedClient]:
+    """Build the RateLimitedClient selected by add_rate_limit_arguments' options."""
+    if args.rpm is None and args.tpm is None and args.max_retries is None:
+        return None
+    return RateLimitedClient(
+        completion_fn,
+        acompletion_fn,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=5 if args.max_retries is None else args.max_retries,
+    )
@@ -0,0 +1,196 @@
+"""
+Model cascade routing for the agent loops.
+
+Most iterations only emit a short <tool> call, which a small, fast model
+handles as well as a strong one. A ModelRouter sends those tool-selection
+turns to fast_model and keeps the strong model (the loop's `model`) for the
+turns that need it:
+- the final answer: once all the `answer_tools` have been called
+  successfully, the next turn is expected to be the answer and goes to the
+  strong model directly
+- a fast turn that answers anyway, or that cannot be parsed (no tool call
+  and no answer), is rejected and redone by the strong model; after
+  `max_fast_failures` unparsable turns the rest of the run uses the strong
+  model
+
+Rejected turns are only redone when not streaming (a streamed answer has
+already been passed on). Each run reports its fast / strong calls and
+rejections.
+
+Example:
+    router = ModelRouter("claude-haiku-4-5-20251001",
+                         answer_tools={"get_weather", "check_availability_activity"})
+    run_agent(..., model="claude-sonnet-4-5-20250929", router=router)
+"""
+
+from typing import NamedTuple, Optional
+import threading
+
+from utils import parse_response
+
+
+class RoutingStats(NamedTuple):
+    """LLM calls of one or more runs, by model tier."""
+
+    fast_calls: int
+    strong_calls: int
+    rejected: int  # fast turns redone (or, when streaming, flagged) as wrong
+
+    @property
+    def fast_share(self) -> float:
+        total = self.fast_calls + self.strong_calls
+        return self.fast_calls / total if total else 0.0
+
+
+class RouteRun:
+    """Routing state of a single agent run (see ModelRouter.new_run).
+
+    Args:
+        router: The shared ModelRouter
+        strong_model: The run's main model
+        redo: Whether rejected fast turns are redone by the strong model
+        tools_called: The run's successful tool calls, kept up to date by the loop
+    """
+
+    def __init__(
+        self,
+        router: "ModelRouter",
+        strong_model: str,
+        redo: bool = True,
+        tools_called: Optional[list[str]] = None,
+    ):
+        self.router = router
+        self.strong_model = strong_model
+        self.tools_called = tools_called if tools_called is not None else []
+        self.redo = redo
+        self.fast_calls = 0
+        self.strong_calls = 0
+        self.rejected = 0
+        self.failures = 0
+        self.escalated = False
+
+    def model_for(self) -> str:
+        """The model for the next turn of the run."""
+        router = self.router
+        if self.escalated:
+            return self.strong_model
+        if router.answer_tools and router.answer_tools <= set(self.tools_called):
+            return self.strong_model
+        return router.fast_model
+
+    def check(self, model: str, assistant_message: str) -> bool:
+        """Count a call and tell whether its turn must be redone by the strong model."""
+        if model != self.router.fast_model:
+            self.strong_calls += 1
+            return False
+        self.fast_calls += 1
+
+        parsed = parse_response(assistant_message)
+        if parsed.answer:
+            if self.router.fast_answers:
+                return False
+        elif not parsed.tool_calls:
+            # Unparsable turn: stop trusting the fast model after a few of them
+            self.failures += 1
+            if self.failures >= self.router.max_fast_failures:
+                self.escalated = True
+        else:
+            return False
+        self.rejected += 1
+        return self.redo
+
+    def finish(self) -> RoutingStats:
+        """Close the run and add its counters to the router's totals."""
+        stats = RoutingStats(self.fast_calls, self.strong_calls, self.rejected)
+        self.router._add(stats)
+        return stats
+
+    def report(self) -> str:
+        return (
+            f"[Routing: {self.fast_calls} fast ({self.router.fast_model}), "
+            f"{self.strong_calls} strong ({self.strong_model}) calls, "
+            f"{self.rejected} fast turns rejected]"
+        )
+
+    def attributes(self) -> dict:
+        """Counters to attach to the run's trace."""
+        return {
+            "routing_fast_calls": self.fast_calls,
+            "routing_strong_calls": self.strong_calls,
+            "routing_rejected": self.rejected,
+        }
+
+
+class ModelRouter:
+    """Sends tool-selection turns to a fast model, answers to the strong one.
+
+    Args:
+        fast_model: Cheap, low-latency model for the tool-selection turns
+        answer_tools: Tools that must all have succeeded before the answer is
+            expected (the next turn then goes to the strong model)
+        max_fast_failures: Unparsable fast turns after which a run only uses
+            the strong model
+        fast_answers: Accept final answers from the fast model instead of
+            redoing them with the strong model
+    """
+
+    def __init__(
+        self,
+        fast_model: str,
+        answer_tools: Optional[set[str]] = None,
+        max_fast_failures: int = 2,
+        fast_answers: bool = False,
+    ):
+        self.fast_model = fast_model
+        self.answer_tools = set(answer_tools or ())
+        self.max_fast_failures = max_fast_failures
+        self.fast_answers = fast_answers
+        self._totals = RoutingStats(0, 0, 0)
+        self._lock = threading.Lock()
+
+    def new_run(
+        self,
+        strong_model: str,
+        redo: bool = True,
+        tools_called: Optional[list[str]] = None,
+    ) -> RouteRun:
+        """Start routing a new conversation (one per agent run)."""
+        return RouteRun(self, strong_model, redo, tools_called)
+
+    def stats(self) -> RoutingStats:
+        """Counters summed over all finished runs."""
+        with self._lock:
+            return self._totals
+
+    def _add(self, stats: RoutingStats):
+        with self._lock:
+            self._totals = RoutingStats(
+                *(total + value for total, value in zip(self._totals, stats))
+            )
+
+
+def add_routing_arguments(parser):
+    """Add the --fast-model / --max-fast-failures options to an argparse parser."""
+    parser.add_argument(
+        "--fast-model",
+        type=str,
+        default=None,
+        help="Cheap model for the tool-selection turns, e.g. "
+        "claude-haiku-4-5-20251001 (default: one model for every turn)",
+    )
+    parser.add_argument(
+        "--max-fast-failures",
+        type=int,
+        default=2,
+        help="Unparsable fast turns after which a run only uses the main model "
+        "(default: 2)",
+    )
+
+
+def router_from_args(args, answer_tools: set[str]) -> Optional[ModelRouter]:
+    """Build the ModelRouter selected by add_routing_arguments' options, if any."""
+    if args.fast_model is None:
+        return None
+    return ModelRouter(
+        args.fast_model, answer_tools, max_fast_failures=args.max_fast_failures
+    )
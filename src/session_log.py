@@ -0,0 +1,402 @@
+"""
+Append-only session log for checkpointed, resumable agent runs.
+
+When a process crashes in the middle of a run everything is lost, and
+running the question again repeats every paid LLM call.
+
+With a SessionLog, every LLM response and every tool result of a run is
+appended, as soon as it is complete, to <directory>/<run_id>.jsonl:
+
+    {"type": "start", "run_id": "...", "user_request": "...", "created": ...}
+    {"type": "llm", "key": "<hash of model input>", "model": "...", "content": "...", "usage": {...}, "finish_reason": "stop"}
+    {"type": "tool", "tool": "get_weather", "params": ["honolulu"], "result": "..."}
+    {"type": "finish", "answer": "..."}
+
+The conversation itself is a pure function of those events. Resuming a run
+(same run_id) therefore re-runs the loop with the logged LLM responses and
+tool results served from the log, in order, which rebuilds the messages and
+the loop state up to the last completed step. Only the calls after that
+step reach the model and the tools. A logged LLM response is only replayed
+for the same input: if the conversation diverges (e.g. the prompt changed),
+a SessionMismatchError is raised instead of silently mixing two runs.
+
+The log is read once, line by line, when a run is opened. A line cut short
+by a crash is dropped. Each event is flushed when written, and optionally
+fsync'ed.
+
+Example:
+    session = SessionLog(".sessions")
+    run_agent(..., session=session)                 # logs as run <id>
+    run_agent(..., session=session, run_id="<id>")  # resumes it
+"""
+
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional
+import json
+import os
+import threading
+import time
+import uuid
+
+from completion_cache import cache_key, to_chunk, to_response
+from tool_cache import normalize_params
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class SessionMismatchError(RuntimeError):
+    """A resumed run asked for a completion that differs from the logged one."""
+
+
+class SessionInfo(NamedTuple):
+    """A run found in a session log directory."""
+
+    run_id: str
+    user_request: str
+    finished: bool
+
+
+def _usage_dict(usage) -> dict:
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
+
+
+def _jsonable(value: Any) -> Any:
+    # Tool results end up formatted in a message, so their str() is enough
+    # for those that are not plain JSON
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return value
+
+
+def _read_events(path: Path) -> list[dict]:
+    """Read a run log, dropping (and truncating away) a torn last line."""
+    events = []
+    with open(path, "r+b") as f:
+        valid_size = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # written partially before a crash
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            valid_size += len(line)
+        f.truncate(valid_size)
+    return events
+
+
+def _last_line(f) -> bytes:
+    """Last line of a binary file, read backwards from the end."""
+    size = f.seek(0, os.SEEK_END)
+    block = 4096
+    while True:
+        start = max(0, size - block)
+        f.seek(start)
+        data = f.read(size - start).rstrip(b"\n")
+        if b"\n" in data or start == 0:
+            return data.rsplit(b"\n", 1)[-1]
+        block *= 2
+
+
+class _SessionToolCache:
+    """ToolCache-compatible wrapper logging and replaying tool results."""
+
+    def __init__(self, run: "SessionRun", tool_cache=None):
+        self.run = run
+        self.tool_cache = tool_cache
+
+    def get_or_call(self, tool_name: str, params: list, func: Callable) -> Any:
+        run = self.run
+        # Keyed like the logged calls, whose parameters went through JSON
+        key = (tool_name, normalize_params([_jsonable(p) for p in params]))
+        with run._lock:
+            logged = run._tool_results.get(key)
+            if logged:
+                run.replayed_tool_calls += 1
+                return logged.popleft()
+        if self.tool_cache is not None:
+            value = self.tool_cache.get_or_call(tool_name, params, func)
+        else:
+            value = func(*params)
+        run._append(
+            {
+                "type": "tool",
+                "tool": tool_name,
+                "params": [_jsonable(p) for p in params],
+                "result": _jsonable(value),
+            }
+        )
+        return value
+
+
+class SessionRun:
+    """Log of a single agent run (see SessionLog.open_run)."""
+
+    def __init__(self, log: "SessionLog", run_id: str, events: list[dict]):
+        self.log = log
+        self.run_id = run_id
+        self.path = log.path_for(run_id)
+        self._lock = threading.Lock()
+        # Responses and results of the completed steps, replayed in order
+        self._llm_events = deque(e for e in events if e["type"] == "llm")
+        self._tool_results: dict[tuple, deque] = defaultdict(deque)
+        for event in events:
+            if event["type"] == "tool":
+                key = (event["tool"], normalize_params(event["params"]))
+                self._tool_results[key].append(event["result"])
+        self.resumed = bool(events)
+        self.finished = any(e["type"] == "finish" for e in events)
+        self.replayed_llm_calls = 0
+        self.replayed_tool_calls = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _append(self, event: dict):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.log.fsync:
+                os.fsync(self._file.fileno())
+
+    def _replay(self, key: str) -> Optional[dict]:
+        """The logged response for this completion, if it was already made."""
+        with self._lock:
+            if not self._llm_events:
+                return None
+            event = self._llm_events.popleft()
+            self.replayed_llm_calls += 1
+        if event["key"] != key:
+            raise SessionMismatchError(
+                f"Run {self.run_id} diverges from its log at LLM call "
+                f"{self.replayed_llm_calls}; start a new run instead of resuming it"
+            )
+        return event
+
+    def _record(
+        self,
+        key: str,
+        model: str,
+        content: str,
+        usage=None,
+        finish_reason: Optional[str] = None,
+    ):
+        self._append(
+            {
+                "type": "llm",
+                "key": key,
+                "model": model,
+                "content": content,
+                "usage": _usage_dict(usage),
+                # Replayed with the response: a turn cut by max_tokens is repaired
+                # differently, and the rest of the run depends on it
+                "finish_reason": finish_reason,
+            }
+        )
+
+    def wrap_completion(self, completion_fn: Callable) -> Callable:
+        """Wrap a completion function so its calls are logged and replayed."""
+
+        def completion(model: str, messages: list, **kwargs):
+            # The model is left out of the key: routing and budget downgrades
+            # may pick another model for the same step
+            key = cache_key("", messages, **kwargs)
+            event = self._replay(key)
+            if event is not None:
+                if kwargs.get("stream"):
+                    chunk = to_chunk(
+                        event["content"], event.get("finish_reason"), cached=True
+                    )
+                    return iter([chunk])
+                return to_response(event)
+            response = completion_fn(model=model, messages=messages, **kwargs)
+            if kwargs.get("stream"):
+                return self._record_stream(key, model, response)
+            choice = response.choices[0]
+            self._record(
+                key,
+                model,
+                choice.message.content,
+                response.usage,
+                getattr(choice, "finish_reason", None),
+            )
+            return response
+
+        return completion
+
+    def wrap_acompletion(self, acompletion_fn: Callable) -> Callable:
+        """Async version of wrap_completion."""
+
+        async def acompletion(model: str, messages: list, **kwargs):
+            key = cache_key("", messages, **kwargs)
+            event = self._replay(key)
+            if event is not None:
+                if kwargs.get("stream"):
+                    return self._replay_astream(event)
+                return to_response(event)
+            response = await acompletion_fn(model=model, messages=messages, **kwargs)
+            if kwargs.get("stream"):
+                return self._record_astream(key, model, response)
+            choice = response.choices[0]
+            self._record(
+                key,
+                model,
+                choice.message.content,
+                response.usage,
+                getattr(choice, "finish_reason", None),
+            )
+            return response
+
+        return acompletion
+
+    def wrap_tool_cache(self, tool_cache=None) -> _SessionToolCache:
+        """Wrap the run's tool cache (if any) so tool results are logged and replayed."""
+        return _SessionToolCache(self, tool_cache)
+
+    # Streams are logged once they have been fully consumed
+    def _record_stream(self, key: str, model: str, stream):
+        parts, finish_reason = [], None
+        for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        self._record(key, model, "".join(parts), finish_reason=finish_reason)
+
+    async def _record_astream(self, key: str, model: str, stream):
+        parts, finish_reason = [], None
+        async for chunk in stream:
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or "")
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            yield chunk
+        self._record(key, model, "".join(parts), finish_reason=finish_reason)
+
+    async def _replay_astream(self, event: dict):
+        yield to_chunk(event["content"], event.get("finish_reason"), cached=True)
+
+    def finish(self, answer: str):
+        """Log the final answer (once) and close the log file."""
+        if not self.finished:
+            self._append({"type": "finish", "answer": answer, "finished": time.time()})
+            self.finished = True
+        self.close()
+
+    def close(self):
+        """Close the log file without ending the run (e.g. after an error)."""
+        with self._lock:
+            self._file.close()
+
+    def report(self) -> str:
+        return (
+            f"[Session {self.run_id}: replayed {self.replayed_llm_calls} LLM calls "
+            f"and {self.replayed_tool_calls} tool calls from {self.path}]"
+        )
+
+    def attributes(self) -> dict:
+        """Counters to attach to the run's trace."""
+        return {
+            "session_resumed": self.resumed,
+            "session_replayed_llm_calls": self.replayed_llm_calls,
+            "session_replayed_tool_calls": self.replayed_tool_calls,
+        }
+
+
+class SessionLog:
+    """Directory of append-only run logs, one JSONL file per run.
+
+    Args:
+        directory: Where the run logs are written
+        fsync: fsync every event (survives power loss, at a few ms per event)
+    """
+
+    def __init__(self, directory: str = ".sessions", fsync: bool = False):
+        self.directory = Path(directory)
+        self.fsync = fsync
+
+    def path_for(self, run_id: str) -> Path:
+        return self.directory / f"{run_id}.jsonl"
+
+    def open_run(self, run_id: Optional[str], user_request: str) -> SessionRun:
+        """Start logging a new run, or resume run_id if it has a log.
+
+        Raises:
+            SessionMismatchError: If run_id's log is for a different request
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        run_id = run_id or new_run_id()
+        path = self.path_for(run_id)
+        events = _read_events(path) if path.exists() else []
+        if events and events[0].get("user_request") != user_request:
+            raise SessionMismatchError(
+                f"Run {run_id} was started for a different request: "
+                f"{events[0].get('user_request')!r}"
+            )
+        run = SessionRun(self, run_id, events)
+        if not events:
+            run._append(
+                {
+                    "type": "start",
+                    "run_id": run_id,
+                    "user_request": user_request,
+                    "created": time.time(),
+                }
+            )
+        return run
+
+    def user_request(self, run_id: str) -> str:
+        """The request a logged run was started for (to resume it)."""
+        with open(self.path_for(run_id), encoding="utf-8") as f:
+            return json.loads(f.readline())["user_request"]
+
+    def runs(self) -> list[SessionInfo]:
+        """The logged runs, oldest first (reads the first and last line of each)."""
+        infos = []
+        paths = sorted(self.directory.glob("*.jsonl"), key=lambda p: p.stat().st_mtime)
+        for path in paths:
+            with open(path, "rb") as f:
+                first, last = f.readline(), _last_line(f)
+            try:
+                user_request = json.loads(first).get("user_request", "")
+            except json.JSONDecodeError:
+                continue
+            try:
+                finished = json.loads(last).get("type") == "finish"
+            except json.JSONDecodeError:
+                finished = False
+            infos.append(SessionInfo(path.stem, user_request, finished))
+        return infos
+
+
+def add_session_arguments(parser):
+    """Add the --session-dir / --resume options to an argparse parser."""
+    parser.add_argument(
+        "--session-dir",
+        type=str,
+        default=None,
+        help="Log every LLM call and tool result of the run to this directory, "
+        "so it can be resumed (default: no log, .sessions with --resume)",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        metavar="RUN_ID",
+        help="Resume a logged run (with --session-dir), without repeating its "
+        "completed LLM and tool calls",
+    )
+
+
+def session_from_args(args) -> Optional[SessionLog]:
+    """Build the SessionLog selected by add_session_arguments' options, if any."""
+    if args.session_dir is None and args.resume is None:
+        return None
+    return SessionLog(args.session_dir or ".sessions")
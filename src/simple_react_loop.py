@@ -14,10 +14,58 @@ This is a pedagogical example to teach the fundamentals of agent loops without
 complex abstractions.
 """
 
-from utils import function_to_tool, add_tools_to_prompt, parse_response
+from typing import Callable, Optional
+
+from utils import default_acompletion_fn, default_completion_fn, parse_response
+from agent_run import AgentRun
+from history import HistoryManager
 from prompts import SYSTEM_PROMPT
 from tools import get_weather
-import litellm
+
+
+def _handle_turn(
+    run: AgentRun,
+    assistant_message: str,
+    tool_results: Optional[list] = None,
+) -> Optional[str]:
+    """Process one assistant message.
+
+    Returns the final answer if the agent produced one, otherwise appends the
+    follow-up message (tool result or correction) to run.messages and returns
+    None. tool_results holds the results of tool calls already run while
+    streaming. Logs and spans go to run.trace.
+    """
+    messages, trace = run.messages, run.trace
+    # Add assistant response to messages
+    messages.append({"role": "assistant", "content": assistant_message})
+
+    # Parse response using utility function
+    with trace.span("parse"):
+        parsed = parse_response(assistant_message)
+
+    # Check if we have a final answer - if so we return early
+    if parsed.answer:
+        trace.log(parsed.answer)
+        return parsed.answer
+
+    # Check if we have tool calls - several can be emitted in one message
+    if parsed.tool_calls:
+        # Execute tools concurrently (unless they already ran while streaming)
+        # and send all results back in one message
+        results = run.run_tools(parsed.tool_calls, tool_results)
+        messages.append(
+            {"role": "user", "content": "\n".join(r.content for r in results)}
+        )
+    else:
+        # No answer or tool found, prompt for clarification
+        messages.append(
+            {
+                "role": "user",
+                "content": "Please provide either an <answer> or a <tool> call.",
+            }
+        )
+
+    return None
 
 
 def run_agent(
@@ -26,89 +74,50 @@ def run_agent(
     tools: dict,
     model: str,
     max_iterations: int = 10,
+    completion_fn: Optional[Callable] = None,
+    **options,
 ):
-    # Convert tools to ToolInfo namedtuples
-    tool_infos = [function_to_tool(tool_func) for tool_func in tools.values()]
-
-    # Build full system prompt with tools
-    full_system_prompt = add_tools_to_prompt(system_prompt, tool_infos)
-
-    # Initialize conversation context
-    messages = [
-        {"role": "system", "content": full_system_prompt},
-        {"role": "user", "content": user_request},
-    ]
+    """Run the agent until it answers or max_iterations is reached.
 
-    # Main agent loop
-    for iteration in range(max_iterations):
-        # Call LLM
-        response = litellm.completion(model=model, messages=messages)
-        assistant_message = response.choices[0].message.content
+    options are the optional features of agent_run.AgentRun (stream,
+    on_answer, tool_cache, history, tracer, budget, router, session, ...).
+    """
+    # Use litellm unless a different backend (e.g. mock_llm.MockLLM) is given
+    completion_fn = completion_fn or default_completion_fn()
+    run = AgentRun(system_prompt, user_request, tools, model, max_iterations, **options)
+    return run.run(completion_fn, _handle_turn)
 
-        print(f"\n--- Iteration {iteration + 1} ---")
-        print(f"Agent: {assistant_message}")
 
-        # Add assistant response to messages
-        messages.append({"role": "assistant", "content": assistant_message})
-
-        # Parse response using utility function
-        parsed = parse_response(assistant_message)
+async def run_agent_async(
+    system_prompt: str,
+    user_request: str,
+    tools: dict,
+    model: str,
+    max_iterations: int = 10,
+    acompletion_fn: Optional[Callable] = None,
+    **options,
+):
+    """Asyncio version of run_agent, built on litellm.acompletion.
 
-        # Check if we have a final answer - if so we return early
-        if parsed.answer:
-            print(parsed.answer)
-            return parsed.answer
-
-        # Check if we have a tool call
-        if parsed.tool:
-            tool_name = parsed.tool
-            params_str = parsed.params or ""
-
-            # Check if tool exists
-            if tool_name in tools:
-                # Parse parameters (simple comma-separated for now)
-                params = (
-                    [p.strip() for p in params_str.split(",")] if params_str else []
-                )
-                # Execute tool
-                try:
-                    tool_result = tools[tool_name](*params)
-                    print(f"Tool Result: {tool_result}")
-                    # Add tool result to messages
-                    messages.append(
-                        {
-                            "role": "user",
-                            "content": f"Tool '{tool_name}' returned: {tool_result}",
-                        }
-                    )
-                except Exception as e:
-                    error_msg = f"Error executing tool '{tool_name}': {str(e)}"
-                    print(error_msg)
-                    messages.append({"role": "user", "content": error_msg})
-            else:
-                error_msg = f"Tool '{tool_name}' not found. Available tools: {', '.join(tools.keys())}"
-                print(error_msg)
-                messages.append({"role": "user", "content": error_msg})
-        else:
-            # No answer or tool found, prompt for clarification
-            messages.append(
-                {
-                    "role": "user",
-                    "content": "Please provide either an <answer> or a <tool> call.",
-                }
-            )
-
-    print("\n\n!!! Maximum iterations reached without final answer !!!\n\n")
-
-    return "No answer could be found"
+    The LLM call is awaited and tools run in a worker thread, so many
+    conversations can share one event loop (see concurrent_runner.py).
+    """
+    acompletion_fn = acompletion_fn or default_acompletion_fn()
+    run = AgentRun(system_prompt, user_request, tools, model, max_iterations, **options)
+    return await run.arun(acompletion_fn, _handle_turn)
 
 
 if __name__ == "__main__":
     import argparse
-    from dotenv import load_dotenv
+    from completion_cache import CompletionCache, add_cache_arguments
+    from tracing import add_tracing_arguments, tracer_from_args
+    from budget import add_budget_arguments, budget_from_args
+    from routing import add_routing_arguments, router_from_args
+    from generation import add_generation_arguments, generation_from_args
+    from stall import add_stall_arguments, stall_monitor_from_args
+    from session_log import add_session_arguments, new_run_id, session_from_args
+    from tool_executor import add_tool_executor_arguments, tool_executor_from_args
 
-    # Load environment variables
-    load_dotenv()
     # Parse command line arguments
     parser = argparse.ArgumentParser(
         description="Simple ReAct agent for travel recommendations"
@@ -126,10 +135,52 @@ if __name__ == "__main__":
         default=10,
         help="Maximum number of agent iterations (default: 10)",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the LLM output, starting tools before generation ends",
+    )
+    parser.add_argument(
+        "--history-budget",
+        type=int,
+        default=None,
+        help="Token budget above which older turns are compacted (default: off)",
+    )
+    add_cache_arguments(parser)
+    add_tracing_arguments(parser)
+    add_budget_arguments(parser)
+    add_routing_arguments(parser)
+    add_generation_arguments(parser)
+    add_stall_arguments(parser)
+    add_session_arguments(parser)
+    add_tool_executor_arguments(parser)
     args = parser.parse_args()
 
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    # Optionally record or replay completions from the on-disk cache
+    completion_fn = None
+    if args.llm_cache:
+        completion_fn = CompletionCache(args.llm_cache_dir, args.llm_cache).completion
+
     # Define available tools
     tools = {"get_weather": get_weather}
+    # Optionally run the tools on worker pools with a timeout
+    tool_executor = tool_executor_from_args(args, tools)
+    if tool_executor is not None:
+        tools = tool_executor.wrap(tools)
+
+    # Optionally log the run, so that it can be resumed after a crash
+    session = session_from_args(args)
+    run_id = None
+    if session is not None:
+        run_id = args.resume or new_run_id()
+        if args.resume:
+            args.question = session.user_request(args.resume)
+        print(f"=== Session run {run_id} (resume with --resume {run_id}) ===")
 
     # Run the agent
     print(f"\n=== Question: {args.question}")
@@ -138,7 +189,21 @@ if __name__ == "__main__":
         user_request=args.question,
         tools=tools,
         model="claude-sonnet-4-5-20250929",
+        completion_fn=completion_fn,
+        tracer=tracer_from_args(args),
+        budget=budget_from_args(args),
+        router=router_from_args(args, answer_tools={"get_weather"}),
+        generation=generation_from_args(args, answer_tools={"get_weather"}),
+        stall=stall_monitor_from_args(args),
+        session=session,
+        run_id=run_id,
+        history=HistoryManager(max_tokens=args.history_budget)
+        if args.history_budget
+        else None,
         max_iterations=args.max_iterations,
+        stream=args.stream,
+        on_answer=lambda text: print(text, end="", flush=True),
     )
     # Print out what we got:
     print("\n=== Final Answer ===")
+    print(result)
@@ -0,0 +1,307 @@
+"""
+Loop and stall detection for the XML-tag agent loops.
+
+A confused model can spend the rest of a run going in circles: calling the
+same tool with the same parameters again and again, repeating its reasoning
+word for word, or answering every correction ("Please provide your
+reasoning...") with another malformed turn. Each of those turns is a full
+LLM call, until max_iterations runs out and the run ends without an answer.
+
+A StallMonitor watches the trajectory of every run and escalates while a
+run makes no progress:
+1. A repeated tool call is served from the results the run already has,
+   without calling the tool again (whatever the ToolCache and its TTLs)
+2. After `force_after` stalled turns in a row, a forcing prompt is added to
+   the next message: it points out the repetition and asks for the answer
+   now, or for a tool that was not called yet
+3. After `abort_after` stalled turns in a row, the run stops early without
+   an answer
+
+A turn makes progress if it calls a tool with parameters not seen in the run
+yet; it stalls if it only repeats tool calls, or has no tool call nor answer
+(a format error, or the same reasoning as an earlier turn).
+
+Each run reports the iterations and tokens saved: when it is aborted, or
+answers after a forcing prompt, the LLM calls left until max_iterations,
+each estimated at the size of the last prompt. bench_stall.py compares
+these estimates with the calls and tokens actually saved on stuck mock agents.
+
+Example:
+    monitor = StallMonitor(force_after=2, abort_after=4)
+    run_agent(..., stall=monitor)
+    print(monitor.stats())
+"""
+
+from typing import Any, Callable, NamedTuple, Optional
+import threading
+
+from history import approximate_tokens
+from tool_cache import normalize_params
+from utils import message_text, parse_response
+
+REPEATED_TOOL_CALL = "repeated tool call"
+UNCHANGED_REASONING = "unchanged reasoning"
+FORMAT_ERROR = "format error"
+
+FORCE_PROMPTS = {
+    REPEATED_TOOL_CALL: "You already made these exact tool calls, their results "
+    "are above and will not change.",
+    UNCHANGED_REASONING: "You are repeating the same reasoning without acting on it.",
+    FORMAT_ERROR: "Your last messages had neither a <tool> call nor an <answer>.",
+}
+
+
+class StallStats(NamedTuple):
+    """Stalls of one or more runs, and what the monitor saved."""
+
+    stalled_turns: int
+    cached_calls: int  # repeated tool calls served from the run's results
+    forced: int  # forcing prompts added
+    aborted: int  # runs stopped early
+    recovered: int  # runs that answered after a forcing prompt
+    iterations_saved: int
+    tokens_saved: int
+
+
+class _StallToolCache:
+    """Serves the repeated tool calls of a run from its earlier results.
+
+    Has the interface of ToolCache (get_or_call), and calls the run's own
+    tool cache (if any) for the calls it has not seen.
+    """
+
+    def __init__(self, run: "StallRun", tool_cache=None):
+        self.run = run
+        self.tool_cache = tool_cache
+
+    def get_or_call(self, tool_name: str, params: list, func: Callable) -> Any:
+        key = (tool_name, normalize_params(params))
+        with self.run._lock:
+            if key in self.run._results:
+                self.run.cached_calls += 1
+                return self.run._results[key]
+        if self.tool_cache is not None:
+            value = self.tool_cache.get_or_call(tool_name, params, func)
+        else:
+            value = func(*params)
+        # Only successful results are kept, like ToolCache
+        with self.run._lock:
+            self.run._results[key] = value
+        return value
+
+
+class StallRun:
+    """Trajectory of a single agent run (see StallMonitor.new_run)."""
+
+    def __init__(
+        self,
+        monitor: "StallMonitor",
+        max_iterations: int,
+        tools: dict,
+        tools_called: Optional[list[str]] = None,
+    ):
+        self.monitor = monitor
+        self.max_iterations = max_iterations
+        self.tool_names = list(tools)
+        # The run's successful tool calls, kept up to date by the loop
+        self.tools_called = tools_called if tools_called is not None else []
+        self._lock = threading.Lock()
+        # Tool results of the run, by tool and normalized parameters
+        self._results: dict[tuple, Any] = {}
+        # Tool calls and reasoning seen so far, normalized
+        self._calls: set[tuple[str, str]] = set()
+        self._reasoning: set[str] = set()
+        self.turns = 0
+        self.stalled = 0  # stalled turns in a row
+        self.stalled_turns: dict[str, int] = {}
+        self.cached_calls = 0
+        self.forced = 0
+        self.reason: Optional[str] = None  # why the run was aborted
+        self.iterations_saved = 0
+        self.tokens_saved = 0
+        self._output_tokens = 0
+
+    def wrap_tool_cache(self, tool_cache=None) -> _StallToolCache:
+        """Wrap the run's tool cache (if any) so repeated calls are served from the run."""
+        return _StallToolCache(self, tool_cache)
+
+    def classify(self, assistant_message: str) -> Optional[str]:
+        """Why a turn (without an answer) stalls, or None if it makes progress."""
+        parsed = parse_response(assistant_message)
+        reasoning = " ".join((parsed.reasoning or "").split()).casefold()
+        repeated_reasoning = bool(reasoning) and reasoning in self._reasoning
+        if reasoning:
+            self._reasoning.add(reasoning)
+        if parsed.tool_calls:
+            calls = {
+                (call.name, " ".join((call.params or "").split()).casefold())
+                for call in parsed.tool_calls
+            }
+            new_calls = calls - self._calls
+            self._calls |= calls
+            return None if new_calls else REPEATED_TOOL_CALL
+        if parsed.answer:
+            return None
+        return UNCHANGED_REASONING if repeated_reasoning else FORMAT_ERROR
+
+    def _estimate_saving(self, messages: list[dict], iterations_left: int):
+        # Each call left would have sent at least the current prompt
+        prompt_tokens = sum(approximate_tokens(message_text(m)) for m in messages)
+        output_tokens = self._output_tokens // max(1, self.turns)
+        self.iterations_saved = iterations_left
+        self.tokens_saved = iterations_left * (prompt_tokens + output_tokens)
+
+    def observe(self, assistant_message: str, messages: list[dict]) -> bool:
+        """Check a turn without an answer, after the loop has handled it.
+
+        Adds a forcing prompt to the follow-up message (messages[-1]) once
+        the run has stalled force_after turns in a row.
+
+        Returns:
+            True if the run should stop (abort_after stalled turns in a row)
+        """
+        self.turns += 1
+        self._output_tokens += approximate_tokens(assistant_message)
+        kind = self.classify(assistant_message)
+        if kind is None:
+            self.stalled = 0
+            return False
+        self.stalled += 1
+        self.stalled_turns[kind] = self.stalled_turns.get(kind, 0) + 1
+
+        monitor = self.monitor
+        if monitor.abort_after is not None and self.stalled >= monitor.abort_after:
+            self.reason = f"{self.stalled} stalled turns, last: {kind}"
+            self._estimate_saving(messages, self.max_iterations - self.turns)
+            return True
+        if monitor.force_after is not None and self.stalled >= monitor.force_after:
+            self.forced += 1
+            messages[-1]["content"] = (
+                message_text(messages[-1]) + "\n\n" + self.force_prompt(kind)
+            )
+        return False
+
+    def force_prompt(self, kind: str) -> str:
+        """The prompt pushing a stalled run towards its answer."""
+        called = set(self.tools_called)
+        remaining = [name for name in self.tool_names if name not in called]
+        if remaining:
+            action = (
+                f"Call a tool you have not used yet ({', '.join(remaining)}), "
+                "or give your final answer in <answer> tags now."
+            )
+        else:
+            action = "Give your final answer in <answer> tags now."
+        return f"{FORCE_PROMPTS[kind]} Do not repeat yourself. {action}"
+
+    def finish(self, answered: bool, messages: list[dict]) -> StallStats:
+        """Close the run and add its counters to the monitor's totals.
+
+        Args:
+            answered: Whether the run ended with an answer
+            messages: The run's conversation, to estimate the tokens saved
+        """
+        recovered = answered and self.forced > 0
+        if recovered:
+            # The answering turn is not observed
+            self._estimate_saving(messages, self.max_iterations - self.turns - 1)
+        stats = StallStats(
+            sum(self.stalled_turns.values()),
+            self.cached_calls,
+            self.forced,
+            int(self.reason is not None),
+            int(recovered),
+            self.iterations_saved,
+            self.tokens_saved,
+        )
+        self.monitor._add(stats)
+        return stats
+
+    def report(self) -> str:
+        stalls = ", ".join(
+            f"{count} {kind}" for kind, count in self.stalled_turns.items()
+        )
+        outcome = f"aborted ({self.reason})" if self.reason else "not aborted"
+        return (
+            f"[Stalls: {stalls or 'none'}; {self.cached_calls} repeated calls "
+            f"served from the run, {self.forced} forcing prompts, {outcome}; "
+            f"saved {self.iterations_saved} iterations / ~{self.tokens_saved} tokens]"
+        )
+
+    def attributes(self) -> dict:
+        """Counters to attach to the run's trace."""
+        return {
+            "stall_turns": sum(self.stalled_turns.values()),
+            "stall_cached_calls": self.cached_calls,
+            "stall_forced": self.forced,
+            "stall_aborted": self.reason is not None,
+            "stall_iterations_saved": self.iterations_saved,
+            "stall_tokens_saved": self.tokens_saved,
+        }
+
+
+class StallMonitor:
+    """Detects runs going in circles and pushes them to an answer, or stops them.
+
+    Args:
+        force_after: Stalled turns in a row before a forcing prompt is added
+            (None: never)
+        abort_after: Stalled turns in a row before the run is stopped
+            (None: never)
+    """
+
+    def __init__(self, force_after: Optional[int] = 2, abort_after: Optional[int] = 4):
+        self.force_after = force_after
+        self.abort_after = abort_after
+        self._lock = threading.Lock()
+        self._totals = StallStats(0, 0, 0, 0, 0, 0, 0)
+
+    def new_run(
+        self,
+        max_iterations: int,
+        tools: dict,
+        tools_called: Optional[list[str]] = None,
+    ) -> StallRun:
+        return StallRun(self, max_iterations, tools, tools_called)
+
+    def _add(self, stats: StallStats):
+        with self._lock:
+            self._totals = StallStats(
+                *(total + value for total, value in zip(self._totals, stats))
+            )
+
+    def stats(self) -> StallStats:
+        """Totals of the finished runs."""
+        with self._lock:
+            return self._totals
+
+
+def add_stall_arguments(parser):
+    """Add the --detect-stalls / --stall-force-after / --stall-abort-after options."""
+    parser.add_argument(
+        "--detect-stalls",
+        action="store_true",
+        help="Detect repeated tool calls, reasoning and format errors, and "
+        "push the run to an answer or stop it early",
+    )
+    parser.add_argument(
+        "--stall-force-after",
+        type=int,
+        default=2,
+        help="Stalled turns in a row before a forcing prompt (default: 2)",
+    )
+    parser.add_argument(
+        "--stall-abort-after",
+        type=int,
+        default=4,
+        help="Stalled turns in a row before the run stops (default: 4)",
+    )
+
+
+def stall_monitor_from_args(args) -> Optional[StallMonitor]:
+    """Build the StallMonitor selected by add_stall_arguments' options, if any."""
+    if not args.detect_stalls:
+        return None
+    return StallMonitor(
+        force_after=args.stall_force_after, abort_after=args.stall_abort_after
+    )
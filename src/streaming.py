@@ -0,0 +1,223 @@
+"""
+Streaming responses with early tool dispatch.
+
+With stream=True the LLM sends its message in small chunks. StreamingParser
+scans the growing text as chunks arrive:
+- a tool call is reported as soon as its closing </parameters> tag arrives,
+  so the tool can run while the model is still generating the rest
+- the contents of <answer> are reported as they are generated, so the
+  caller can show them to the user right away
+
+Once the stream ends, finish() returns exactly what parse_response returns
+for the complete message.
+
+Tools dispatched early may run even if the model ends up giving an answer in
+the same message, so they should be free of side effects (all tools in
+tools.py are lookups).
+"""
+
+from concurrent.futures import Future
+from typing import Callable, NamedTuple, Optional
+import asyncio
+import bisect
+
+from tool_cache import ToolCache
+from utils import (
+    ParsedResponse,
+    TagScanner,
+    ToolCall,
+    ToolResult,
+    parse_tags,
+    submit_tool_call,
+)
+
+ANSWER_OPEN = "<answer>"
+ANSWER_CLOSE = "</answer>"
+
+
+class StreamEvent(NamedTuple):
+    """Something the parser found while scanning the stream.
+
+    kind is "tool_call" (tool_call and its index among the message's tool
+    calls are set) or "answer" (text holds the next piece of the answer).
+    """
+
+    kind: str
+    text: str = ""
+    tool_call: Optional[ToolCall] = None
+    index: int = -1
+
+
+class StreamedTurn(NamedTuple):
+    """A fully streamed assistant message and the results of its tool calls."""
+
+    content: str
+    parsed: ParsedResponse
+    tool_results: list[ToolResult]
+    cached: bool = False  # replayed from a cache or session log, not generated
+
+
+class StreamingParser:
+    """Incremental parser for the <answer>/<tool>/<parameters> tags."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.dispatched: set[int] = set()
+        self._tags = TagScanner()
+        # Tool calls before this position are settled (and this many of them)
+        self._settled_at = 0
+        self._settled_calls = 0
+        self._answer_searched = 0  # <answer> does not start before this
+        self._answer_start: Optional[int] = None
+        self._answer_emitted = 0
+        self._answer_done = False
+
+    def feed(self, chunk: str) -> list[StreamEvent]:
+        """Add a chunk of text and return the events it completes."""
+        self.buffer += chunk
+        events = []
+
+        # Tool calls can only be completed by a closing </parameters> tag
+        new_tags = self._tags.feed(self.buffer)
+        params_ends = [span.end for span in new_tags if span.tag == "parameters"]
+        if params_ends:
+            events.extend(self._settle_tool_calls(max(params_ends)))
+
+        events.extend(self._answer_events())
+        return events
+
+    def finish(self) -> tuple[ParsedResponse, list[StreamEvent]]:
+        """Close the stream.
+
+        Returns the parsed message (identical to parse_response on the full
+        text) and the tool calls that could only be settled at the end,
+        i.e. the ones without parameters.
+        """
+        parsed = parse_tags(self._tags.spans)
+        return parsed, self._new_tool_calls(parsed.tool_calls, 0, require_params=False)
+
+    def _settle_tool_calls(self, cut: int) -> list[StreamEvent]:
+        # Calls before the last </parameters> can no longer change, and the ones
+        # before the previous one were already reported: only the tags found
+        # since then need pairing
+        spans = self._tags.spans
+        first = bisect.bisect_left(spans, self._settled_at, key=lambda span: span.start)
+        new_spans = spans[first:]
+        events = self._new_tool_calls(
+            parse_tags(new_spans).tool_calls, self._settled_calls, require_params=True
+        )
+        self._settled_at = cut
+        self._settled_calls += sum(
+            1 for span in new_spans if span.tag == "tool" and span.start < cut
+        )
+        return events
+
+    def _new_tool_calls(
+        self, tool_calls: tuple[ToolCall, ...], first_index: int, require_params: bool
+    ) -> list[StreamEvent]:
+        events = []
+        for index, tool_call in enumerate(tool_calls, first_index):
+            if index in self.dispatched:
+                continue
+            if require_params and tool_call.params is None:
+                continue
+            self.dispatched.add(index)
+            events.append(StreamEvent("tool_call", tool_call=tool_call, index=index))
+        return events
+
+    def _answer_events(self) -> list[StreamEvent]:
+        if self._answer_done:
+            return []
+        if self._answer_start is None:
+            position = self.buffer.find(ANSWER_OPEN, self._answer_searched)
+            if position == -1:
+                # The tag may be cut at the end of the buffer, so look back a little
+                self._answer_searched = max(0, len(self.buffer) - len(ANSWER_OPEN) + 1)
+                return []
+            self._answer_start = self._answer_emitted = position + len(ANSWER_OPEN)
+
+        close = self.buffer.find(ANSWER_CLOSE, self._answer_start)
+        if close != -1:
+            end = close
+            self._answer_done = True
+        else:
+            # Hold back anything that could be the start of </answer>
+            end = max(self._answer_emitted, len(self.buffer) - len(ANSWER_CLOSE) + 1)
+
+        text = self.buffer[self._answer_emitted : end]
+        self._answer_emitted = end
+        return [StreamEvent("answer", text=text)] if text else []
+
+
+def _chunk_text(chunk) -> str:
+    return chunk.choices[0].delta.content or ""
+
+
+def stream_and_dispatch(
+    stream,
+    tools: dict,
+    on_answer: Optional[Callable[[str], None]] = None,
+    tool_cache: Optional[ToolCache] = None,
+) -> StreamedTurn:
+    """Consume a litellm stream, running tool calls as soon as they are complete.
+
+    Args:
+        stream: The iterator returned by litellm.completion(..., stream=True)
+        tools: Dictionary of available tool functions
+        on_answer: Called with each new piece of the <answer> text
+        tool_cache: Optional ToolCache to serve repeated tool calls from
+
+    Returns:
+        StreamedTurn with the full message, its parse and the tool results
+    """
+    parser = StreamingParser()
+    futures: dict[int, Future] = {}
+    cached = False
+
+    def _handle(events: list[StreamEvent]):
+        for event in events:
+            if event.kind == "tool_call":
+                futures[event.index] = submit_tool_call(
+                    event.tool_call, tools, tool_cache
+                )
+            elif on_answer is not None:
+                on_answer(event.text)
+
+    for chunk in stream:
+        cached = cached or getattr(chunk, "cached", False)
+        _handle(parser.feed(_chunk_text(chunk)))
+    parsed, events = parser.finish()
+    _handle(events)
+
+    tool_results = [futures[i].result() for i in range(len(parsed.tool_calls))]
+    return StreamedTurn(parser.buffer, parsed, tool_results, cached)
+
+
+async def astream_and_dispatch(
+    stream,
+    tools: dict,
+    on_answer: Optional[Callable[[str], None]] = None,
+    tool_cache: Optional[ToolCache] = None,
+) -> StreamedTurn:
+    """Asyncio version of stream_and_dispatch for litellm.acompletion streams."""
+    parser = StreamingParser()
+    futures: dict[int, asyncio.Future] = {}
+    cached = False
+
+    def _handle(events: list[StreamEvent]):
+        for event in events:
+            if event.kind == "tool_call":
+                futures[event.index] = asyncio.wrap_future(
+                    submit_tool_call(event.tool_call, tools, tool_cache)
+                )
+            elif on_answer is not None:
+                on_answer(event.text)
+
+    async for chunk in stream:
+        cached = cached or getattr(chunk, "cached", False)
+        _handle(parser.feed(_chunk_text(chunk)))
+    parsed, events = parser.finish()
+    _handle(events)
+
+    tool_results = [await futures[i] for i in range(len(parsed.tool_calls))]
+    return StreamedTurn(parser.buffer, parsed, tool_results, cached)
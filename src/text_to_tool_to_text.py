@@ -11,14 +11,25 @@ Text (user) → Tool (agent decision) → Text (final answer)
 No while loops, just explicit steps showing the tool calling pattern.
 """
 
-import litellm
-from utils import function_to_tool, add_tools_to_prompt, parse_response
+from typing import Callable, Optional
+
+from binding import compile_binder
+from tool_cache import ToolCache
+from tracing import Tracer, usage_attributes
+from utils import build_messages, default_completion_fn, parse_response
 from prompts import SYSTEM_PROMPT
 from tools import get_weather
 
 
 def run_two_step_agent(
-    system_prompt: str, user_request: str, tools: dict, model: str
+    system_prompt: str,
+    user_request: str,
+    tools: dict,
+    model: str,
+    tool_cache: Optional[ToolCache] = None,
+    completion_fn: Optional[Callable] = None,
+    cache_prompt: bool = True,
+    tracer: Optional[Tracer] = None,
 ) -> str:
     """
     Run a two-step agent: query → tool → final answer.
@@ -31,29 +42,32 @@ def run_two_step_agent(
         user_request: The user's question
         tools: Dictionary of available tool functions
         model: The model identifier
+        tool_cache: Optional ToolCache to serve repeated tool calls from
+        completion_fn: LLM backend to use instead of litellm.completion
+            (e.g. CompletionCache.completion for record/replay)
+        cache_prompt: Mark the system prompt for provider prompt caching
+        tracer: Tracer receiving the spans and logs of the run (default: silent)
 
     Returns:
         The final answer from the LLM
     """
-    # Convert tools to ToolInfo namedtuples
-    tool_infos = [function_to_tool(tool_func) for tool_func in tools.values()]
-
-    # Build full system prompt with tools
-    full_system_prompt = add_tools_to_prompt(system_prompt, tool_infos)
+    completion_fn = completion_fn or default_completion_fn()
+    trace = (tracer or Tracer()).start_run()
 
     # Step 1: Initial query - expect tool call
-    print("\n=== Step 1: Initial LLM Query ===")
-    messages = [
-        {"role": "system", "content": full_system_prompt},
-        {"role": "user", "content": user_request},
-    ]
+    trace.log("\n=== Step 1: Initial LLM Query ===")
+    messages = build_messages(system_prompt, user_request, tools, cache_prompt)
 
-    response = litellm.completion(model=model, messages=messages)
-    assistant_message = response.choices[0].message.content
-    print(f"LLM Response: {assistant_message}")
+    trace.iteration = 1
+    with trace.span("llm", model=model) as span:
+        response = completion_fn(model=model, messages=messages)
+        assistant_message = response.choices[0].message.content
+        span.update(usage_attributes(response))
+    trace.log(f"LLM Response: {assistant_message}")
 
     # Parse the response
-    parsed = parse_response(assistant_message)
+    with trace.span("parse"):
+        parsed = parse_response(assistant_message)
 
     # Make sure we have a tool call
     assert parsed.tool is not None and parsed.answer is None, (
@@ -61,7 +75,7 @@ def run_two_step_agent(
     )
 
     # Step 2: Execute tool
-    print("\n=== Step 2: Execute Tool ===")
+    trace.log("\n=== Step 2: Execute Tool ===")
     tool_name = parsed.tool
     params_str = parsed.params or ""
     assert tool_name in tools, (
@@ -69,34 +83,42 @@ def run_two_step_agent(
     )
 
     # Parse parameters and execute tool
-    params = [p.strip() for p in params_str.split(",")] if params_str else []
-    tool_result = tools[tool_name](*params)
-    print(f"Tool '{tool_name}' returned: {tool_result}")
+    params = compile_binder(tools[tool_name]).bind(params_str)
+    with trace.span("tool", tool=tool_name) as span:
+        if tool_cache is not None:
+            tool_result = tool_cache.get_or_call(tool_name, params, tools[tool_name])
+        else:
+            tool_result = tools[tool_name](*params)
+        span["result_size"] = len(str(tool_result))
+    trace.log(f"Tool '{tool_name}' returned: {tool_result}")
 
     # Step 3: Query LLM with tool result for final answer
-    print("\n=== Step 3: Final LLM Query with Tool Result ===")
+    trace.log("\n=== Step 3: Final LLM Query with Tool Result ===")
     messages.append({"role": "assistant", "content": assistant_message})
     messages.append(
         {"role": "user", "content": f"Tool '{tool_name}' returned: {tool_result}"}
     )
 
-    response = litellm.completion(model=model, messages=messages)
-    assistant_message = response.choices[0].message.content
-    print(f"LLM Response: {assistant_message}")
+    trace.iteration = 2
+    with trace.span("llm", model=model) as span:
+        response = completion_fn(model=model, messages=messages)
+        assistant_message = response.choices[0].message.content
+        span.update(usage_attributes(response))
+    trace.log(f"LLM Response: {assistant_message}")
 
     # Parse final answer
-    parsed_final = parse_response(assistant_message)
+    with trace.span("parse"):
+        parsed_final = parse_response(assistant_message)
     assert parsed_final.answer is not None, "Expected a final answer in the last step."
+    trace.finish()
 
     return parsed_final.answer
 
 
 if __name__ == "__main__":
     import argparse
-    from dotenv import load_dotenv
-
-    # Load environment variables
-    load_dotenv()
+    from completion_cache import CompletionCache, add_cache_arguments
+    from tracing import add_tracing_arguments, tracer_from_args
 
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -109,8 +131,20 @@ if __name__ == "__main__":
         default="what activity do you suggest to book if I travel to honolulu next week?",
         help="User question for the travel agent",
     )
+    add_cache_arguments(parser)
+    add_tracing_arguments(parser)
     args = parser.parse_args()
 
+    # Load environment variables (once the arguments are valid, so --help stays fast)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    # Optionally record or replay completions from the on-disk cache
+    completion_fn = None
+    if args.llm_cache:
+        completion_fn = CompletionCache(args.llm_cache_dir, args.llm_cache).completion
+
     # Define available tools
     tools = {"get_weather": get_weather}
 
@@ -122,6 +156,8 @@ if __name__ == "__main__":
         user_request=args.question,
         tools=tools,
         model="claude-sonnet-4-5-20250929",
+        completion_fn=completion_fn,
+        tracer=tracer_from_args(args),
     )
 
     print("\n=== Final Answer ===")
@@ -0,0 +1,176 @@
+"""
+Tool result cache shared by the agent loops.
+
+Agents tend to call the same tool with the same arguments again and again,
+both within a run (e.g. checking the weather twice) and across runs (many
+users asking about the same city). When tools are backed by slow APIs,
+memoizing their results is the cheapest latency win available.
+
+ToolCache keys on the tool name and function plus the normalized arguments
+(case and whitespace folded in strings, so "Honolulu" and " honolulu " hit
+the same entry, while 1 and "1" do not), expires entries after a per-tool TTL, and evicts the least recently
+used entry once it is full. Only successful results are cached, exceptions
+are never stored. Concurrent misses on the same key are coalesced: the
+first one calls the tool and the others wait for its result (single-flight).
+
+Example:
+    cache = ToolCache(ttls={"get_weather": 600})
+    run_agent(..., tool_cache=cache)
+    print(cache.stats())
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, NamedTuple, Optional
+import itertools
+import json
+import threading
+import time
+import weakref
+
+
+class CacheStats(NamedTuple):
+    """Counters for a ToolCache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if value is None or isinstance(value, (bool, int, float)):
+        # Typed, so that 1, 1.0, True and "1" stay different arguments
+        return type(value).__name__, value
+    # Lists, dicts, models...: compared by their JSON form
+    return "json", json.dumps(value, sort_keys=True, default=str)
+
+
+def normalize_params(params: list) -> tuple:
+    """Hashable form of bound arguments, with case and whitespace folded in strings."""
+    return tuple(_normalize(p) for p in params)
+
+
+class ToolCache:
+    """Thread-safe TTL + LRU cache for tool results.
+
+    Args:
+        max_size: Maximum number of entries kept before LRU eviction
+        default_ttl: Seconds an entry stays valid, None for no expiry
+        ttls: Per-tool overrides of default_ttl, keyed by tool name
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        default_ttl: Optional[float] = 300.0,
+        ttls: Optional[dict[str, Optional[float]]] = None,
+    ):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        # key -> Future of the call running for it (single-flight)
+        self._in_flight: dict[tuple, Future] = {}
+        # id(object) -> (weak reference, token) of the tool functions seen
+        self._tokens: dict[int, tuple[Callable, int]] = {}
+        self._next_token = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _token(self, obj: Any) -> int:
+        """A number identifying obj for as long as it is alive (called under the lock).
+
+        Unlike its id, the token of a function is never reused by another
+        one, and unlike its name it differs between two closures or partials.
+        """
+        entry = self._tokens.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+        token = next(self._next_token)
+        try:
+            ref = weakref.ref(obj, lambda _, key=id(obj): self._tokens.pop(key, None))
+        except TypeError:
+            # e.g. builtins, which cannot be weakly referenced: kept alive
+            def ref(obj=obj):
+                return obj
+
+        self._tokens[id(obj)] = (ref, token)
+        return token
+
+    def _function_key(self, func: Callable) -> tuple[int, ...]:
+        # A bound method is a new object on every attribute access: key it on
+        # its instance and function instead
+        if hasattr(func, "__self__") and hasattr(func, "__func__"):
+            return self._token(func.__self__), self._token(func.__func__)
+        return (self._token(func),)
+
+    def get_or_call(self, tool_name: str, params: list, func: Callable) -> Any:
+        """Return the cached result for this call, or call func(*params) and cache it.
+
+        Two tools registered under the same name (e.g. by two agents sharing
+        the cache) do not share entries. While a call is running, identical
+        calls wait for its result instead of calling the tool again (and
+        count as hits); if it raises, they raise the same error.
+        """
+        params_key = normalize_params(params)
+        now = time.monotonic()
+        with self._lock:
+            key = (tool_name, self._function_key(func), params_key)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._in_flight[key] = future = Future()
+        if in_flight is not None:
+            return in_flight.result()
+
+        # Call the tool outside the lock so slow tools do not block other lookups
+        try:
+            value = func(*params)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        ttl = self.ttls.get(tool_name, self.default_ttl)
+        expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            del self._in_flight[key]
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits, self.misses, self.evictions, len(self._entries)
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,380 @@
+"""
+Tool execution with timeouts, isolation and concurrency limits.
+
+Tools used to run directly on the agent's thread: one slow or hung tool (a
+real weather API that never answers) blocked the whole agent forever.
+
+ToolExecutor.wrap(tools) returns the same tools dict with every function
+guarded. A guarded call runs on a pool dedicated to that tool, either
+threads or processes, whose size is the tool's concurrency limit. The
+caller waits at most the tool's timeout (queueing included). On timeout the
+call is cancelled if it had not started yet. A process-isolated tool that
+hangs has its own worker process killed (the calls of other runs on the
+same pool go on), and a new worker is started for the next call. A hung
+thread cannot be killed, so it is abandoned and only ties up a worker of
+that tool's own pool. Either way the agent gets a ToolTimeoutError, which the
+loops send back to the model as a structured error:
+
+    Error executing tool 'get_weather': {"error": "timeout", "timeout_seconds": 5.0, ...}
+
+Since the wrapped tools keep their signatures, they work unchanged with the
+loops, the streaming dispatcher, the tool cache and prefetching. Every call
+is recorded in a per-tool latency histogram.
+
+Example:
+    executor = ToolExecutor(default_timeout=10.0,
+                            policies={"get_weather": ToolPolicy(timeout=5.0, isolation="process")})
+    run_agent(..., tools=executor.wrap(tools))
+    print(executor.format_histograms())
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, NamedTuple, Optional, Union
+import bisect
+import functools
+import json
+import multiprocessing
+import queue
+import threading
+import time
+
+# Workers are not forked: the agent process runs threads (tool pools, prefetch,
+# concurrent runs), which a forked child would inherit in an arbitrary state
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool did not return within its timeout."""
+
+    def __init__(self, tool_name: str, timeout: float):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        super().__init__(
+            json.dumps(
+                {
+                    "error": "timeout",
+                    "tool": tool_name,
+                    "timeout_seconds": timeout,
+                    "retryable": True,
+                    "hint": "The tool did not answer in time. Retry it once, "
+                    "or continue without its result.",
+                }
+            )
+        )
+
+
+class ToolPolicy(NamedTuple):
+    """How one tool is executed.
+
+    timeout: Seconds the agent waits for a result (queueing included)
+    max_concurrency: Calls of this tool running at once
+    isolation: "thread", or "process" for tools that may hang or crash
+        (the function must then be importable, i.e. defined at module level)
+    """
+
+    timeout: float = 30.0
+    max_concurrency: int = 4
+    isolation: str = "thread"
+
+
+class LatencyHistogram:
+    """Bucketed latencies of one tool (thread-safe)."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100),
+        capped by the slowest call."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q / 100 * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    if index < len(self.buckets):
+                        return min(self.buckets[index], self.max)
+                    return self.max
+            return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def format(self) -> str:
+        """One line per non-empty bucket."""
+        lines = []
+        with self._lock:
+            counts = list(self.counts)
+        lower = 0.0
+        for index, count in enumerate(counts):
+            upper = self.buckets[index] if index < len(self.buckets) else float("inf")
+            if count:
+                bar = "#" * max(1, round(40 * count / self.count))
+                lines.append(
+                    f"  {lower * 1000:>8.0f} - {upper * 1000:>8.0f} ms {count:>6} {bar}"
+                )
+            lower = upper
+        return "\n".join(lines)
+
+
+def _worker_main(connection):
+    """Loop of a worker process: run the (func, args) calls it receives."""
+    while True:
+        try:
+            func, args = connection.recv()
+        except EOFError:
+            return
+        try:
+            outcome = (True, func(*args))
+        except BaseException as e:
+            outcome = (False, e)
+        try:
+            connection.send(outcome)
+        except Exception as e:
+            # The result (or error) could not be pickled
+            connection.send((False, RuntimeError(f"Unpicklable tool result: {e}")))
+
+
+class _ProcessWorker:
+    """A worker process running one call at a time, which can be killed alone."""
+
+    def __init__(self):
+        self.connection, child = _MP_CONTEXT.Pipe()
+        self.process = _MP_CONTEXT.Process(
+            target=_worker_main, args=(child,), daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class _ProcessPool:
+    """Worker processes of a tool (up to max_workers calls at once).
+
+    Unlike a ProcessPoolExecutor, each call has its own worker while it
+    runs, so a hung call is killed without touching the calls of other runs.
+    """
+
+    def __init__(self, max_workers: int):
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle: queue.LifoQueue[_ProcessWorker] = queue.LifoQueue()
+        self._closed = False
+
+    def call(self, func: Callable, args: tuple, timeout: float):
+        """Run func(*args) in a worker process and return its result.
+
+        Raises:
+            concurrent.futures.TimeoutError: If no worker was free or the call
+                did not return within timeout (its worker is then killed)
+        """
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise FutureTimeoutError()
+        try:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = _ProcessWorker()
+            try:
+                worker.connection.send((func, args))
+            except BaseException:
+                # e.g. an unpicklable tool (a lambda or a closure): the call
+                # may be half written, so the worker is not reused
+                worker.kill()
+                raise
+            try:
+                done = worker.connection.poll(max(0.0, deadline - time.monotonic()))
+                if done:
+                    ok, value = worker.connection.recv()
+            except (EOFError, OSError):
+                worker.kill()
+                raise RuntimeError("The tool's worker process died") from None
+            if not done:
+                worker.kill()
+                raise FutureTimeoutError()
+            if self._closed:
+                worker.kill()
+            else:
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self, wait: bool = False, cancel_futures: bool = True):
+        """Stop the idle workers; busy ones are stopped when their call returns."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+class ToolExecutor:
+    """Runs tools on per-tool pools with timeouts and latency histograms.
+
+    Args:
+        default_timeout: Timeout of the tools without a policy
+        default_concurrency: Concurrency limit of the tools without a policy
+        policies: Per-tool ToolPolicy, keyed by tool name
+    """
+
+    def __init__(
+        self,
+        default_timeout: float = 30.0,
+        default_concurrency: int = 4,
+        policies: Optional[dict[str, ToolPolicy]] = None,
+    ):
+        self.default_policy = ToolPolicy(default_timeout, default_concurrency)
+        self.policies = policies or {}
+        self._pools: dict[str, Union[ThreadPoolExecutor, _ProcessPool]] = {}
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def policy(self, tool_name: str) -> ToolPolicy:
+        return self.policies.get(tool_name, self.default_policy)
+
+    def _pool(self, tool_name: str) -> Union[ThreadPoolExecutor, _ProcessPool]:
+        with self._lock:
+            pool = self._pools.get(tool_name)
+            if pool is None:
+                policy = self.policy(tool_name)
+                if policy.isolation == "process":
+                    pool = _ProcessPool(max_workers=policy.max_concurrency)
+                else:
+                    pool = ThreadPoolExecutor(
+                        max_workers=policy.max_concurrency,
+                        thread_name_prefix=f"tool-{tool_name}",
+                    )
+                self._pools[tool_name] = pool
+            return pool
+
+    def histogram(self, tool_name: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self._histograms.get(tool_name)
+            if histogram is None:
+                histogram = self._histograms[tool_name] = LatencyHistogram()
+            return histogram
+
+    def histograms(self) -> dict[str, LatencyHistogram]:
+        with self._lock:
+            return dict(self._histograms)
+
+    def call(self, tool_name: str, func: Callable, *args):
+        """Run func(*args) under the tool's policy and return its result.
+
+        Raises:
+            ToolTimeoutError: If the tool did not return within its timeout
+        """
+        policy = self.policy(tool_name)
+        pool = self._pool(tool_name)
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            if isinstance(pool, _ProcessPool):
+                # A running call that times out has its worker killed
+                return pool.call(func, args, policy.timeout)
+            future = pool.submit(func, *args)
+            try:
+                return future.result(timeout=policy.timeout)
+            except FutureTimeoutError:
+                # Not started yet: dropped from the queue. Running: abandoned
+                future.cancel()
+                raise
+        except FutureTimeoutError:
+            timed_out = True
+            raise ToolTimeoutError(tool_name, policy.timeout) from None
+        finally:
+            self.histogram(tool_name).observe(time.perf_counter() - start, timed_out)
+
+    def wrap(self, tools: dict) -> dict:
+        """Return the tools dict with every tool running under its policy."""
+        guarded = {}
+        for tool_name, func in tools.items():
+
+            @functools.wraps(func)
+            def guarded_tool(*args, _tool_name=tool_name, _func=func):
+                return self.call(_tool_name, _func, *args)
+
+            guarded[tool_name] = guarded_tool
+        return guarded
+
+    def format_histograms(self) -> str:
+        """Latency summary and histogram of every tool called so far."""
+        lines = []
+        for tool_name, histogram in sorted(self.histograms().items()):
+            lines.append(
+                f"{tool_name}: {histogram.count} calls, {histogram.timeouts} timeouts, "
+                f"mean {histogram.mean * 1000:.1f} ms, "
+                f"p50 <= {histogram.percentile(50) * 1000:.1f} ms, "
+                f"p95 <= {histogram.percentile(95) * 1000:.1f} ms, "
+                f"max {histogram.max * 1000:.1f} ms"
+            )
+            lines.append(histogram.format())
+        return "\n".join(lines)
+
+    def shutdown(self, cancel: bool = True):
+        """Stop all the pools, cancelling the calls that have not started."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=cancel)
+
+
+def add_tool_executor_arguments(parser):
+    """Add the --tool-timeout / --tool-isolation options to an argparse parser."""
+    parser.add_argument(
+        "--tool-timeout",
+        type=float,
+        default=None,
+        help="Seconds a tool may run before the model gets a timeout error "
+        "(default: tools run inline without a timeout)",
+    )
+    parser.add_argument(
+        "--tool-isolation",
+        choices=["thread", "process"],
+        default="thread",
+        help="Run the tools in worker threads or processes (with --tool-timeout)",
+    )
+
+
+def tool_executor_from_args(args, tools: dict) -> Optional[ToolExecutor]:
+    """Build the ToolExecutor selected by add_tool_executor_arguments' options."""
+    if args.tool_timeout is None:
+        return None
+    policy = ToolPolicy(timeout=args.tool_timeout, isolation=args.tool_isolation)
+    return ToolExecutor(
+        default_timeout=args.tool_timeout,
+        policies={tool_name: policy for tool_name in tools},
+    )
@@ -0,0 +1,287 @@
+"""
+Structured tracing for the agent loops.
+
+Printing the agent text tells us what happened, but not where the time went.
+A Tracer records spans for every iteration of a run:
+- "llm": LLM latency, model, prompt/completion tokens (from response.usage)
+- "parse": time spent parsing the response
+- "tool": tool name, latency and result size
+
+and a "run" span with the totals when the run ends. Spans go to pluggable
+exporters: InMemoryExporter, JsonlExporter, OpenTelemetryExporter, and
+ConsoleExporter, which is also the (opt-in) sink for the human-readable
+logs the loops used to print unconditionally.
+
+Example:
+    memory = InMemoryExporter()
+    tracer = Tracer([memory, ConsoleExporter()])
+    run_agent(..., tracer=tracer)
+    print(tracer.summaries[-1])
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, NamedTuple, Optional
+import json
+import threading
+import time
+import uuid
+
+
+class Span(NamedTuple):
+    """A timed step of an agent run."""
+
+    name: str
+    run_id: str
+    iteration: Optional[int]
+    start_time: float
+    duration: float
+    attributes: dict
+
+
+class RunSummary(NamedTuple):
+    """Totals for one agent run."""
+
+    run_id: str
+    iterations: int  # loop turns with an LLM call (a rerouted call is not one)
+    total_time: float
+    llm_time: float
+    tool_time: float
+    parse_time: float
+    prompt_tokens: int
+    completion_tokens: int
+    tool_calls: int
+
+
+def usage_attributes(response) -> dict:
+    """Extract token counts from a litellm response, if it reports usage."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+class RunTrace:
+    """Spans and logs of a single agent run (see Tracer.start_run)."""
+
+    def __init__(self, tracer: "Tracer", run_id: str):
+        self.tracer = tracer
+        self.run_id = run_id
+        self.iteration: Optional[int] = None
+        self.spans: list[Span] = []
+        self._start = time.perf_counter()
+        self._start_time = time.time()
+
+    def log(self, text: str):
+        """Send a human-readable line to the log sinks (e.g. the console)."""
+        for exporter in self.tracer.exporters:
+            exporter.log(self.run_id, text)
+
+    def record(self, name: str, duration: float, **attributes):
+        """Record a span that was timed elsewhere (e.g. on a tool thread)."""
+        span = Span(
+            name,
+            self.run_id,
+            self.iteration,
+            time.time() - duration,
+            duration,
+            attributes,
+        )
+        self.spans.append(span)
+        for exporter in self.tracer.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block; attributes can be added to the yielded dict."""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, time.perf_counter() - start, **attributes)
+
+    def finish(self, **attributes) -> RunSummary:
+        """Close the run, export the "run" span and return its summary."""
+
+        def _total(name: str, field: str = "") -> float:
+            return sum(
+                (s.attributes.get(field, 0) if field else s.duration)
+                for s in self.spans
+                if s.name == name
+            )
+
+        summary = RunSummary(
+            run_id=self.run_id,
+            iterations=len({s.iteration for s in self.spans if s.name == "llm"}),
+            total_time=time.perf_counter() - self._start,
+            llm_time=_total("llm"),
+            tool_time=_total("tool"),
+            parse_time=_total("parse"),
+            prompt_tokens=int(_total("llm", "prompt_tokens")),
+            completion_tokens=int(_total("llm", "completion_tokens")),
+            tool_calls=sum(1 for s in self.spans if s.name == "tool"),
+        )
+        span = Span(
+            "run",
+            self.run_id,
+            None,
+            self._start_time,
+            summary.total_time,
+            {**summary._asdict(), **attributes},
+        )
+        for exporter in self.tracer.exporters:
+            exporter.export(span)
+        self.tracer._add_summary(summary)
+        return summary
+
+
+class Tracer:
+    """Creates a RunTrace per agent run and fans its spans out to exporters.
+
+    A Tracer without exporters costs next to nothing, which is what the
+    loops use when no tracer is given.
+
+    Args:
+        exporters: Where spans (and logs) are sent
+        max_summaries: Summaries of the last runs kept in `summaries`
+            (None: all of them)
+    """
+
+    def __init__(
+        self, exporters: Optional[list] = None, max_summaries: Optional[int] = 1000
+    ):
+        self.exporters = list(exporters or [])
+        self.summaries: deque[RunSummary] = deque(maxlen=max_summaries)
+        self._lock = threading.Lock()
+
+    def start_run(self, run_id: Optional[str] = None) -> RunTrace:
+        return RunTrace(self, run_id or uuid.uuid4().hex[:12])
+
+    def _add_summary(self, summary: RunSummary):
+        with self._lock:
+            self.summaries.append(summary)
+
+
+class Exporter:
+    """Base exporter: ignores everything. Subclasses override what they need."""
+
+    def export(self, span: Span):
+        pass
+
+    def log(self, run_id: str, text: str):
+        pass
+
+
+class ConsoleExporter(Exporter):
+    """Prints the loop logs and a one-line summary per run to stdout."""
+
+    def log(self, run_id: str, text: str):
+        print(text)
+
+    def export(self, span: Span):
+        if span.name != "run":
+            return
+        a = span.attributes
+        print(
+            f"[trace {span.run_id}] {a['iterations']} iterations in "
+            f"{a['total_time']:.2f}s: LLM {a['llm_time']:.2f}s, "
+            f"tools {a['tool_time']:.3f}s ({a['tool_calls']} calls), "
+            f"parse {a['parse_time'] * 1000:.2f}ms, "
+            f"tokens {a['prompt_tokens']} in / {a['completion_tokens']} out"
+        )
+
+
+class InMemoryExporter(Exporter):
+    """Keeps spans (and optionally logs) in lists, for tests and notebooks."""
+
+    def __init__(self, keep_logs: bool = False):
+        self.spans: list[Span] = []
+        self.logs: list[tuple[str, str]] = []
+        self.keep_logs = keep_logs
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def log(self, run_id: str, text: str):
+        if self.keep_logs:
+            self.logs.append((run_id, text))
+
+
+class JsonlExporter(Exporter):
+    """Appends one JSON object per span to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def export(self, span: Span):
+        line = json.dumps(span._asdict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class OpenTelemetryExporter(Exporter):
+    """Forwards spans to OpenTelemetry (requires the opentelemetry-api package).
+
+    Spans keep their run_id and iteration as attributes, so they can be
+    grouped per run in any OTel backend.
+    """
+
+    def __init__(self, tracer_name: str = "agent-loops"):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetryExporter needs opentelemetry: uv add opentelemetry-sdk"
+            ) from e
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def export(self, span: Span):
+        attributes: dict[str, Any] = {
+            "agent.run_id": span.run_id,
+            **{
+                f"agent.{k}": v
+                for k, v in span.attributes.items()
+                if isinstance(v, (str, bool, int, float))
+            },
+        }
+        if span.iteration is not None:
+            attributes["agent.iteration"] = span.iteration
+        start_ns = int(span.start_time * 1e9)
+        otel_span = self._tracer.start_span(
+            span.name, start_time=start_ns, attributes=attributes
+        )
+        otel_span.end(end_time=start_ns + int(span.duration * 1e9))
+
+
+def add_tracing_arguments(parser):
+    """Add the --quiet / --trace-file options to an argparse parser."""
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Do not print the agent steps to the console",
+    )
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default=None,
+        help="Append the trace spans of every run to this JSONL file",
+    )
+
+
+def tracer_from_args(args) -> Tracer:
+    """Build the Tracer selected by add_tracing_arguments' options."""
+    exporters = []
+    if not args.quiet:
+        exporters.append(ConsoleExporter())
+    if args.trace_file:
+        exporters.append(JsonlExporter(args.trace_file))
+    return Tracer(exporters)
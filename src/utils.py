@@ -1,7 +1,14 @@
+import bisect
 import inspect
 import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import NamedTuple, Callable, Optional
 
+from binding import ArgumentBinder, ToolArgumentError, compile_binder
+from tool_cache import ToolCache
+
 
 class ToolInfo(NamedTuple):
     """Information about a tool extracted from a function."""
@@ -9,40 +16,98 @@ class ToolInfo(NamedTuple):
     name: str
     params: str
     docstring: str
+    binder: Optional[ArgumentBinder] = None
+    schema: Optional[dict] = None
+
+
+class ToolCall(NamedTuple):
+    """A single tool call requested by the LLM.
+
+    id is set for native tool calls (the id the tool result must refer to).
+    """
+
+    name: str
+    params: Optional[str] = None
+    id: Optional[str] = None
+
+
+class ToolResult(NamedTuple):
+    """Outcome of executing a tool call, formatted for the LLM."""
+
+    name: str
+    content: str
+    ok: bool
+    latency: float = 0.0
+
+
+class TagSpan(NamedTuple):
+    """One <tag>content</tag> occurrence in an LLM response.
+
+    start is the position of the opening tag, end the position right after
+    the closing tag.
+    """
+
+    tag: str
+    content: str
+    start: int
+    end: int
 
 
 class ParsedResponse(NamedTuple):
-    """Parsed response from the LLM."""
+    """Parsed response from the LLM.
+
+    tool and params hold the first tool call, tool_calls holds all of them
+    and tags every complete tag found in the response.
+    """
 
     answer: Optional[str]
     tool: Optional[str]
     params: Optional[str]
     reasoning: Optional[str] = None
+    tool_calls: tuple[ToolCall, ...] = ()
+    tags: tuple[TagSpan, ...] = ()
 
 
 def function_to_tool(func: Callable) -> ToolInfo:
     """Convert a Python function to a ToolInfo namedtuple.
 
     Extracts the function name, parameters signature, and docstring
-    to create a structured representation for the LLM.
+    to create a structured representation for the LLM, and compiles the
+    binder that parses and type-checks the parameters of its calls.
 
     Args:
         func: The function to convert to a tool
 
     Returns:
-        ToolInfo with name, params, and docstring
+        ToolInfo with name, params, docstring, binder and the JSON-schema
+        tool definition used by native tool calling
     """
     name = func.__name__
-    sig = inspect.signature(func)
-    params = ", ".join(
-        [
-            f"{param_name}: {param.annotation.__name__ if param.annotation != inspect.Parameter.empty else 'any'}"
-            for param_name, param in sig.parameters.items()
-        ]
-    )
+    binder = compile_binder(func)
+    if isinstance(binder, ArgumentBinder):
+        # Same type names as the binder's error messages (e.g. list[str])
+        params = ", ".join(f"{p.name}: {p.type_name}" for p in binder.parameters)
+    else:
+        sig = inspect.signature(func)
+        params = ", ".join(
+            [
+                f"{param_name}: {param.annotation.__name__ if param.annotation != inspect.Parameter.empty else 'any'}"
+                for param_name, param in sig.parameters.items()
+            ]
+        )
     docstring = inspect.getdoc(func) or "No description available"
+    schema = {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": docstring,
+            "parameters": binder.json_schema(),
+        },
+    }
 
-    return ToolInfo(name=name, params=params, docstring=docstring)
+    return ToolInfo(
+        name=name, params=params, docstring=docstring, binder=binder, schema=schema
+    )
 
 
 def add_tools_to_prompt(system_prompt: str, tool_infos: list[ToolInfo]) -> str:
@@ -70,45 +135,330 @@ def add_tools_to_prompt(system_prompt: str, tool_infos: list[ToolInfo]) -> str:
     return system_prompt + tools_description
 
 
+@lru_cache(maxsize=128)
+def system_prompt_with_tools(
+    system_prompt: str, tool_funcs: tuple[Callable, ...]
+) -> str:
+    """Build the system prompt with tool descriptions, once per tool set.
+
+    Inspecting signatures and docstrings is only needed the first time a
+    given prompt and set of tools are seen; later runs reuse the same string.
+
+    Args:
+        system_prompt: The base system prompt
+        tool_funcs: The tool functions, as a tuple so they can be hashed
+
+    Returns:
+        The full system prompt with tool descriptions
+    """
+    # Convert tools to ToolInfo namedtuples
+    tool_infos = [function_to_tool(tool_func) for tool_func in tool_funcs]
+
+    # Build full system prompt with tools
+    return add_tools_to_prompt(system_prompt, tool_infos)
+
+
+@lru_cache(maxsize=128)
+def tool_definitions(tool_funcs: tuple[Callable, ...]) -> list[dict]:
+    """JSON-schema tool definitions for litellm's tools= parameter, once per tool set.
+
+    Args:
+        tool_funcs: The tool functions, as a tuple so they can be hashed
+
+    Returns:
+        One OpenAI-style function definition per tool
+    """
+    return [function_to_tool(tool_func).schema for tool_func in tool_funcs]
+
+
+def build_messages(
+    system_prompt: str, user_request: str, tools: dict, cache_prompt: bool = False
+) -> list[dict]:
+    """Build the initial conversation for an agent run.
+
+    The system prompt (with the tool descriptions) is identical on every
+    iteration and every run, so with cache_prompt it is marked with an
+    Anthropic cache_control breakpoint: litellm forwards the marker and the
+    provider serves that prefix from its prompt cache instead of processing
+    it again.
+
+    Args:
+        system_prompt: The base system prompt
+        user_request: The user's question
+        tools: Dictionary of available tool functions
+        cache_prompt: Whether to mark the system prompt for prompt caching
+
+    Returns:
+        The list of messages to send to the LLM
+    """
+    full_system_prompt = system_prompt_with_tools(system_prompt, tuple(tools.values()))
+
+    system_content = full_system_prompt
+    if cache_prompt:
+        system_content = [
+            {
+                "type": "text",
+                "text": full_system_prompt,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": user_request},
+    ]
+
+
+def message_text(message: dict) -> str:
+    """Return the text of a message, whether its content is a string or a list of blocks."""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    if content is None:
+        # e.g. an assistant message holding only native tool calls
+        return ""
+    return "".join(block.get("text", "") for block in content)
+
+
+# Every opening or closing tag used by the agents, so a single sweep finds them all
+TAG_PATTERN = re.compile(r"<(/?)(reasoning|answer|tool|parameters)>")
+# Longest tag: a tag starting closer than this to the end of a text may be cut
+_LONGEST_TAG = len("</parameters>")
+
+
+class TagScanner:
+    """Finds the tags of a text that grows at its end, such as a stream.
+
+    Each call to feed() only scans what was added since the previous one
+    (plus the last few characters, which may hold the start of a tag cut
+    in two), so scanning a whole stream is linear in its length.
+    """
+
+    def __init__(self):
+        self.spans: list[TagSpan] = []  # ordered by position
+        self._open_tags: list[tuple[str, int, int]] = []  # (tag, start, content start)
+        self._position = 0
+
+    def feed(self, text: str) -> list[TagSpan]:
+        """Scan the text so far (the previous text plus new characters).
+
+        Returns:
+            TagSpan for every tag the new characters completed
+        """
+        new_spans = []
+        open_tags = self._open_tags
+        for match in TAG_PATTERN.finditer(text, self._position):
+            self._position = match.end()
+            closing, tag = match.groups()
+            if not closing:
+                open_tags.append((tag, match.start(), match.end()))
+                continue
+            # Well-formed text closes the innermost open tag, otherwise search down
+            i = len(open_tags) - 1
+            while i >= 0 and open_tags[i][0] != tag:
+                i -= 1
+            if i < 0:
+                continue
+            _, start, content_start = open_tags[i]
+            # Anything opened inside this tag and left unclosed is dropped
+            del open_tags[i:]
+            span = TagSpan(tag, text[content_start : match.start()], start, match.end())
+            new_spans.append(span)
+            # Closing an outer tag completes a span that starts before inner ones
+            bisect.insort(self.spans, span, key=lambda other: other.start)
+        self._position = max(self._position, len(text) - _LONGEST_TAG + 1)
+        return new_spans
+
+
+def scan_tags(response_text: str) -> list[TagSpan]:
+    """Find every tag occurrence in a single pass over the text.
+
+    Opening tags are kept on a stack and each closing tag closes the
+    innermost open tag with the same name, so nested tags (e.g. a <tool>
+    mentioned inside <reasoning>) and multi-line contents are handled.
+    Tags that are opened but never closed are ignored.
+
+    Args:
+        response_text: The raw response from the LLM
+
+    Returns:
+        TagSpan for every complete tag, ordered by position
+    """
+    scanner = TagScanner()
+    scanner.feed(response_text)
+    return scanner.spans
+
+
 def parse_response(response_text: str) -> ParsedResponse:
     """Parse the LLM response for answer or tool call.
 
     Extracts either:
     - A final answer between <answer></answer> tags
-    - A tool call with <tool></tool> and <parameters></parameters> tags
+    - One or more tool calls with <tool></tool> and <parameters></parameters> tags
     - Reasoning between <reasoning></reasoning> tags
 
+    All tags are found in one pass by scan_tags. Each <tool> is paired with
+    the first <parameters> that follows it and comes before the next <tool>.
+
     Args:
         response_text: The raw response from the LLM
 
     Returns:
-        ParsedResponse with answer, tool, params, and reasoning (all optional)
+        ParsedResponse with answer, tool, params, reasoning, tool_calls and
+        every tag found (with its position)
     """
+    return parse_tags(scan_tags(response_text))
+
+
+def parse_tags(spans: list[TagSpan]) -> ParsedResponse:
+    """parse_response for tags already found (e.g. by a TagScanner)."""
     answer = None
-    tool = None
-    params = None
     reasoning = None
+    tool_spans = []
+    params_spans = []
+    for span in spans:
+        if span.tag == "tool":
+            tool_spans.append(span)
+        elif span.tag == "parameters":
+            params_spans.append(span)
+        elif span.tag == "answer" and answer is None:
+            answer = span.content.strip()
+        elif span.tag == "reasoning" and reasoning is None:
+            reasoning = span.content.strip()
+
+    # Pair each tool with its parameters (both lists are ordered by position)
+    tool_calls = []
+    p = 0
+    for i, tool_span in enumerate(tool_spans):
+        next_tool = tool_spans[i + 1] if i + 1 < len(tool_spans) else None
+        while p < len(params_spans) and params_spans[p].start < tool_span.end:
+            p += 1
+        params = None
+        if p < len(params_spans) and (
+            next_tool is None or params_spans[p].start < next_tool.start
+        ):
+            params = params_spans[p].content.strip()
+            p += 1
+        tool_calls.append(ToolCall(name=tool_span.content.strip(), params=params))
 
-    # Check for reasoning
-    reasoning_match = re.search(
-        r"<reasoning>(.*?)</reasoning>", response_text, re.DOTALL
+    return ParsedResponse(
+        answer=answer,
+        tool=tool_calls[0].name if tool_calls else None,
+        params=tool_calls[0].params if tool_calls else None,
+        reasoning=reasoning,
+        tool_calls=tuple(tool_calls),
+        tags=tuple(spans),
     )
-    if reasoning_match:
-        reasoning = reasoning_match.group(1).strip()
 
-    # Check for answer
-    answer_match = re.search(r"<answer>(.*?)</answer>", response_text, re.DOTALL)
-    if answer_match:
-        answer = answer_match.group(1).strip()
 
-    # Check for tool call
-    tool_match = re.search(r"<tool>(.*?)</tool>", response_text)
-    if tool_match:
-        tool = tool_match.group(1).strip()
+def execute_tool_call(
+    tool_call: ToolCall, tools: dict, cache: Optional[ToolCache] = None
+) -> ToolResult:
+    """Execute a single tool call and format the outcome for the LLM.
+
+    Errors (unknown tool, exceptions raised by the tool) are returned as
+    a failed ToolResult rather than raised, so the model can react to them.
+
+    Args:
+        tool_call: The tool call to execute
+        tools: Dictionary of available tool functions
+        cache: Optional ToolCache to serve repeated calls from
+
+    Returns:
+        ToolResult with the message content to send back to the LLM
+    """
+    tool_name = tool_call.name
+    params_str = tool_call.params or ""
+
+    # Check if tool exists
+    if tool_name not in tools:
+        return ToolResult(
+            tool_name,
+            f"Tool '{tool_name}' not found. Available tools: {', '.join(tools.keys())}",
+            ok=False,
+        )
+
+    # Parse the parameters (JSON, keyword or plain text) into typed values;
+    # the binder is compiled once per tool and cached
+    try:
+        params = compile_binder(tools[tool_name]).bind(params_str)
+    except ToolArgumentError as e:
+        return ToolResult(
+            tool_name,
+            f"Invalid parameters for tool '{tool_name}': {e}",
+            ok=False,
+        )
+    return call_tool(tool_name, params, tools[tool_name], cache)
+
+
+def call_tool(
+    tool_name: str, params: list, func: Callable, cache: Optional[ToolCache] = None
+) -> ToolResult:
+    """Call a tool with its bound parameters and format the outcome for the LLM."""
+    start = time.perf_counter()
+    try:
+        if cache is not None:
+            tool_result = cache.get_or_call(tool_name, params, func)
+        else:
+            tool_result = func(*params)
+    except Exception as e:
+        return ToolResult(
+            tool_name,
+            f"Error executing tool '{tool_name}': {str(e)}",
+            ok=False,
+            latency=time.perf_counter() - start,
+        )
+    return ToolResult(
+        tool_name,
+        f"Tool '{tool_name}' returned: {tool_result}",
+        ok=True,
+        latency=time.perf_counter() - start,
+    )
+
+
+# Shared pool so that tool calls from concurrent agent runs reuse threads
+_tool_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+
+def submit_tool_call(
+    tool_call: ToolCall, tools: dict, cache: Optional[ToolCache] = None
+) -> Future:
+    """Start a tool call on the shared thread pool and return its Future."""
+    return _tool_pool.submit(execute_tool_call, tool_call, tools, cache)
+
+
+def execute_tool_calls(
+    tool_calls: list[ToolCall], tools: dict, cache: Optional[ToolCache] = None
+) -> list[ToolResult]:
+    """Execute several tool calls concurrently on a thread pool.
+
+    Args:
+        tool_calls: The tool calls emitted in one assistant message
+        tools: Dictionary of available tool functions
+        cache: Optional ToolCache to serve repeated calls from
+
+    Returns:
+        One ToolResult per tool call, in the same order
+    """
+    # A single call runs inline, there is nothing to overlap
+    if len(tool_calls) == 1:
+        return [execute_tool_call(tool_calls[0], tools, cache)]
+    return list(
+        _tool_pool.map(lambda call: execute_tool_call(call, tools, cache), tool_calls)
+    )
+
+
+# litellm takes seconds to import, so it is only loaded when a real model is
+# called: --help, mock and cache replay runs start without it
+def default_completion_fn() -> Callable:
+    """Return litellm.completion, importing litellm on first use."""
+    import litellm
+
+    return litellm.completion
+
 
-        # Check for parameters
-        params_match = re.search(r"<parameters>(.*?)</parameters>", response_text)
-        if params_match:
-            params = params_match.group(1).strip()
+def default_acompletion_fn() -> Callable:
+    """Return litellm.acompletion, importing litellm on first use."""
+    import litellm
 
-    return ParsedResponse(answer=answer, tool=tool, params=params, reasoning=reasoning)
+    return litellm.acompletion
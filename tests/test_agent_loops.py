@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+import advanced_react_loop
+import simple_react_loop
+from agent_run import NO_ANSWER
+from generation import GenerationPolicy
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT, SYSTEM_PROMPT
+from routing import ModelRouter
+from stall import StallMonitor
+from tool_cache import ToolCache
+from tools import check_availability_activity, get_weather
+from tracing import InMemoryExporter, Tracer
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+ANSWER = "In honolulu I suggest tennis, it is sunny and there is a free slot."
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def run_simple(llm, **options):
+    return simple_react_loop.run_agent(
+        system_prompt=SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools={"get_weather": get_weather},
+        model="mock",
+        completion_fn=llm.completion,
+        **options,
+    )
+
+
+def run_advanced(llm, **options):
+    return advanced_react_loop.run_agent(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools=TOOLS,
+        model="mock",
+        completion_fn=llm.completion,
+        **options,
+    )
+
+
+def test_simple_loop_answers():
+    llm = MockLLM()
+    assert run_simple(llm) == ANSWER
+    assert llm.calls == 2
+
+
+def test_advanced_loop_traces_the_run():
+    exporter = InMemoryExporter()
+    llm = MockLLM()
+    assert run_advanced(llm, tracer=Tracer([exporter])) == ANSWER
+    assert llm.calls == 3
+    names = [span.name for span in exporter.spans]
+    assert names.count("llm") == 3
+    assert names.count("tool") == 3
+    assert names[-1] == "run"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_advanced_loop_async(stream):
+    llm = MockLLM()
+    pieces = []
+    answer = asyncio.run(
+        advanced_react_loop.run_agent_async(
+            system_prompt=ADVANCED_SYSTEM_PROMPT,
+            user_request=QUESTION,
+            tools=TOOLS,
+            model="mock",
+            acompletion_fn=llm.acompletion,
+            stream=stream,
+            on_answer=pieces.append,
+        )
+    )
+    assert answer == ANSWER
+    assert "".join(pieces) == (ANSWER if stream else "")
+
+
+def test_streamed_answer_goes_to_on_answer():
+    pieces = []
+    assert run_advanced(MockLLM(), stream=True, on_answer=pieces.append) == ANSWER
+    assert "".join(pieces) == ANSWER
+
+
+def test_answer_without_required_tools_is_rejected():
+    llm = MockLLM(responses=["<reasoning>Easy.</reasoning><answer>Tennis</answer>"])
+    with pytest.raises(AssertionError, match="without checking weather"):
+        run_advanced(llm)
+
+
+def test_max_iterations_without_answer():
+    llm = MockLLM(responses=["Let me think about it."])
+    assert run_simple(llm, max_iterations=3) == NO_ANSWER
+    assert llm.calls == 3
+
+
+def test_tool_cache_is_shared_across_runs():
+    cache = ToolCache()
+    run_advanced(MockLLM(), tool_cache=cache)
+    run_advanced(MockLLM(), tool_cache=cache)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (3, 3)
+
+
+def test_stalled_run_stops_early():
+    repeat = (
+        "<reasoning>Let me check the weather.</reasoning>\n"
+        "<tool>get_weather</tool>\n<parameters>honolulu</parameters>"
+    )
+    llm = MockLLM(responses=[repeat])
+    monitor = StallMonitor(force_after=2, abort_after=3)
+    assert run_advanced(llm, stall=monitor) == NO_ANSWER
+    # One call making progress, then three stalled ones
+    assert llm.calls == 4
+    stats = monitor.stats()
+    assert stats.aborted == 1
+    assert stats.cached_calls == 3
+    assert stats.iterations_saved == 6
+
+
+def test_tool_results_quoted_by_the_user_are_not_calls():
+    # The question quotes a tool result: the first turn still selects tools
+    models = []
+    llm = MockLLM()
+
+    def completion(model, messages, **kwargs):
+        models.append((model, kwargs.get("max_tokens")))
+        return llm.completion(model=model, messages=messages, **kwargs)
+
+    question = f"{QUESTION} A friend got \"Tool 'get_weather' returned: sunny\"."
+    advanced_react_loop.run_agent(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=question,
+        tools=TOOLS,
+        model="mock",
+        completion_fn=completion,
+        router=ModelRouter("fast", answer_tools={"get_weather"}),
+        generation=GenerationPolicy(tool_max_tokens=200, answer_tools={"get_weather"}),
+        max_iterations=1,
+    )
+    assert models[0] == ("fast", 200)
@@ -0,0 +1,86 @@
+import re
+
+import pytest
+
+from binding import ToolArgumentError, compile_binder
+
+
+def get_weather(location: str) -> str:
+    return location
+
+
+def book(activity: str, people: int = 1, indoor: bool = False) -> str:
+    return activity
+
+
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ("honolulu", ["honolulu"]),
+        ("San Jose, CA", ["San Jose, CA"]),
+        ('"rome"', ["rome"]),
+        ('{"location": "paris"}', ["paris"]),
+        ("location=paris", ["paris"]),
+    ],
+)
+def test_single_parameter(params, expected):
+    assert compile_binder(get_weather).bind(params) == expected
+
+
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ("tennis, 2", ["tennis", 2, False]),
+        ('{"activity": "yoga", "indoor": true}', ["yoga", 1, True]),
+        ('["padel", "4"]', ["padel", 4, False]),
+        ("activity=tennis, people=3", ["tennis", 3, False]),
+    ],
+)
+def test_several_parameters(params, expected):
+    assert compile_binder(book).bind(params) == expected
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ("", "Missing required parameter 'activity'"),
+        ('{"sport": "tennis"}', "Unknown parameter"),
+        ("tennis, many", "Invalid value for parameter 'people'"),
+        ("tennis, 2, yes, 4", "takes 3 parameter"),
+    ],
+)
+def test_errors_name_the_signature(params, message):
+    with pytest.raises(ToolArgumentError, match=message) as error:
+        compile_binder(book).bind(params)
+    assert "book(activity: str, people: int, indoor: bool)" in str(error.value)
+
+
+def test_binder_is_compiled_once():
+    assert compile_binder(book) is compile_binder(book)
+
+
+def plan(options: dict) -> str:
+    return str(options)
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ('{"city": "rome"}', "Unknown parameter(s) 'city' for tool 'get_weather'"),
+        ('{"location": "rome"', "not a valid JSON object"),
+    ],
+)
+def test_single_parameter_json_errors(params, message):
+    with pytest.raises(ToolArgumentError, match=re.escape(message)):
+        compile_binder(get_weather).bind(params)
+
+
+def test_single_object_parameter_takes_the_object():
+    assert compile_binder(plan).bind('{"days": 3}') == [{"days": 3}]
+    assert compile_binder(plan).bind('{"options": {"days": 3}}') == [{"days": 3}]
+
+
+def test_binder_cache_is_bounded():
+    for _ in range(200):
+        compile_binder(lambda location: location)
+    assert compile_binder.cache_info().currsize <= 128
@@ -0,0 +1,99 @@
+from pathlib import Path
+import subprocess
+import sys
+import warnings
+
+import pytest
+
+from advanced_react_loop import run_agent
+from budget import Budget
+from completion_cache import CompletionCache
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT
+from routing import ModelRouter
+from tools import check_availability_activity, get_weather
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def run(completion_fn, **options):
+    return run_agent(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools=TOOLS,
+        model="mock",
+        completion_fn=completion_fn,
+        **options,
+    )
+
+
+def flat_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    return 0.001
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_replayed_calls_are_not_counted(tmp_path, stream):
+    cache = CompletionCache(str(tmp_path), "record", MockLLM().completion)
+    recorded = Budget(max_batch_tokens=10**6, cost_fn=flat_cost)
+    run(cache.completion, budget=recorded, stream=stream)
+    assert recorded.total_tokens > 0 and recorded.total_cost > 0
+
+    replayed = Budget(max_batch_tokens=10**6, cost_fn=flat_cost)
+    run(
+        CompletionCache(str(tmp_path), "replay").completion,
+        budget=replayed,
+        stream=stream,
+    )
+    assert replayed.total_tokens == 0
+    assert replayed.total_cost == 0.0
+
+
+class RecordingBudget(Budget):
+    """Keeps the budget of each run it starts."""
+
+    def new_run(self):
+        self.runs = getattr(self, "runs", []) + [super().new_run()]
+        return self.runs[-1]
+
+
+def test_rerouted_call_shares_the_iteration():
+    # The fast model answers, so the answer turn is redone by the strong one
+    budget = RecordingBudget(max_batch_tokens=10**6, cost_fn=flat_cost)
+    run(
+        MockLLM().completion,
+        budget=budget,
+        router=ModelRouter("fast", answer_tools={"book_activity"}),
+    )
+    (run_usage,) = budget.runs
+    turns = [(usage.iteration, usage.model) for usage in run_usage.iterations]
+    assert turns == [(1, "fast"), (2, "fast"), (3, "fast"), (3, "mock")]
+
+
+def test_unpriced_model_warns_when_cost_is_limited():
+    budget = Budget(max_run_cost=0.01, cost_fn=lambda *usage: None)
+    with pytest.warns(RuntimeWarning, match="'mock'"):
+        run(MockLLM().completion, budget=budget)
+    # Once per model
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        run(MockLLM().completion, budget=budget)
+    assert budget.total_cost == 0.0
+
+
+def test_mock_runs_do_not_import_litellm(tmp_path):
+    # A litellm that leaves a trace when it is imported
+    imported = tmp_path / "imported"
+    (tmp_path / "litellm.py").write_text(f"open({str(imported)!r}, 'w').close()\n")
+    code = "from budget import litellm_cost; assert litellm_cost('mock', 10, 10) is None"
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=SRC,
+        env={"PYTHONPATH": str(tmp_path)},
+    )
+    assert not imported.exists()
@@ -0,0 +1,34 @@
+import threading
+
+from completion_cache import CompletionCache
+from mock_llm import MockLLM
+
+
+def messages(trial: int) -> list:
+    return [
+        {"role": "system", "content": "You are a travel agent."},
+        {"role": "user", "content": f"what should I book in rome? (trial {trial})"},
+    ]
+
+
+def test_concurrent_misses_on_one_key_are_stored_once(tmp_path):
+    cache = CompletionCache(str(tmp_path), "record", MockLLM().completion)
+    for trial in range(10):
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def call():
+            barrier.wait()
+            try:
+                cache.completion(model="mock", messages=messages(trial))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+    assert len(cache) == 10
+    assert list(tmp_path.glob("*/*.tmp")) == []
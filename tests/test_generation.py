@@ -0,0 +1,50 @@
+from generation import GenerationPolicy
+from mock_llm import MockLLM
+
+WEATHER = [
+    {"role": "system", "content": "prompt"},
+    {"role": "user", "content": "question"},
+]
+
+
+def test_phase_follows_the_answer_tools():
+    tools_called = []
+    run = GenerationPolicy(answer_tools={"get_weather"}).new_run(tools_called)
+    assert run.phase() == "tool"
+    tools_called.append("get_weather")
+    assert run.phase() == "answer"
+
+
+def test_repair_closes_stopped_tags():
+    run = GenerationPolicy().new_run()
+    assert run.repair("<reasoning>ok</reasoning><answer>Tennis") == (
+        "<reasoning>ok</reasoning><answer>Tennis</answer>"
+    )
+    assert run.repaired == 1
+
+
+def test_truncated_tool_call_is_dropped():
+    run = GenerationPolicy().new_run()
+    content = "<reasoning>Check</reasoning>\n<tool>get_weather</tool>\n<parameters>ro"
+    assert run.repair(content, "length") == "<reasoning>Check</reasoning>"
+    assert run.truncated == 1
+    # The run is not kept under the tool cap
+    assert run.phase() == "answer"
+
+
+def test_wrapped_completion_gets_the_phase_limits():
+    seen = []
+    llm = MockLLM(speculation_rate=1.0)
+
+    def completion(model, messages, **kwargs):
+        seen.append(kwargs)
+        return llm.completion(model, messages, **kwargs)
+
+    policy = GenerationPolicy(tool_max_tokens=64, answer_tools={"get_weather"})
+    run = policy.new_run()
+    response = run.wrap_completion(completion)(model="mock", messages=WEATHER)
+    assert seen[0]["max_tokens"] == 64 and "\nTool '" in seen[0]["stop"]
+    # The speculated tool result was cut by the stop sequence
+    assert "Tool '" not in response.choices[0].message.content
+    run.finish()
+    assert policy.stats().tool_calls == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from job_queue import DONE, FAILED, PENDING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2, retry_delay=0.0)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue("weather in rome?")
+    assert not queue.enqueue("weather in rome?")
+    assert queue.enqueue("weather in rome?", agent="advanced")
+    assert queue.counts().pending == 2
+
+
+def test_claim_and_complete(queue):
+    queue.enqueue("first")
+    queue.enqueue("second")
+    job = queue.claim("w1")
+    assert job.question == "first" and job.attempts == 1
+    assert queue.claim("w2").question == "second"
+    assert queue.claim("w3") is None
+    assert queue.complete(job.id, "w1", "sunny", 0.5)
+    assert not queue.complete(job.id, "w1", "sunny", 0.5)
+    assert queue.counts().done == 1
+
+
+def test_failed_job_is_retried_then_failed(queue):
+    queue.enqueue("flaky")
+    job = queue.claim("w1")
+    assert queue.fail(job.id, "w1", "boom", 0.1) == PENDING
+    job = queue.claim("w1")
+    assert job.attempts == 2
+    assert queue.fail(job.id, "w1", "boom", 0.1) == FAILED
+    assert queue.claim("w1") is None
+    assert queue.retry_failed() == 1
+    assert queue.claim("w1").attempts == 1
+
+
+def test_only_the_holder_can_fail_a_job(queue):
+    queue.enqueue("question")
+    job = queue.claim("w1")
+    queue.complete(job.id, "w1", "answer", 0.1)
+    assert queue.fail(job.id, "w2", "late", 0.1) == DONE
+
+
+def test_released_job_keeps_its_attempts(queue):
+    queue.enqueue("question")
+    job = queue.claim("w1")
+    queue.release(job.id, "w1")
+    assert queue.claim("w2").attempts == 1
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=-1.0)
+    queue.enqueue("question")
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+    assert second.id == first.id and second.attempts == 2
+    queue.close()
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from mcp_pool import MCPSessionPool
+
+
+class FakeSession:
+    def __init__(self, alive: bool = True):
+        self.tools = ["get_weather"]
+        self.last_checked = time.monotonic()
+        self.alive = alive
+        self.closed = False
+
+    def ping(self, timeout: float) -> bool:
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(MCPSessionPool):
+    """Pool whose sessions are FakeSessions, failing to connect while `down`."""
+
+    def __init__(self, **kwargs):
+        super().__init__(server_parameters={"url": "http://fake"}, **kwargs)
+        self.down = False
+        self.sessions = []
+
+    def _connect(self):
+        if self.down:
+            raise ConnectionError("server down")
+        self.sessions.append(FakeSession())
+        return self.sessions[-1]
+
+
+def test_sessions_are_reused():
+    pool = FakePool(size=2)
+    for _ in range(3):
+        with pool.session() as tools:
+            assert tools == ["get_weather"]
+    assert len(pool.sessions) == 1
+    assert pool.checkouts == 3
+
+
+def test_full_pool_times_out():
+    pool = FakePool(size=1)
+    with pool.session():
+        with pytest.raises(queue.Empty):
+            with pool.session(timeout=0.05):
+                pass
+
+
+def test_failed_connect_frees_its_slot():
+    pool = FakePool(size=1)
+    pool.down = True
+    with pytest.raises(ConnectionError):
+        with pool.session():
+            pass
+    pool.down = False
+    with pool.session(timeout=1.0) as tools:
+        assert tools == ["get_weather"]
+
+
+def test_waiting_run_gets_a_slot_freed_by_a_failed_connect():
+    pool = FakePool(size=1)
+    connecting = threading.Event()
+    connect = pool._connect
+
+    def slow_failing_connect():
+        # The first connection fails after a while, the next ones succeed
+        pool._connect = connect
+        connecting.set()
+        time.sleep(0.1)
+        raise ConnectionError("server down")
+
+    pool._connect = slow_failing_connect
+    errors = []
+
+    def first_run():
+        try:
+            with pool.session():
+                pass
+        except ConnectionError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=first_run)
+    thread.start()
+    connecting.wait()
+    with pool.session(timeout=5.0) as tools:
+        assert tools == ["get_weather"]
+    thread.join()
+    assert len(errors) == 1
+
+
+def test_dead_session_is_restarted_after_a_failed_run():
+    pool = FakePool(size=1)
+    with pytest.raises(RuntimeError):
+        with pool.session():
+            pool.sessions[0].alive = False
+            raise RuntimeError("run failed")
+    assert pool.sessions[0].closed and pool.restarts == 1
+    with pool.session():
+        pass
+    assert len(pool.sessions) == 2
+
+
+def test_failed_restart_frees_the_slot_and_keeps_the_run_error():
+    pool = FakePool(size=1)
+    with pytest.raises(RuntimeError, match="run failed"):
+        with pool.session():
+            pool.sessions[0].alive = False
+            pool.down = True
+            raise RuntimeError("run failed")
+    pool.down = False
+    with pool.session(timeout=1.0):
+        pass
+    assert len(pool.sessions) == 2
+
+
+def test_sessions_in_use_are_closed_on_release_after_close():
+    pool = FakePool(size=2)
+    pool.warm_up(1)
+    with pool.session():
+        pool.close()
+        assert not pool.sessions[0].closed
+    assert pool.sessions[0].closed
+    assert pool._open == 0
+    with pytest.raises(RuntimeError, match="closed"):
+        with pool.session():
+            pass
@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+from mock_llm import MockLLM
+from native_tool_loop import _handle_turn, run_agent, run_agent_async
+from prompts import NATIVE_SYSTEM_PROMPT
+from tools import check_availability_activity, get_weather
+from tracing import Tracer
+
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def message(*calls):
+    return SimpleNamespace(
+        content="",
+        tool_calls=[
+            SimpleNamespace(
+                id=f"call_{i}",
+                function=SimpleNamespace(name=name, arguments=arguments),
+            )
+            for i, (name, arguments) in enumerate(calls)
+        ],
+    )
+
+
+def handle(*calls):
+    messages, tools_called = [], []
+    _handle_turn(
+        message(*calls), messages, TOOLS, tools_called, (), Tracer().start_run()
+    )
+    return [m["content"] for m in messages[1:]], tools_called
+
+
+def test_native_loop_answers():
+    llm = MockLLM()
+    answer = run_agent(
+        system_prompt=NATIVE_SYSTEM_PROMPT,
+        user_request="what should I book if I travel to rome next week?",
+        tools=TOOLS,
+        model="mock",
+        completion_fn=llm.completion,
+    )
+    assert answer.startswith("In rome I suggest tennis")
+    assert llm.calls == 3
+
+
+def test_valid_arguments_are_executed():
+    results, tools_called = handle(
+        ("get_weather", '{"location": "rome"}'),
+        ("check_availability_activity", '{"activity": "tennis"}'),
+    )
+    assert results[0] == (
+        "Tool 'get_weather' returned: 80 degrees fahrenheit, clear skies"
+    )
+    assert tools_called == ["get_weather", "check_availability_activity"]
+
+
+@pytest.mark.parametrize(
+    "arguments, error",
+    [
+        ("rome", "not valid JSON"),
+        ('{"location": "rome"', "not valid JSON"),
+        ('["rome"]', "expected a JSON object"),
+        ('{"city": "rome"}', "unknown 'city'; missing 'location'"),
+        ('{"location": "rome", "days": 3}', "unknown 'days'"),
+        ("{}", "missing 'location'"),
+    ],
+)
+def test_invalid_arguments_are_reported_to_the_model(arguments, error):
+    results, tools_called = handle(
+        ("get_weather", arguments),
+        ("check_availability_activity", '{"activity": "tennis"}'),
+    )
+    assert results[0].startswith("Invalid arguments for tool 'get_weather'")
+    assert error in results[0]
+    assert tools_called == ["check_availability_activity"]
+
+
+def answer_at_once(model, messages, **kwargs):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="It is noon."))]
+    )
+
+
+def test_other_tools_need_no_travel_tools():
+    answer = run_agent(
+        system_prompt=NATIVE_SYSTEM_PROMPT,
+        user_request="what time is it?",
+        tools={"get_time": lambda: "noon"},
+        model="mock",
+        completion_fn=answer_at_once,
+        max_iterations=5,
+    )
+    assert answer == "It is noon."
+
+
+def test_async_loop_requires_the_given_tools():
+    llm = MockLLM()
+    answer = asyncio.run(
+        run_agent_async(
+            system_prompt=NATIVE_SYSTEM_PROMPT,
+            user_request="what should I book if I travel to rome next week?",
+            tools=TOOLS,
+            model="mock",
+            acompletion_fn=llm.acompletion,
+            required_tools=tuple(TOOLS),
+        )
+    )
+    assert answer.startswith("In rome I suggest tennis")
+    assert llm.calls == 3
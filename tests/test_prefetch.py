@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+
+from advanced_react_loop import run_agent
+from mock_llm import MockLLM
+from prefetch import Prefetcher, _call_key
+from prompts import ADVANCED_SYSTEM_PROMPT
+from session_log import SessionLog
+from stall import StallMonitor
+from tools import check_availability_activity, get_weather
+from utils import ToolCall
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def test_call_key_uses_the_bound_arguments():
+    keys = {
+        _call_key(ToolCall("get_weather", params), TOOLS)
+        for params in [
+            "San Jose, CA",
+            '{"location": "san jose, CA"}',
+            "location=San Jose, CA",
+        ]
+    }
+    assert keys == {("get_weather", ("san jose, ca",))}
+    assert _call_key(ToolCall("get_weather", '{"city": "rome"}'), TOOLS) is None
+    assert _call_key(ToolCall("unknown", "rome"), TOOLS) is None
+
+
+def test_predicted_calls_are_hits():
+    prefetcher = Prefetcher()
+    answer = run_agent(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools=TOOLS,
+        model="mock",
+        completion_fn=MockLLM().completion,
+        prefetch=prefetcher,
+    )
+    assert answer.startswith("In honolulu")
+    stats = prefetcher.stats()
+    assert (stats.hits, stats.misses) == (3, 0)
+    # Four of the six activities were predicted for nothing
+    assert stats.wasted == 4
+
+
+def test_prefetch_is_discarded_when_the_run_fails():
+    release = threading.Event()
+    started = []
+
+    def slow_weather(location: str) -> str:
+        started.append(location)
+        release.wait(5)
+        return "sunny"
+
+    def predictor(user_request, messages, tools_called):
+        return [ToolCall("get_weather", city) for city in ("rome", "paris", "oslo")]
+
+    def failing_completion(model, messages, **kwargs):
+        raise RuntimeError("provider down")
+
+    prefetcher = Prefetcher(predictor, max_workers=1)
+    with pytest.raises(RuntimeError, match="provider down"):
+        run_agent(
+            system_prompt=ADVANCED_SYSTEM_PROMPT,
+            user_request=QUESTION,
+            tools={"get_weather": slow_weather},
+            model="mock",
+            completion_fn=failing_completion,
+            prefetch=prefetcher,
+        )
+    release.set()
+    prefetcher._pool.shutdown(wait=True)
+    # The queued predictions were cancelled, only the running one completed
+    assert started == ["rome"]
+
+
+def test_only_the_used_predictions_are_logged(tmp_path):
+    session = SessionLog(str(tmp_path))
+    stall = StallMonitor()
+    options = dict(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools=TOOLS,
+        model="mock",
+        session=session,
+        run_id="r1",
+    )
+    answer = run_agent(
+        completion_fn=MockLLM().completion,
+        prefetch=Prefetcher(),
+        stall=stall,
+        **options,
+    )
+    events = [json.loads(line) for line in session.path_for("r1").open()]
+    # The three calls the model made, not the four wasted predictions
+    assert [e["tool"] for e in events if e["type"] == "tool"] == [
+        "get_weather",
+        "check_availability_activity",
+        "check_availability_activity",
+    ]
+    assert stall.stats().cached_calls == 0
+    # A finished run is replayed from the log
+    assert run_agent(completion_fn=MockLLM().completion, **options) == answer
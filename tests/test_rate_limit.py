@@ -0,0 +1,156 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from mock_llm import MockLLM, RateLimitError, ThrottlingLLM
+from rate_limit import RateLimitedClient
+
+MESSAGES = [{"role": "user", "content": "what should I do in rome?"}]
+
+
+def client_for(provider, **options):
+    return RateLimitedClient(
+        provider.completion,
+        provider.acompletion,
+        base_delay=0.02,
+        max_delay=0.2,
+        max_retries=10,
+        seed=0,
+        **options,
+    )
+
+
+def test_throttled_calls_are_retried_with_backoff():
+    provider = ThrottlingLLM(
+        MockLLM(responses=["ok"]), requests_per_window=2, window=0.2
+    )
+    client = client_for(provider, initial_concurrency=4)
+    for _ in range(5):
+        response = client.completion(model="mock", messages=MESSAGES)
+        assert response.choices[0].message.content == "ok"
+    stats = client.stats()
+    assert stats.throttled == provider.rejected > 0
+    assert stats.retries == stats.throttled
+    assert stats.requests == 5 + stats.retries
+    assert stats.failures == 0
+    # Every 429 halves the concurrency limit
+    assert stats.concurrency_limit < 4
+
+
+def test_retry_after_is_honoured():
+    calls = []
+
+    class Throttled(Exception):
+        status_code = 429
+        response = SimpleNamespace(headers={"retry-after": "0.2"})
+
+    def completion(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise Throttled()
+        return "ok"
+
+    client = RateLimitedClient(completion, base_delay=0.001, seed=0)
+    assert client.completion(model="mock", messages=MESSAGES) == "ok"
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_permanent_errors_are_not_retried():
+    def completion(**kwargs):
+        raise ValueError("bad request")
+
+    client = RateLimitedClient(completion)
+    with pytest.raises(ValueError):
+        client.completion(model="mock", messages=MESSAGES)
+    stats = client.stats()
+    assert (stats.requests, stats.retries, stats.failures) == (1, 0, 1)
+    assert client.concurrency.in_flight == 0
+
+
+def test_retries_give_up_after_max_retries():
+    provider = ThrottlingLLM(MockLLM(responses=["ok"]), requests_per_window=0)
+    client = client_for(provider)
+    client.max_retries = 2
+    with pytest.raises(RateLimitError):
+        client.completion(model="mock", messages=MESSAGES)
+    assert client.stats().requests == 3
+    assert client.stats().failures == 1
+
+
+def test_concurrency_stays_under_the_limit():
+    provider = ThrottlingLLM(
+        MockLLM(latency=0.02, responses=["ok"]),
+        requests_per_window=1000,
+        max_concurrency=2,
+    )
+    client = client_for(provider, initial_concurrency=2, max_concurrency=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(
+            pool.map(
+                lambda _: client.completion(model="mock", messages=MESSAGES),
+                range(16),
+            )
+        )
+    assert provider.rejected == 0
+    assert client.stats().requests == 16
+
+
+def test_request_rate_stays_under_the_limit():
+    provider = ThrottlingLLM(
+        MockLLM(responses=["ok"]), requests_per_window=5, window=0.25
+    )
+    # Slightly under the provider's 20 requests/second
+    client = client_for(provider, requests_per_minute=1100, burst_seconds=0.01)
+    start = time.monotonic()
+    for _ in range(10):
+        client.completion(model="mock", messages=MESSAGES)
+    assert provider.rejected == 0
+    assert time.monotonic() - start >= 0.4
+
+
+def test_interrupted_call_frees_its_slot():
+    def completion(**kwargs):
+        raise KeyboardInterrupt
+
+    client = RateLimitedClient(completion, initial_concurrency=1)
+    with pytest.raises(KeyboardInterrupt):
+        client.completion(model="mock", messages=MESSAGES)
+    assert client.concurrency.in_flight == 0
+    assert client.concurrency.limit == 1
+
+
+def test_cancelled_call_frees_its_slot():
+    async def acompletion(**kwargs):
+        await asyncio.sleep(10)
+
+    async def main():
+        client = RateLimitedClient(acompletion_fn=acompletion, initial_concurrency=1)
+        task = asyncio.create_task(client.acompletion(model="mock", messages=MESSAGES))
+        await asyncio.sleep(0.01)
+        assert client.concurrency.in_flight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return client
+
+    client = asyncio.run(main())
+    assert client.concurrency.in_flight == 0
+
+
+def test_async_calls_are_retried():
+    provider = ThrottlingLLM(
+        MockLLM(responses=["ok"]), requests_per_window=2, window=0.2
+    )
+    client = client_for(provider)
+
+    async def main():
+        return await asyncio.gather(
+            *(client.acompletion(model="mock", messages=MESSAGES) for _ in range(4))
+        )
+
+    responses = asyncio.run(main())
+    assert [r.choices[0].message.content for r in responses] == ["ok"] * 4
+    assert client.stats().retries == provider.rejected > 0
@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+from advanced_react_loop import run_agent
+from completion_cache import CompletionCache
+from generation import GenerationPolicy
+from mock_llm import MockLLM
+from prompts import ADVANCED_SYSTEM_PROMPT
+from session_log import SessionLog, SessionMismatchError
+from tools import check_availability_activity, get_weather
+from tracing import InMemoryExporter, Tracer
+
+QUESTION = "what activity do you suggest to book if I travel to honolulu next week?"
+# Open file descriptors can be counted on Linux
+PROC_FD = os.path.isdir("/proc/self/fd")
+TOOLS = {
+    "get_weather": get_weather,
+    "check_availability_activity": check_availability_activity,
+}
+
+
+def run(completion_fn, **options):
+    return run_agent(
+        system_prompt=ADVANCED_SYSTEM_PROMPT,
+        user_request=QUESTION,
+        tools=TOOLS,
+        model="mock",
+        completion_fn=completion_fn,
+        **options,
+    )
+
+
+def test_resumed_run_is_replayed_from_the_log(tmp_path):
+    session = SessionLog(str(tmp_path))
+    answer = run(MockLLM().completion, session=session, run_id="r1")
+    llm = MockLLM()
+    assert run(llm.completion, session=session, run_id="r1") == answer
+    assert llm.calls == 0
+
+
+def test_diverging_run_is_not_resumed(tmp_path):
+    session = SessionLog(str(tmp_path))
+    run(MockLLM().completion, session=session, run_id="r1")
+    # Another prompt gives another conversation
+    with pytest.raises(SessionMismatchError):
+        run_agent(
+            system_prompt=ADVANCED_SYSTEM_PROMPT + " Be brief.",
+            user_request=QUESTION,
+            tools=TOOLS,
+            model="mock",
+            completion_fn=MockLLM().completion,
+            session=session,
+            run_id="r1",
+        )
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_truncated_turns_are_replayed(tmp_path, stream):
+    # The tool-selection turns are cut by max_tokens, and repaired accordingly
+    session = SessionLog(str(tmp_path / "sessions"))
+    cache = CompletionCache(str(tmp_path / "cache"), "record", MockLLM().completion)
+    options = dict(session=session, run_id="r1", max_iterations=4, stream=stream)
+    answer = run(
+        cache.completion, generation=GenerationPolicy(tool_max_tokens=30), **options
+    )
+    events = [json.loads(line) for line in session.path_for("r1").open()]
+    assert "length" in [e.get("finish_reason") for e in events if e["type"] == "llm"]
+
+    # From the session log
+    llm = MockLLM()
+    replayed = run(
+        llm.completion, generation=GenerationPolicy(tool_max_tokens=30), **options
+    )
+    assert replayed == answer and llm.calls == 0
+
+    # From the completion cache
+    offline = CompletionCache(str(tmp_path / "cache"), "replay")
+    assert (
+        run(
+            offline.completion,
+            generation=GenerationPolicy(tool_max_tokens=30),
+            max_iterations=4,
+            stream=stream,
+        )
+        == answer
+    )
+
+
+def test_failed_run_is_closed_and_can_be_resumed(tmp_path):
+    session = SessionLog(str(tmp_path))
+    exporter = InMemoryExporter()
+    llm = MockLLM()
+
+    def failing_second_call(model, messages, **kwargs):
+        if llm.calls == 1:
+            raise RuntimeError("provider down")
+        return llm.completion(model=model, messages=messages, **kwargs)
+
+    open_files = len(os.listdir("/proc/self/fd")) if PROC_FD else 0
+    with pytest.raises(RuntimeError):
+        run(
+            failing_second_call, session=session, run_id="r1", tracer=Tracer([exporter])
+        )
+    if PROC_FD:
+        assert len(os.listdir("/proc/self/fd")) == open_files
+    # The run span is exported, with the error
+    assert exporter.spans[-1].name == "run"
+    assert "provider down" in exporter.spans[-1].attributes["error"]
+    # No finish event: the run resumes after its first LLM call
+    events = [json.loads(line) for line in session.path_for("r1").open()]
+    assert "finish" not in [e["type"] for e in events]
+    resumed = MockLLM()
+    assert run(resumed.completion, session=session, run_id="r1")
+    assert resumed.calls == 2
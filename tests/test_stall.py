@@ -0,0 +1,56 @@
+from stall import FORMAT_ERROR, REPEATED_TOOL_CALL, UNCHANGED_REASONING, StallMonitor
+
+TOOLS = {"get_weather": None, "check_availability_activity": None}
+CALL = "<reasoning>Weather first.</reasoning><tool>get_weather</tool><parameters>Rome</parameters>"
+
+
+def test_classify():
+    run = StallMonitor().new_run(10, TOOLS)
+    assert run.classify(CALL) is None
+    # Same call, whatever the case and spacing of the parameters
+    assert (
+        run.classify("<tool>get_weather</tool><parameters> rome </parameters>")
+        == REPEATED_TOOL_CALL
+    )
+    assert run.classify("Hmm.") == FORMAT_ERROR
+    assert run.classify("<reasoning>Weather first.</reasoning>") == UNCHANGED_REASONING
+    assert run.classify("<answer>Tennis</answer>") is None
+
+
+def test_forcing_prompt_then_abort():
+    monitor = StallMonitor(force_after=2, abort_after=3)
+    run = monitor.new_run(10, TOOLS, ["get_weather"])
+    messages = [{"role": "user", "content": "Tool 'get_weather' returned: sunny"}]
+    assert not run.observe(CALL, messages)
+    assert not run.observe(CALL, messages)
+    assert "Do not repeat yourself" not in messages[-1]["content"]
+    assert not run.observe(CALL, messages)
+    assert "check_availability_activity" in messages[-1]["content"]
+    assert run.observe(CALL, messages)
+    assert run.reason.startswith("3 stalled turns")
+    stats = run.finish(False, messages)
+    assert (stats.forced, stats.aborted, stats.iterations_saved) == (1, 1, 6)
+    assert monitor.stats() == stats
+
+
+def test_progress_resets_the_count():
+    run = StallMonitor(force_after=None, abort_after=2).new_run(10, TOOLS)
+    messages = [{"role": "user", "content": ""}]
+    assert not run.observe("Hmm.", messages)
+    assert not run.observe(CALL, messages)
+    assert not run.observe("Hmm?", messages)
+    assert run.observe("Hmm!", messages)
+
+
+def test_repeated_calls_are_served_from_the_run():
+    run = StallMonitor().new_run(10, TOOLS)
+    tool_cache = run.wrap_tool_cache()
+    calls = []
+
+    def weather(location):
+        calls.append(location)
+        return "sunny"
+
+    assert tool_cache.get_or_call("get_weather", ["Rome"], weather) == "sunny"
+    assert tool_cache.get_or_call("get_weather", ["rome"], weather) == "sunny"
+    assert calls == ["Rome"] and run.cached_calls == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from streaming import StreamingParser
+from utils import TagScanner, parse_response, scan_tags
+
+MESSAGE = (
+    "<reasoning>Check the weather, then pick a <tool></reasoning>\n"
+    "<tool>get_weather</tool><parameters>honolulu</parameters>\n"
+    "<tool>check_availability_activity</tool>\n<parameters>\n"
+    '{"activity": "surf"}\n</parameters>\n'
+    "<tool>list_activities</tool>\n"
+    "<answer>Go surfing <b>early</b></answer>"
+)
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 13, len(MESSAGE)])
+def test_tag_scanner_matches_scan_tags(size):
+    scanner = TagScanner()
+    text = ""
+    for start in range(0, len(MESSAGE), size):
+        text += MESSAGE[start : start + size]
+        scanner.feed(text)
+    assert scanner.spans == scan_tags(MESSAGE)
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(MESSAGE)])
+def test_streamed_tool_calls_match_the_full_parse(size):
+    parser = StreamingParser()
+    events = []
+    for start in range(0, len(MESSAGE), size):
+        events += parser.feed(MESSAGE[start : start + size])
+    parsed, last_events = parser.finish()
+
+    assert parsed == parse_response(MESSAGE)
+    calls = [event.tool_call for event in events if event.kind == "tool_call"]
+    # Calls with parameters are dispatched while streaming, the others at the end
+    assert calls == list(parsed.tool_calls[:2])
+    assert [event.tool_call for event in last_events] == [parsed.tool_calls[2]]
+    answer = "".join(event.text for event in events if event.kind == "answer")
+    assert answer == parsed.answer
@@ -0,0 +1,165 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from tool_cache import ToolCache, normalize_params
+
+
+def counting_tool():
+    calls = []
+
+    def tool(*params):
+        calls.append(params)
+        return f"result {len(calls)}"
+
+    return tool, calls
+
+
+def test_repeated_calls_are_served_from_the_cache():
+    cache = ToolCache()
+    tool, calls = counting_tool()
+    assert cache.get_or_call("weather", ["Rome"], tool) == "result 1"
+    # Case and whitespace do not matter
+    assert cache.get_or_call("weather", ["  rome "], tool) == "result 1"
+    assert len(calls) == 1
+    assert cache.stats()[:2] == (1, 1)
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ToolCache(default_ttl=0.01, ttls={"static": None})
+    tool, calls = counting_tool()
+    cache.get_or_call("weather", ["rome"], tool)
+    cache.get_or_call("static", ["rome"], tool)
+    time.sleep(0.02)
+    cache.get_or_call("weather", ["rome"], tool)
+    cache.get_or_call("static", ["rome"], tool)
+    assert len(calls) == 3
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ToolCache(max_size=2)
+    tool, calls = counting_tool()
+    cache.get_or_call("weather", ["rome"], tool)
+    cache.get_or_call("weather", ["paris"], tool)
+    cache.get_or_call("weather", ["rome"], tool)
+    cache.get_or_call("weather", ["oslo"], tool)
+    assert cache.evictions == 1
+    assert len(cache) == 2
+    cache.get_or_call("weather", ["rome"], tool)
+    assert len(calls) == 3
+
+
+def test_failed_calls_are_not_cached():
+    cache = ToolCache()
+
+    def failing(location):
+        raise RuntimeError("down")
+
+    for _ in range(2):
+        try:
+            cache.get_or_call("weather", ["rome"], failing)
+        except RuntimeError:
+            pass
+    assert len(cache) == 0
+    assert cache.misses == 2
+
+
+def test_normalize_params():
+    assert normalize_params(["  New   York ", 3]) == ("new york", ("int", 3))
+    assert normalize_params([1]) != normalize_params(["1"])
+    assert normalize_params([[1, 2]]) == normalize_params([[1, 2]])
+
+
+def test_tools_with_the_same_name_do_not_share_entries():
+    cache = ToolCache()
+
+    def real_weather(location):
+        return "sunny"
+
+    def mock_weather(location):
+        return "mock"
+
+    assert cache.get_or_call("weather", ["rome"], real_weather) == "sunny"
+    assert cache.get_or_call("weather", ["rome"], mock_weather) == "mock"
+    assert cache.get_or_call("weather", ["rome"], real_weather) == "sunny"
+
+
+def weather(location, unit="C"):
+    return f"20 {unit}"
+
+
+class WeatherAPI:
+    def __init__(self, unit: str):
+        self.unit = unit
+
+    def weather(self, location):
+        return f"20 {self.unit}"
+
+
+def test_partials_and_methods_do_not_share_entries():
+    cache = ToolCache()
+    celsius, fahrenheit = partial(weather, unit="C"), partial(weather, unit="F")
+    assert cache.get_or_call("weather", ["rome"], celsius) == "20 C"
+    assert cache.get_or_call("weather", ["rome"], fahrenheit) == "20 F"
+    api_c, api_f = WeatherAPI("C"), WeatherAPI("F")
+    assert cache.get_or_call("weather", ["rome"], api_c.weather) == "20 C"
+    assert cache.get_or_call("weather", ["rome"], api_f.weather) == "20 F"
+    # The same method of the same instance is the same tool
+    assert cache.get_or_call("weather", ["rome"], api_c.weather) == "20 C"
+    assert cache.hits == 1
+
+
+def test_arguments_keep_their_type():
+    cache = ToolCache()
+    assert cache.get_or_call("echo", [1], repr) == "1"
+    assert cache.get_or_call("echo", ["1"], repr) == "'1'"
+
+
+def test_concurrent_misses_call_the_tool_once():
+    cache = ToolCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_tool(location):
+        calls.append(location)
+        started.set()
+        release.wait(5)
+        return "sunny"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = pool.submit(cache.get_or_call, "weather", ["rome"], slow_tool)
+        started.wait(5)
+        others = [
+            pool.submit(cache.get_or_call, "weather", ["Rome"], slow_tool)
+            for _ in range(3)
+        ]
+        time.sleep(0.05)
+        release.set()
+        results = [first.result()] + [f.result() for f in others]
+    assert results == ["sunny"] * 4
+    assert calls == ["rome"]
+    assert cache.stats()[:2] == (3, 1)
+
+
+def test_concurrent_misses_share_the_error():
+    cache = ToolCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing(location):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(cache.get_or_call, "weather", ["rome"], failing)
+        started.wait(5)
+        second = pool.submit(cache.get_or_call, "weather", ["rome"], failing)
+        time.sleep(0.05)
+        release.set()
+        for future in (first, second):
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert len(cache) == 0
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from tool_executor import ToolExecutor, ToolPolicy, ToolTimeoutError
+
+
+# Process-isolated tools must be importable, hence defined at module level
+def sleepy(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def broken(message: str):
+    raise ValueError(message)
+
+
+@pytest.fixture
+def executor():
+    executor = ToolExecutor(
+        policies={
+            "sleepy": ToolPolicy(timeout=1.0, max_concurrency=2, isolation="process"),
+            "broken": ToolPolicy(timeout=5.0, isolation="process"),
+            "threaded": ToolPolicy(timeout=0.2, max_concurrency=1),
+        }
+    )
+    yield executor
+    executor.shutdown()
+
+
+def test_process_workers_are_reused(executor):
+    tools = executor.wrap({"sleepy": sleepy})
+    assert tools["sleepy"](0) == tools["sleepy"](0) != os.getpid()
+
+
+def test_tool_errors_are_raised(executor):
+    with pytest.raises(ValueError, match="boom"):
+        executor.call("broken", broken, "boom")
+    # The worker survives its tool's errors
+    with pytest.raises(ValueError, match="again"):
+        executor.call("broken", broken, "again")
+
+
+def test_unpicklable_tool_leaves_no_worker_behind(executor):
+    before = len(multiprocessing.active_children())
+    for _ in range(3):
+        with pytest.raises(Exception):
+            executor.call("broken", lambda: None)
+    assert len(multiprocessing.active_children()) <= before
+
+
+def test_timeout_kills_only_the_hung_call(executor):
+    results = {}
+
+    def run(name, seconds):
+        try:
+            results[name] = executor.call("sleepy", sleepy, seconds)
+        except ToolTimeoutError as e:
+            results[name] = e
+
+    hung = threading.Thread(target=run, args=("hung", 30))
+    # Still running when the hung call is killed, one second in
+    other = threading.Thread(target=run, args=("other", 0.6))
+    hung.start()
+    time.sleep(0.7)
+    other.start()
+    hung.join(5)
+    other.join(5)
+    assert isinstance(results["hung"], ToolTimeoutError)
+    # The call of the other run, on the same pool, was not killed with it
+    assert isinstance(results["other"], int)
+    assert executor.histogram("sleepy").timeouts == 1
+    # And the pool still works
+    assert isinstance(executor.call("sleepy", sleepy, 0), int)
+
+
+def test_thread_timeout(executor):
+    release = threading.Event()
+    with pytest.raises(ToolTimeoutError) as error:
+        executor.call("threaded", release.wait, 5)
+    release.set()
+    assert '"timeout_seconds": 0.2' in str(error.value)
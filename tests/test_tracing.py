@@ -0,0 +1,20 @@
+from tracing import Tracer
+
+
+def test_rerouted_call_is_not_an_iteration():
+    trace = Tracer().start_run()
+    trace.iteration = 1
+    trace.record("llm", 0.1, model="fast")
+    trace.record("llm", 0.2, model="strong", rerouted=True)
+    trace.iteration = 2
+    trace.record("llm", 0.1, model="fast")
+    summary = trace.finish()
+    assert summary.iterations == 2
+    assert summary.llm_time > 0.39
+
+
+def test_tracer_keeps_the_last_summaries():
+    tracer = Tracer(max_summaries=3)
+    for i in range(5):
+        tracer.start_run(f"r{i}").finish()
+    assert [s.run_id for s in tracer.summaries] == ["r2", "r3", "r4"]
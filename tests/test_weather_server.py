@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("fastmcp")
+
+from fast_mcp import server  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(server, "_weather_cache", server.OrderedDict())
+
+
+def test_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(server, "WEATHER_CACHE_MAX_SIZE", 2)
+    server._cached_weather("Paris")
+    server._cached_weather("Rome")
+    server._cached_weather("paris")  # hit, Paris becomes the most recent
+    server._cached_weather("Oslo")
+    assert list(server._weather_cache) == ["paris", "oslo"]
+
+
+def test_expired_entry_is_fetched_again(monkeypatch):
+    fetched = []
+
+    def fetch(location):
+        fetched.append(location)
+        return server.WeatherInfo(
+            location=location, temperature=20.0, conditions="rain", humidity=80
+        )
+
+    monkeypatch.setattr(server, "_fetch_weather", fetch)
+    monkeypatch.setattr(server, "WEATHER_CACHE_TTL", -1.0)
+    server._cached_weather("Paris")
+    server._cached_weather("Paris")
+    assert fetched == ["Paris", "Paris"]
+    assert len(server._weather_cache) == 1